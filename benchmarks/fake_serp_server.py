@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server answering `/search?q=...` with Google-like result pages.
+
+Results are derived from the query, so the same query always gets the same
+ranking. The result count, response latency and the rate of "unusual
+traffic" redirects to `/sorry/index` are configurable.
+
+    python benchmarks/fake_serp_server.py --port 8900 --results 100 --latency 0.3
+"""
+import argparse
+import hashlib
+import html
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote_plus, urlparse
+
+RESULT_TEMPLATE = """
+<div class="g">
+  <div class="yuRUbf">
+    <a href="{url}"><h3>{title}</h3><cite>{url}</cite></a>
+  </div>
+  <div class="VwiC3b">Result {position} for {query}.</div>
+</div>"""
+
+PAGE_TEMPLATE = """<!doctype html>
+<html><head><title>{query} - Google Search</title></head>
+<body><div id="search"><div id="rso">{results}</div></div></body></html>"""
+
+SORRY_PAGE = """<!doctype html>
+<html><body><form id="captcha-form">Our systems have detected unusual traffic
+from your computer network.</form></body></html>"""
+
+
+def get_result_domains(query: str, count: int, domains_pool: int) -> list:
+    """Deterministic ranking of `count` domains out of `domains_pool` for `query`"""
+    seed = int.from_bytes(hashlib.md5(query.encode()).digest()[:8], "big")
+    pool = [f"site{number}.com" for number in range(max(domains_pool, count))]
+    return random.Random(seed).sample(pool, count)
+
+
+class FakeSerpHandler(BaseHTTPRequestHandler):
+    results = 100
+    domains_pool = 500
+    latency = 0.0
+    block_rate = 0.0
+    random = random.Random(0)
+    random_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: str, headers: dict = None):
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path.startswith("/sorry/"):
+            return self._send(429, SORRY_PAGE)
+        if parsed.path != "/search":
+            return self._send(404, "")
+        params = parse_qs(parsed.query)
+        query = params.get("q", [""])[0]
+        start = int(params.get("start", ["0"])[0])
+        with self.random_lock:
+            blocked = self.random.random() < self.block_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if blocked:
+            return self._send(
+                302, "", {"Location": f"/sorry/index?continue={quote_plus(self.path)}"}
+            )
+        domains = get_result_domains(query, start + self.results, self.domains_pool)
+        results = "".join(
+            RESULT_TEMPLATE.format(
+                url=f"https://www.{domain}/{quote_plus(query)}",
+                title=html.escape(f"{query} | {domain}"),
+                position=position,
+                query=html.escape(query),
+            )
+            for position, domain in enumerate(domains[start:], start=start + 1)
+        )
+        self._send(200, PAGE_TEMPLATE.format(query=html.escape(query), results=results))
+
+
+def start_fake_serp_server(
+    port: int = 0,
+    results: int = 100,
+    domains_pool: int = 500,
+    latency: float = 0.0,
+    block_rate: float = 0.0,
+    seed: int = 0,
+) -> ThreadingHTTPServer:
+    """Starts the server in a daemon thread, `port=0` picks a free port"""
+    handler = type(
+        "ConfiguredFakeSerpHandler",
+        (FakeSerpHandler,),
+        {
+            "results": results,
+            "domains_pool": domains_pool,
+            "latency": latency,
+            "block_rate": block_rate,
+            "random": random.Random(seed),
+        },
+    )
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def get_server_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}"
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--domains-pool", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    fake_server = start_fake_serp_server(
+        port=args.port,
+        results=args.results,
+        domains_pool=args.domains_pool,
+        latency=args.latency,
+        block_rate=args.block_rate,
+        seed=args.seed,
+    )
+    print(f"Fake SERP server on {get_server_url(fake_server)}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        fake_server.shutdown()
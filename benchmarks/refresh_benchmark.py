@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Rank refresh benchmark.
+
+Seeds a benchmark database with keywords, runs the full refresh pipeline
+(`KeywordController.update_all_rank`: fair-share queue, browser tabs, SERP
+store, rank and rollup writes, run ledger) against the local fake SERP
+server and reports keywords/sec, latency per keyword, MongoDB commands per
+keyword and peak RSS of the process and its browsers.
+
+    python benchmarks/refresh_benchmark.py --keywords 200 --tabs 4 --latency 0.3
+
+Needs a reachable MongoDB (`--db-uri`, default `DB_URI`) and Chrome, or
+`--fetch-mode replay` with recorded cassettes. The database given by
+`--database` is dropped first.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import psutil
+from pymongo import monitoring
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_serp_server import get_server_url, start_fake_serp_server  # noqa
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts the MongoDB commands sent by every client of the process"""
+
+    def __init__(self):
+        self.commands = Counter()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        with self._lock:
+            self.commands = Counter()
+
+    def started(self, event):
+        with self._lock:
+            self.commands[event.command_name] += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+class RssSampler(object):
+    """Peak RSS of this process and all its children (browsers included)"""
+
+    def __init__(self, interval: float = 0.2):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def sample(self) -> int:
+        me = psutil.Process()
+        rss = 0
+        for process in [me, *me.children(recursive=True)]:
+            try:
+                rss += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return rss
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, self.sample())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_):
+        self._stop.set()
+        self._thread.join()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--keywords", type=int, default=100)
+    parser.add_argument("--domains", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=None, help="default: keywords")
+    parser.add_argument("--results", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--block-rate", type=float, default=0.0)
+    parser.add_argument("--tabs", type=int, default=4)
+    parser.add_argument("--write-batch-size", type=int, default=10)
+    parser.add_argument(
+        "--fetch-mode", default="live", choices=["live", "record", "replay"]
+    )
+    parser.add_argument(
+        "--db-uri", default=os.environ.get("DB_URI", "mongodb://localhost:27017")
+    )
+    parser.add_argument("--database", default="keywords_benchmark")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args()
+
+
+def configure(args, serp_base_url: str, work_dir: str):
+    """Settings are read from the environment when `src` is first imported"""
+    os.environ.update(
+        DB_URI=args.db_uri,
+        DB_DATABASE_NAME=args.database,
+        RANK_SERP_BASE_URL=serp_base_url,
+        RANK_TABS_PER_BROWSER=str(args.tabs),
+        RANK_WRITE_BATCH_SIZE=str(args.write_batch_size),
+        RANK_SERP_FETCH_MODE=args.fetch_mode,
+        RANK_MATRIX_PATH=os.path.join(work_dir, "rank_matrix"),
+    )
+    os.environ.setdefault("RANK_CASSETTE_PATH", os.path.join(work_dir, "cassettes"))
+
+
+def seed_keywords(keyword_db, args) -> int:
+    from src.apps.keyword.models import KeywordDBCreateModel
+
+    keyword_db.client.drop_database(args.database)
+    queries = args.queries or args.keywords
+    keyword_db.keywords.insert_many(
+        [
+            {
+                **KeywordDBCreateModel(
+                    keyword=f"benchmark query {number % queries}",
+                    domain=f"site{number % args.domains}.com",
+                ).dict(),
+                "is_deleted": False,
+                "is_enable": True,
+            }
+            for number in range(args.keywords)
+        ]
+    )
+    return args.keywords
+
+
+def get_percentile(values: list, percentile: float):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(int(round(percentile / 100 * (len(values) - 1))), len(values) - 1)
+    return round(values[index], 4)
+
+
+def run_benchmark(args) -> dict:
+    server = start_fake_serp_server(
+        results=args.results, latency=args.latency, block_rate=args.block_rate
+    )
+    work_dir = tempfile.mkdtemp(prefix="rank_benchmark_")
+    configure(args, get_server_url(server), work_dir)
+    counter = CommandCounter()
+    monitoring.register(counter)
+
+    import pymongo
+
+    from src.apps.keyword.controller import keyword_controller
+    from src.core.mixins import default_id
+    from src.main import config
+
+    keyword_db = pymongo.MongoClient(config.db_settings.URI)[args.database]
+    keywords = seed_keywords(keyword_db, args)
+    run_id = default_id()
+
+    counter.reset()
+    with RssSampler() as rss_sampler:
+        started = time.perf_counter()
+        keyword_controller.update_all_rank(criteria={}, run_id=run_id)
+        elapsed = time.perf_counter() - started
+    commands = dict(counter.commands)
+    server.shutdown()
+
+    run = keyword_db.rank_runs.find_one({"id": run_id}, projection={"_id": 0})
+    latencies = [
+        attempt["total_seconds"]
+        for attempt in keyword_db.rank_attempts.find(
+            {"run_id": run_id}, projection={"_id": 0, "total_seconds": 1}
+        )
+    ]
+    db_ops = sum(commands.values())
+    return {
+        "keywords": keywords,
+        "tabs": args.tabs,
+        "fetch_mode": args.fetch_mode,
+        "seconds": round(elapsed, 3),
+        "keywords_per_second": round(keywords / elapsed, 3) if elapsed else None,
+        "latency_p50": get_percentile(latencies, 50),
+        "latency_p95": get_percentile(latencies, 95),
+        "db_ops": db_ops,
+        "db_ops_per_keyword": round(db_ops / keywords, 2) if keywords else None,
+        "db_commands": commands,
+        "peak_rss_mb": round(rss_sampler.peak / 1024 / 1024, 1),
+        "run": {
+            field: run.get(field)
+            for field in (
+                "succeeded",
+                "not_found",
+                "blocked",
+                "failed",
+                "pages_fetched",
+                "cache_hits",
+            )
+        },
+    }
+
+
+def print_report(report: dict):
+    width = max(len(name) for name in report)
+    for name, value in report.items():
+        if isinstance(value, dict):
+            value = ", ".join(f"{key}={item}" for key, item in value.items())
+        print(f"{name.ljust(width)}  {value}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    result = run_benchmark(arguments)
+    if arguments.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
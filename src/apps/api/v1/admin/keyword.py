@@ -1,17 +1,48 @@
+import asyncio
+import logging
 import re
 from typing import List
 
 import tldextract
-from fastapi import APIRouter, Depends, Query, BackgroundTasks
+from fastapi import (
+    APIRouter,
+    Depends,
+    Query,
+    BackgroundTasks,
+    WebSocket,
+    WebSocketDisconnect,
+    status,
+)
 from pymongo.results import UpdateResult
 
+from src.apps.auth.deps import ws_get_current_customer
 from src.apps.keyword import schema as keyword_schemas
-from src.apps.keyword.controller import keyword_controller
-from src.core.base.schema import Response, PaginatedResponse
+from src.apps.keyword.enum import RankAttemptOutcomeEnum
+from src.apps.keyword.controller import (
+    domain_stats_controller,
+    keyword_controller,
+    rank_attempt_controller,
+    rank_run_controller,
+    serp_index_controller,
+)
+from src.apps.user.models import UserDBReadModel
+from src.core.base.schema import (
+    KeysetPaginatedResponse,
+    PaginatedResponse,
+    Response,
+)
+from src.core.common.enums import CountStrategyEnum
 from src.core.common.exceptions import CustomHTTPException
+from src.browser_supervisor import browser_supervisor
+from src.core import executors as core_executors
+from src.core.mixins import default_id
 from src.core.ordering import Ordering
-from src.core.pagination import Pagination
-from src.core.responses import common_responses, response_404
+from src.core.pagination import KeysetPagination, Pagination
+from src.core.responses import (
+    TrustedJSONResponse,
+    common_responses,
+    response_404,
+)
 from src.core.utils import return_on_failure
 from src.main.config import collections_names
 
@@ -27,7 +58,9 @@ keyword_router = APIRouter()
 @keyword_router.get(
     "",
     responses={**common_responses},
-    response_model=Response[PaginatedResponse[List[keyword_schemas.KeywordListSchema]]],
+    response_model=Response[
+        KeysetPaginatedResponse[List[keyword_schemas.KeywordListSchema]]
+    ],
     description="by `HamzeZN`",
 )
 @return_on_failure
@@ -35,7 +68,7 @@ async def get_keyword(
     # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
     keyword: None | str = Query(None),
     domain: None | str = Query(None),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
 ):
     criteria = {"is_deleted": False}
@@ -48,10 +81,173 @@ async def get_keyword(
         ordering=ordering,
         criteria=criteria,
         sub_list_schema=keyword_schemas.KeywordListSchema,
+        trusted=True,
+    )
+    return TrustedJSONResponse(
+        Response[
+            KeysetPaginatedResponse[List[keyword_schemas.KeywordListSchema]]
+        ].construct(data=keyword)
+    )
+
+
+@keyword_router.get(
+    "/changes",
+    responses={**common_responses},
+    response_model=Response[keyword_schemas.KeywordRankChangesOut],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_rank_changes(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    since: int = Query(
+        0, ge=0, description="`next_since` of the previous call, 0 for a full sync"
+    ),
+    limit: int = Query(500, ge=1, le=5000),
+):
+    result = await keyword_controller.get_rank_changes(since=since, limit=limit)
+    return Response[keyword_schemas.KeywordRankChangesOut](data=result)
+
+
+@keyword_router.get(
+    "/visibility",
+    responses={**common_responses},
+    response_model=Response[List[keyword_schemas.DomainVisibilityOut]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_domains_visibility(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    keyword: None | str = Query(None),
+    domain: None | str = Query(None),
+):
+    criteria = {"is_deleted": False}
+    if keyword:
+        criteria["keyword"] = re.compile(keyword, re.IGNORECASE)
+    if domain:
+        criteria["domain"] = re.compile(domain, re.IGNORECASE)
+    result = await keyword_controller.get_domains_visibility(criteria=criteria)
+    return Response[List[keyword_schemas.DomainVisibilityOut]](data=result)
+
+
+@keyword_router.get(
+    "/domains",
+    responses={**common_responses},
+    response_model=Response[PaginatedResponse[List[keyword_schemas.DomainStatsOut]]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_domains_stats(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    domain: None | str = Query(None),
+    pagination: Pagination = Depends(),
+    ordering: Ordering = Depends(Ordering(default_field="-keywords")),
+):
+    criteria = {"is_deleted": False}
+    if domain:
+        criteria["domain"] = re.compile(domain, re.IGNORECASE)
+    domains_stats = await domain_stats_controller.get_list_objs(
+        pagination=pagination,
+        ordering=ordering,
+        criteria=criteria,
+        sub_list_schema=keyword_schemas.DomainStatsOut,
+    )
+    return Response[PaginatedResponse[List[keyword_schemas.DomainStatsOut]]](
+        data=domains_stats
+    )
+
+
+@keyword_router.patch(
+    "/domains/{domain}/schedule",
+    responses={**common_responses},
+    response_model=Response[keyword_schemas.DomainStatsOut],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def set_domain_schedule(
+    domain: str,
+    schedule: keyword_schemas.DomainScheduleIn,
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "update"]),
+):
+    domain_stats = await domain_stats_controller.set_domain_schedule(
+        domain=tldextract.extract(domain).registered_domain or domain,
+        schedule=schedule,
+    )
+    return Response[keyword_schemas.DomainStatsOut](data=domain_stats)
+
+
+@keyword_router.get(
+    "/competitors",
+    responses={**common_responses},
+    response_model=Response[
+        PaginatedResponse[List[keyword_schemas.SerpPositionSchema]]
+    ],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_competitor_positions(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    domain: str = Query(...),
+    max_position: int = Query(20, ge=1, le=100),
+    pagination: Pagination = Depends(),
+    ordering: Ordering = Depends(Ordering(default_field="position")),
+):
+    criteria = {
+        "is_deleted": False,
+        "domain": tldextract.extract(domain).registered_domain,
+        "position": {"$lte": max_position},
+    }
+    positions = await serp_index_controller.get_list_objs(
+        pagination=pagination,
+        ordering=ordering,
+        criteria=criteria,
+        sub_list_schema=keyword_schemas.SerpPositionSchema,
+        trusted=True,
+        count_strategy=CountStrategyEnum.cached,
+    )
+    return TrustedJSONResponse(
+        Response[PaginatedResponse[List[keyword_schemas.SerpPositionSchema]]].construct(
+            data=positions
+        )
+    )
+
+
+@keyword_router.get(
+    "/analytics/average-rank",
+    responses={**common_responses},
+    response_model=Response[keyword_schemas.DomainAverageRankOut],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_domain_average_rank(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    domain: str = Query(...),
+    days: int = Query(90, ge=1, le=3660),
+):
+    result = await keyword_controller.get_domain_average_rank(
+        domain=tldextract.extract(domain).registered_domain, days=days
     )
-    return Response[PaginatedResponse[List[keyword_schemas.KeywordListSchema]]](
-        data=keyword
+    return Response[keyword_schemas.DomainAverageRankOut](data=result)
+
+
+@keyword_router.get(
+    "/analytics/drops",
+    responses={**common_responses},
+    response_model=Response[List[keyword_schemas.RankDropOut]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_rank_drops(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    domain: None | str = Query(None),
+    days: int = Query(7, ge=1, le=3660),
+    places: int = Query(5, ge=0, le=100),
+):
+    result = await keyword_controller.get_rank_drops(
+        days=days,
+        places=places,
+        domain=tldextract.extract(domain).registered_domain if domain else None,
     )
+    return Response[List[keyword_schemas.RankDropOut]](data=result)
 
 
 @keyword_router.post(
@@ -71,11 +267,9 @@ async def create_keyword(
     keyword = await keyword_controller.get_or_create_obj(
         criteria={"keyword": payload.keyword, "domain": domain}, new_data=payload
     )
-    background_tasks.add_task(
-        func=keyword_controller.get_and_update_rank,
-        keyword=payload.keyword,
-        domain=domain,
-    )
+    keyword, is_fresh = await keyword_controller.backfill_rank(keyword)
+    if not is_fresh:
+        keyword_controller.submit_rank_update(keyword=payload.keyword, domain=domain)
 
     # celery_client.send_task(
     #     "src.celery.get_rank_task",
@@ -99,7 +293,6 @@ async def create_keyword(
 )
 @return_on_failure
 async def update_all_ranks(
-    background_tasks: BackgroundTasks,
     # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
     keyword: None | str = Query(None),
     domain: None | str = Query(None),
@@ -109,12 +302,151 @@ async def update_all_ranks(
         criteria["keyword"] = keyword
     if domain:
         criteria["domain"] = domain
-    background_tasks.add_task(
-        func=keyword_controller.update_all_rank,
+    run_id = default_id()
+    keyword_controller.submit_rank_refresh(criteria=criteria, run_id=run_id)
+    # celery_client.send_task("src.celery.get_rank_daily_task")
+    return Response(data={"run_id": run_id}, message="Ok - please wait ...")
+
+
+@keyword_router.get(
+    "/executors",
+    responses={**common_responses},
+    response_model=Response[List[keyword_schemas.ExecutorMetricsOut]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_executors_metrics(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+):
+    return Response[List[keyword_schemas.ExecutorMetricsOut]](
+        data=core_executors.get_executors_metrics()
+    )
+
+
+@keyword_router.get(
+    "/browsers",
+    responses={**common_responses},
+    response_model=Response[keyword_schemas.BrowsersStatsOut],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_browsers_stats(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+):
+    return Response[keyword_schemas.BrowsersStatsOut](
+        data=browser_supervisor.get_stats()
+    )
+
+
+@keyword_router.get(
+    "/runs",
+    responses={**common_responses},
+    response_model=Response[PaginatedResponse[List[keyword_schemas.RankRunOut]]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_rank_runs(
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    pagination: Pagination = Depends(),
+    ordering: Ordering = Depends(Ordering(default_field="-start_datetime")),
+):
+    rank_runs = await rank_run_controller.get_list_objs(
+        pagination=pagination,
+        ordering=ordering,
+        sub_list_schema=keyword_schemas.RankRunOut,
+        trusted=True,
+        count_strategy=CountStrategyEnum.estimated,
+    )
+    return TrustedJSONResponse(
+        Response[PaginatedResponse[List[keyword_schemas.RankRunOut]]].construct(
+            data=rank_runs
+        )
+    )
+
+
+@keyword_router.get(
+    "/runs/{run_id}",
+    responses={**common_responses, **response_404},
+    response_model=Response[keyword_schemas.RankRunOut],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_rank_run(
+    run_id: str,
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "read"]),
+):
+    rank_run = await rank_run_controller.get_single_obj(id=run_id)
+    return Response[keyword_schemas.RankRunOut](data=rank_run)
+
+
+@keyword_router.get(
+    "/runs/{run_id}/attempts",
+    responses={**common_responses},
+    response_model=Response[PaginatedResponse[List[keyword_schemas.RankAttemptOut]]],
+    description="by `HamzeZN`",
+)
+@return_on_failure
+async def get_rank_run_attempts(
+    run_id: str,
+    # _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
+    outcome: None | RankAttemptOutcomeEnum = Query(None),
+    pagination: Pagination = Depends(),
+    ordering: Ordering = Depends(Ordering(default_field="attempt_datetime")),
+):
+    criteria = {"is_deleted": False, "run_id": run_id}
+    if outcome:
+        criteria["outcome"] = outcome
+    rank_attempts = await rank_attempt_controller.get_list_objs(
+        pagination=pagination,
+        ordering=ordering,
         criteria=criteria,
+        sub_list_schema=keyword_schemas.RankAttemptOut,
+        trusted=True,
+        count_strategy=CountStrategyEnum.cached,
     )
-    # celery_client.send_task("src.celery.get_rank_daily_task")
-    return Response(message="Ok - please wait ...")
+    return TrustedJSONResponse(
+        Response[PaginatedResponse[List[keyword_schemas.RankAttemptOut]]].construct(
+            data=rank_attempts
+        )
+    )
+
+
+@keyword_router.websocket("/ws/ranks")
+async def stream_ranks(
+    websocket: WebSocket,
+    _: UserDBReadModel = Depends(ws_get_current_customer),
+    run_id: None | str = Query(None),
+):
+    """
+    Live rank results and refresh progress, of a single run if `run_id` given.
+    The socket is closed with 1011 when forwarding the events stops, so
+    clients reconnect instead of waiting on a silent socket.
+    """
+    await websocket.accept()
+    forward_task = asyncio.create_task(
+        keyword_controller.stream_rank_events(websocket, run_id=run_id)
+    )
+    receive_task = asyncio.create_task(receive_until_disconnect(websocket))
+    try:
+        await asyncio.wait(
+            {forward_task, receive_task}, return_when=asyncio.FIRST_COMPLETED
+        )
+    finally:
+        forward_task.cancel()
+        receive_task.cancel()
+    if receive_task.done() and not receive_task.cancelled():
+        return
+    if not forward_task.cancelled() and (error := forward_task.exception()):
+        logging.error("Forwarding rank events failed:", exc_info=error)
+    await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
+
+
+async def receive_until_disconnect(websocket: WebSocket):
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
 
 
 # @keyword_router.get(
@@ -158,7 +490,9 @@ async def delete_keywords(
         raise CustomHTTPException(
             status_code=422, detail="Can't Delete ALL !!!!!!!!!!!!!!"
         )
-    result: UpdateResult = await keyword_controller.soft_delete_objs(**criteria)
+    result: UpdateResult = await keyword_controller.soft_delete_keywords(
+        criteria=criteria
+    )
     return Response(message=f"{result.modified_count} items Deleted ........")
 
 
@@ -0,0 +1,38 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+
+from src.apps.api.v1.admin.keyword import keyword_router
+from src.apps.auth.deps import ws_get_current_customer
+from src.apps.keyword.controller import keyword_controller
+
+
+@pytest.fixture
+def client() -> TestClient:
+    app = FastAPI()
+    app.include_router(keyword_router, prefix="/keywords")
+    app.dependency_overrides[ws_get_current_customer] = lambda: None
+    return TestClient(app)
+
+
+def test_rank_stream_closes_when_forwarding_fails(client, monkeypatch):
+    async def stream_rank_events(websocket, run_id=None):
+        raise ConnectionError("redis is gone")
+
+    monkeypatch.setattr(keyword_controller, "stream_rank_events", stream_rank_events)
+    with client.websocket_connect("/keywords/ws/ranks") as websocket:
+        with pytest.raises(WebSocketDisconnect) as e:
+            websocket.receive_text()
+    assert e.value.code == 1011
+
+
+def test_rank_stream_forwards_events(client, monkeypatch):
+    async def stream_rank_events(websocket, run_id=None):
+        await websocket.send_text(f'{{"run_id": "{run_id}"}}')
+
+    monkeypatch.setattr(keyword_controller, "stream_rank_events", stream_rank_events)
+    with client.websocket_connect("/keywords/ws/ranks?run_id=r1") as websocket:
+        assert websocket.receive_json() == {"run_id": "r1"}
+        with pytest.raises(WebSocketDisconnect):
+            websocket.receive_text()
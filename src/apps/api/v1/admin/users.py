@@ -32,14 +32,14 @@ from src.apps.user.schema import CreateUserGroupEnum, UserCreateSchema
 from src.core.base.messages import CommonMessageEnum
 from src.core.base.schema import (
     BulkDeleteIn,
-    PaginatedResponse,
+    KeysetPaginatedResponse,
     Response,
     CommonExportCsvSchemaOut,
 )
 from src.core.common.enums import RoleEnum, ALL_ROLES
 from src.core.mixins import SchemaID
 from src.core.ordering import Ordering
-from src.core.pagination import Pagination
+from src.core.pagination import KeysetPagination
 from src.core.responses import (
     common_responses,
     response_404,
@@ -63,23 +63,23 @@ entity = collections_names.USERS
         **common_responses,
     },
     response_model=Response[
-        PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
+        KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
     ],
     description="By `Hamze.zn`",
 )
 @return_on_failure
 async def get_all_users(
     _: UserDBReadModel = Security(get_admin_user, scopes=[entity, "list"]),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
-) -> Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
+) -> Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
     criteria = {"is_deleted": False}
     result_data = await user_controller.get_all_users(
         pagination=pagination,
         ordering=ordering,
         criteria=criteria,
     )
-    return Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
+    return Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
         data=result_data.dict()
     )
 
@@ -224,7 +224,7 @@ async def create_new_customer(
         **common_responses,
     },
     response_model=Response[
-        PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
+        KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
     ],
     description="By `Hamze.zn`",
 )
@@ -234,16 +234,16 @@ async def get_all_admins(
         get_admin_user,
         scopes=[entity, "list"],
     ),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
-) -> Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
+) -> Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
     criteria = {"role": RoleEnum.admin}
     result_data = await user_controller.get_all_users(
         pagination=pagination,
         ordering=ordering,
         criteria=criteria,
     )
-    return Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
+    return Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
         data=result_data.dict()
     )
 
@@ -254,7 +254,7 @@ async def get_all_admins(
         **common_responses,
     },
     response_model=Response[
-        PaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]
+        KeysetPaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]
     ],
     description="By `Hamze.zn`",
 )
@@ -269,9 +269,9 @@ async def admin_get_all_customers(
     user_status: Optional[List[UserStatus]] = Query(None, enum=ALL_USER_STATUSES),
     business_type: List[BusinessTypeEnum] = Query(None),
     country: Optional[List[CountryCode]] = Query(None, enum=ALL_COUNTRY_CODES),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
-) -> Response[PaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]]:
+) -> Response[KeysetPaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]]:
     criteria = {
         "role": RoleEnum.customer,
         "is_deleted": False,
@@ -295,9 +295,9 @@ async def admin_get_all_customers(
         ordering=ordering,
         criteria=criteria,
     )
-    return Response[PaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]](
-        data=result_data.dict()
-    )
+    return Response[
+        KeysetPaginatedResponse[List[user_schema.UsersGetCustomerSubListOut]]
+    ](data=result_data.dict())
 
 
 @user_router.get(
@@ -306,7 +306,7 @@ async def admin_get_all_customers(
         **common_responses,
     },
     response_model=Response[
-        PaginatedResponse[List[user_schema.AuditGetUsersListSchema]]
+        KeysetPaginatedResponse[List[user_schema.AuditGetUsersListSchema]]
     ],
     description="By `HamzeZN`",
 )
@@ -315,7 +315,7 @@ async def get_all_customers(
     _: UserDBReadModel = Security(get_audit_user, scopes=[entity, "list"]),
     search: str = Query(None),
     is_blocked: bool = Query(False),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
 ):
     criteria = {
@@ -335,7 +335,7 @@ async def get_all_customers(
         ordering=ordering,
         criteria=criteria,
     )
-    return Response[PaginatedResponse[List[user_schema.AuditGetUsersListSchema]]](
+    return Response[KeysetPaginatedResponse[List[user_schema.AuditGetUsersListSchema]]](
         data=result_data.dict()
     )
 
@@ -373,7 +373,7 @@ async def create_new_audit(
         **common_responses,
     },
     response_model=Response[
-        PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
+        KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]
     ],
     description="By `HamzeZN`do",
 )
@@ -383,11 +383,11 @@ async def get_all_audits(
         get_admin_user,
         scopes=[entity, "list"],
     ),
-    pagination: Pagination = Depends(),
+    pagination: KeysetPagination = Depends(),
     ordering: Ordering = Depends(Ordering()),
     is_blocked: bool = Query(False),
     search: str = Query(None),
-) -> Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
+) -> Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]]:
     criteria = {"role": RoleEnum.audit, "is_blocked": is_blocked}
     if search:
         criteria["$or"] = [
@@ -401,7 +401,7 @@ async def get_all_audits(
         ordering=ordering,
         criteria=criteria,
     )
-    return Response[PaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
+    return Response[KeysetPaginatedResponse[List[user_schema.UsersGetUserSubListOut]]](
         data=result_data.dict()
     )
 
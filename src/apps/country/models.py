@@ -6,7 +6,7 @@ from src.core.mixins.fields import PointField
 from src.main.config import collections_names
 from src.core import mixins
 from src.core.mixins import DB_ID, default_id
-from src.core.base.models import BaseDBModel, BaseDBReadModel
+from src.core.base.models import BaseDBModel, BaseDBReadModel, not_deleted_index
 
 
 class StateBaseModel(
@@ -22,6 +22,10 @@ class StateBaseModel(
         entity_name = "states"
         indexes = [
             pymongo.IndexModel("id", name="id", unique=True),
+            not_deleted_index(
+                [("create_datetime", pymongo.DESCENDING)],
+                name="not_deleted_create_datetime",
+            ),
         ]
 
 
@@ -52,6 +56,13 @@ class CityBaseModel(
         entity_name = "cities"
         indexes = [
             pymongo.IndexModel("id", name="id", unique=True),
+            not_deleted_index(
+                [
+                    ("state_id", pymongo.ASCENDING),
+                    ("create_datetime", pymongo.DESCENDING),
+                ],
+                name="not_deleted_state_id_create_datetime",
+            ),
         ]
 
 
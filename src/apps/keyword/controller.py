@@ -1,34 +1,649 @@
-from datetime import datetime, timezone
+import asyncio
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, List, Optional, Tuple
 
 import devtools
 import pymongo
+from pymongo import DeleteMany, ReturnDocument, UpdateOne
+from pymongo.results import UpdateResult
+from starlette.websockets import WebSocket
 
-from src.apps.keyword.crud import keywords_crud
+from src.apps.keyword.crud import (
+    daily_ranks_crud,
+    domain_stats_crud,
+    keywords_crud,
+    rank_attempts_crud,
+    rank_runs_crud,
+    serp_index_crud,
+    serps_crud,
+)
+from src.apps.keyword.exception import RankRefreshQueueFull
+from src.apps.keyword.executors import refresh_executor, scrape_executor
+from src.apps.keyword.enum import (
+    RankAttemptOutcomeEnum,
+    RankEventTypeEnum,
+    RankRunStatusEnum,
+)
+from src.apps.keyword.domain_stats import (
+    get_budget_usage_request,
+    DOMAIN_STATS_COUNTERS,
+    get_domain_stats_delta,
+    get_domain_stats_rebuild_pipeline,
+    get_domain_stats_rebuild_request,
+    get_domain_stats_request,
+    merge_domain_stats_deltas,
+)
+from src.apps.keyword.models import KeywordDBReadModel
+from src.apps.keyword.rank_events import RANK_EVENTS_CHANNEL, publish_rank_event
+from src.apps.keyword.rank_matrix import rank_matrix
+from src.apps.keyword.rank_runs import RankRunLedger
+from src.apps.keyword.scheduling import (
+    FairShareQueue,
+    get_domain_budget_left,
+    get_domain_weight,
+)
+from src.apps.keyword.report import compute_domains_visibility
+from src.apps.keyword.schema import (
+    DomainScheduleIn,
+    DomainStatsOut,
+    DomainAverageRankOut,
+    DomainVisibilityOut,
+    KeywordRankChangeOut,
+    KeywordRankChangesOut,
+    RankAttemptOut,
+    RankDropOut,
+    RankRunOut,
+)
 from src.core.base.controller import BaseController
+from src.core.executors import ExecutorQueueFull
+from src.core.mixins import default_id
 from src.main import config
-from src.web_scraper import get_rank
+from src.main.config import collections_names, rank_settings
+from src.services import global_services
+from src.core.utils import iter_chunks
+from src.web_scraper import (
+    SerpBlocked,
+    SerpBrowser,
+    find_domain_rank,
+    get_serp_domains,
+)
+
+RANK_CHANGE_SEQUENCE = "keyword_rank_change"
+DOMAIN_STATS_REBUILD = "domain_stats_rebuild"
 
 
 class KeywordController(BaseController):
+    def store_serp(self, keyword_db, keyword: str, domains: List[str]):
+        """
+        Keeps the ordered result domains of the latest fetch of `keyword`,
+        so ranks of other domains for the same query can be answered without
+        scraping again.
+        """
+        now = datetime.now(timezone.utc)
+        keyword_db[collections_names.SERPS].update_one(
+            {"keyword": keyword},
+            {
+                "$set": {
+                    "domains": domains,
+                    "fetch_datetime": now,
+                    "update_datetime": now,
+                },
+                "$setOnInsert": {
+                    "id": default_id(),
+                    "is_deleted": False,
+                    "create_datetime": now,
+                },
+            },
+            upsert=True,
+        )
+        self.index_serp(keyword_db, keyword, domains)
+
+    @staticmethod
+    def index_serp(keyword_db, keyword: str, domains: List[str]):
+        """
+        Keeps the domain -> (keyword, position) index of `keyword` in line with
+        its latest fetched SERP: best position per domain is upserted and
+        domains which dropped out of the page are removed.
+        """
+        now = datetime.now(timezone.utc)
+        positions = {}
+        for position, domain in enumerate(domains, start=1):
+            if domain:
+                positions.setdefault(domain, position)
+        requests = [
+            DeleteMany({"keyword": keyword, "domain": {"$nin": list(positions)}})
+        ]
+        requests += [
+            UpdateOne(
+                {"keyword": keyword, "domain": domain},
+                {
+                    "$set": {
+                        "position": position,
+                        "fetch_datetime": now,
+                        "update_datetime": now,
+                    },
+                    "$setOnInsert": {
+                        "id": default_id(),
+                        "is_deleted": False,
+                        "create_datetime": now,
+                    },
+                },
+                upsert=True,
+            )
+            for domain, position in positions.items()
+        ]
+        keyword_db[collections_names.SERP_INDEX].bulk_write(requests, ordered=False)
+
+    async def backfill_rank(
+        self, keyword_obj: KeywordDBReadModel
+    ) -> Tuple[KeywordDBReadModel, bool]:
+        """
+        Computes the rank of a (keyword, domain) from the latest stored SERP
+        of the query.
+        :return: keyword object and whether a fresh SERP was available
+                 (if not, a scrape is still needed)
+        """
+        max_age = timedelta(seconds=rank_settings.SERP_MAX_AGE_SECONDS)
+        serp = await serps_crud.get_object(
+            criteria={
+                "keyword": keyword_obj.keyword,
+                "fetch_datetime": {"$gte": datetime.now(timezone.utc) - max_age},
+            },
+            raise_exception=False,
+        )
+        if not serp:
+            return keyword_obj, False
+        rank_update = self.get_rank_update(
+            keyword_obj.dict(),
+            find_domain_rank(serp.domains, keyword_obj.domain),
+        )
+        rank_update["update_time"] = serp.fetch_datetime
+        await asyncio.to_thread(
+            self.write_ranks, global_services.DB.get_sync_database(), [rank_update]
+        )
+        return await self.crud.get_by_id(_id=keyword_obj.id), True
+
+    @staticmethod
+    def get_rank_changes_limit(counter: Optional[dict], now: datetime) -> int:
+        """
+        Highest rank change sequence number the feed may return, from the
+        counter document read before the changes. Numbers of a block still
+        being written, or reserved after the read, may still be committed
+        below the ones already visible.
+        """
+        if counter is None:
+            return 0
+        expired = now - timedelta(
+            seconds=rank_settings.CHANGE_FEED_RESERVATION_TIMEOUT_SECONDS
+        )
+        pending = [
+            block["first"]
+            for block in counter.get("pending", [])
+            if block["reserved_at"].replace(tzinfo=timezone.utc) > expired
+        ]
+        return min([counter["seq"], *(first - 1 for first in pending)])
+
+    async def get_rank_changes(self, since: int, limit: int) -> KeywordRankChangesOut:
+        """
+        Keywords whose rank changed after the `since` sequence token, oldest
+        change first. Changes at or above the first number of a block still
+        being written are held back, so they are not skipped.
+        """
+        keyword_db = global_services.DB.get_sync_database()
+        counter = await asyncio.to_thread(
+            keyword_db[collections_names.COUNTERS].find_one,
+            {"_id": RANK_CHANGE_SEQUENCE},
+        )
+        max_seq = self.get_rank_changes_limit(counter, datetime.now(timezone.utc))
+        changes = await self.crud.get_list(
+            criteria={"rank_change_seq": {"$gt": since, "$lte": max_seq}},
+            sort=[("rank_change_seq", pymongo.ASCENDING)],
+            limit=limit + 1,
+        )
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        return KeywordRankChangesOut(
+            since=since,
+            next_since=changes[-1].rank_change_seq if changes else since,
+            has_more=has_more,
+            result=[KeywordRankChangeOut(**change.dict()) for change in changes],
+        )
+
+    async def soft_delete_keywords(self, criteria: dict) -> UpdateResult:
+        """
+        Soft deletes keywords and takes them out of their domain rollups. The
+        ranks are read after the delete: rank writes only match live keywords,
+        so these are the ranks the rollups hold.
+        """
+        delete_token = default_id()
+        result = await self.crud.update_many(
+            criteria=dict(criteria),
+            update={"is_deleted": True, "delete_token": delete_token},
+        )
+        documents = self.crud.iter_aggregate(
+            pipeline=[
+                {
+                    "$match": {
+                        **criteria,
+                        "delete_token": delete_token,
+                        "last_rank_update_time": {"$ne": None},
+                    }
+                },
+                {"$project": {"_id": 0, "domain": 1, "rank": 1}},
+            ]
+        )
+        deltas = {}
+        async for document in documents:
+            merge_domain_stats_deltas(
+                deltas,
+                document["domain"],
+                get_domain_stats_delta(
+                    old_rank=document.get("rank"), new_rank=None, is_measured=False
+                ),
+            )
+        if deltas:
+            now = datetime.now(timezone.utc)
+            await domain_stats_crud.bulk_write(
+                requests=[
+                    get_domain_stats_request(
+                        domain=domain, delta=delta, now=now, rank_changed=False
+                    )
+                    for domain, delta in deltas.items()
+                ],
+                ordered=False,
+            )
+        return result
+
+    @staticmethod
+    def get_rank_update(keyword: dict, rank: Optional[int]) -> dict:
+        return {
+            "id": keyword.get("id"),
+            "domain": keyword.get("domain"),
+            "rank": rank,
+            "old_rank": keyword.get("rank"),
+            "was_measured": keyword.get("last_rank_update_time") is not None,
+            "update_time": datetime.now(timezone.utc),
+        }
+
+    @staticmethod
+    def get_rank_write_criteria(update: dict) -> dict:
+        """Matches the keyword of `update` while it is live and still holds the rank replaced"""
+        return {
+            "id": update["id"],
+            "is_deleted": False,
+            "rank": update["old_rank"],
+            "last_rank_update_time": {"$ne": None} if update["was_measured"] else None,
+        }
+
+    @staticmethod
+    def get_rank_values(update: dict, change_seq: int, now: datetime) -> dict:
+        """
+        Keyword fields set by `update`. A changed rank keeps the previous one
+        and gets `change_seq` as its `rank_change_seq`.
+        """
+        values = {
+            "rank": update["rank"],
+            "last_rank_update_time": update["update_time"],
+        }
+        if update["rank"] != update["old_rank"]:
+            values |= {
+                "previous_rank": update["old_rank"],
+                "rank_changed_at": now,
+                "rank_change_seq": change_seq,
+            }
+        return values
+
+    @staticmethod
+    def get_rank_write_requests(
+        rank_updates: List[dict],
+    ) -> Tuple[List[UpdateOne], List[UpdateOne]]:
+        """
+        Builds the `daily_ranks` rows of a batch of written rank updates and the
+        matching `$inc`/`$set` deltas of the domain rollups.
+        """
+        now = datetime.now(timezone.utc)
+        daily_rank_requests = []
+        stats_deltas, changed_domains = {}, set()
+        for update in rank_updates:
+            if update["rank"] != update["old_rank"]:
+                changed_domains.add(update["domain"])
+            daily_rank_requests.append(
+                UpdateOne(
+                    {
+                        "day": update["update_time"].date().isoformat(),
+                        "keyword_id": update["id"],
+                    },
+                    {
+                        "$set": {
+                            "domain": update["domain"],
+                            "rank": update["rank"],
+                            "update_datetime": now,
+                        },
+                        "$setOnInsert": {
+                            "id": default_id(),
+                            "is_deleted": False,
+                            "create_datetime": now,
+                        },
+                    },
+                    upsert=True,
+                )
+            )
+            merge_domain_stats_deltas(
+                stats_deltas,
+                update["domain"],
+                get_domain_stats_delta(
+                    old_rank=update["old_rank"],
+                    new_rank=update["rank"],
+                    was_measured=update["was_measured"],
+                ),
+            )
+        stats_requests = [
+            get_domain_stats_request(
+                domain=domain,
+                delta=stats_deltas.get(domain, {}),
+                now=now,
+                rank_changed=domain in changed_domains,
+            )
+            for domain in stats_deltas.keys() | changed_domains
+        ]
+        return daily_rank_requests, stats_requests
+
+    @staticmethod
+    def reserve_rank_changes(keyword_db, count: int) -> int:
+        """
+        Reserves `count` numbers of the rank change sequence. The block stays
+        pending until `release_rank_changes`, so the change feed does not pass
+        it while it is written. Blocks pending for longer than
+        `CHANGE_FEED_RESERVATION_TIMEOUT_SECONDS` are dropped.
+        :return: the first reserved number
+        """
+        now = datetime.now(timezone.utc)
+        expired = now - timedelta(
+            seconds=rank_settings.CHANGE_FEED_RESERVATION_TIMEOUT_SECONDS
+        )
+        counter = keyword_db[collections_names.COUNTERS].find_one_and_update(
+            {"_id": RANK_CHANGE_SEQUENCE},
+            [
+                {"$set": {"seq": {"$add": [{"$ifNull": ["$seq", 0]}, count]}}},
+                {
+                    "$set": {
+                        "pending": {
+                            "$concatArrays": [
+                                {
+                                    "$filter": {
+                                        "input": {"$ifNull": ["$pending", []]},
+                                        "cond": {
+                                            "$gt": ["$$this.reserved_at", expired]
+                                        },
+                                    }
+                                },
+                                [
+                                    {
+                                        "first": {"$subtract": ["$seq", count - 1]},
+                                        "reserved_at": now,
+                                    }
+                                ],
+                            ]
+                        }
+                    }
+                },
+            ],
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return counter["seq"] - count + 1
+
+    @staticmethod
+    def release_rank_changes(keyword_db, first_change_seq: int):
+        keyword_db[collections_names.COUNTERS].update_one(
+            {"_id": RANK_CHANGE_SEQUENCE},
+            {"$pull": {"pending": {"first": first_change_seq}}},
+        )
+
+    def write_keyword_rank(
+        self, keyword_db, update: dict, change_seq: int, now: datetime
+    ) -> Optional[dict]:
+        """
+        Writes the rank of one keyword, compare-and-set on the rank it replaces.
+        When another writer changed the keyword since `update` was built, the
+        write is retried on top of the stored rank.
+        :return: `update` with the rank it actually replaced, None if the
+                 keyword was deleted meanwhile
+        """
+        while True:
+            result = keyword_db.keywords.update_one(
+                self.get_rank_write_criteria(update),
+                {"$set": self.get_rank_values(update, change_seq, now)},
+            )
+            if result.matched_count:
+                return update
+            stored = keyword_db.keywords.find_one(
+                {"id": update["id"], "is_deleted": False},
+                projection={"_id": 0, "rank": 1, "last_rank_update_time": 1},
+            )
+            if stored is None:
+                return None
+            update = {
+                **update,
+                "old_rank": stored.get("rank"),
+                "was_measured": stored.get("last_rank_update_time") is not None,
+            }
+
+    def write_ranks(self, keyword_db, rank_updates: List[dict]):
+        """
+        Writes a batch of rank updates with their daily ranks and rollup
+        deltas. The deltas are computed from the ranks the keyword writes
+        actually replaced, deleted keywords are left out.
+        """
+        if not rank_updates:
+            return
+        now = datetime.now(timezone.utc)
+        # whether a rank changes is only known at write time, one number each
+        first_change_seq = self.reserve_rank_changes(keyword_db, len(rank_updates))
+        try:
+            written = [
+                update
+                for change_seq, rank_update in enumerate(rank_updates, first_change_seq)
+                if (
+                    update := self.write_keyword_rank(
+                        keyword_db, rank_update, change_seq, now
+                    )
+                )
+                is not None
+            ]
+        finally:
+            self.release_rank_changes(keyword_db, first_change_seq)
+        if not written:
+            return
+        daily_rank_requests, stats_requests = self.get_rank_write_requests(written)
+        keyword_db[collections_names.DAILY_RANKS].bulk_write(
+            daily_rank_requests, ordered=False
+        )
+        if stats_requests:
+            keyword_db[collections_names.DOMAIN_STATS].bulk_write(
+                stats_requests, ordered=False
+            )
+
+    @staticmethod
+    def rebuild_domain_stats(keyword_db):
+        """
+        Recomputes the counters of every domain rollup from the current
+        keywords. Counters of domains without measured keywords are reset,
+        schedule and budget fields are kept.
+        """
+        now = datetime.now(timezone.utc)
+        domain_stats = keyword_db[collections_names.DOMAIN_STATS]
+        # rollups are upserted on domain
+        domain_stats.create_index("domain", name="domain", unique=True)
+        rollups = keyword_db.keywords.aggregate(
+            get_domain_stats_rebuild_pipeline(), allowDiskUse=True
+        )
+        for chunk in iter_chunks(rollups, rank_settings.WRITE_BATCH_SIZE):
+            domain_stats.bulk_write(
+                [get_domain_stats_rebuild_request(counters, now) for counters in chunk],
+                ordered=False,
+            )
+        domain_stats.update_many(
+            {"rebuild_datetime": {"$ne": now}},
+            {
+                "$set": {
+                    **dict.fromkeys(DOMAIN_STATS_COUNTERS, 0),
+                    "rebuild_datetime": now,
+                    "update_datetime": now,
+                }
+            },
+        )
+
+    def ensure_domain_stats(self, keyword_db=None):
+        """
+        Builds the domain rollups from the existing keywords once, so rank
+        write deltas are applied on top of complete counters. Run before any
+        rank write (API startup, rank workers).
+        """
+        if keyword_db is None:
+            mongo = pymongo.MongoClient(config.db_settings.URI)
+            keyword_db = mongo.get_database(config.db_settings.DATABASE_NAME)
+        counters = keyword_db[collections_names.COUNTERS]
+        if counters.find_one({"_id": DOMAIN_STATS_REBUILD}) is not None:
+            return
+        self.rebuild_domain_stats(keyword_db)
+        counters.update_one(
+            {"_id": DOMAIN_STATS_REBUILD},
+            {"$set": {"rebuild_datetime": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
     def get_and_update_rank(self, keyword: str, domain: str):
-        rank = get_rank(keyword, domain, page=1)
+        domains = get_serp_domains(keyword, page=1)
+        rank = find_domain_rank(domains, domain)
         devtools.debug(rank)
         mongo = pymongo.MongoClient(config.db_settings.URI)
         keyword_db = mongo.get_database(config.db_settings.DATABASE_NAME)
-        keyword_db.keywords.update_one(
-            {"keyword": keyword, "domain": domain},
-            {
-                "$set": {
-                    "rank": rank,
-                    "last_rank_update_time": datetime.now(timezone.utc),
-                }
+        self.store_serp(keyword_db, keyword, domains)
+        keyword_obj = keyword_db.keywords.find_one(
+            {"keyword": keyword, "domain": domain, "is_deleted": False},
+            projection={
+                "_id": 0,
+                "id": 1,
+                "domain": 1,
+                "rank": 1,
+                "last_rank_update_time": 1,
             },
         )
+        if keyword_obj is not None:
+            self.write_ranks(keyword_db, [self.get_rank_update(keyword_obj, rank)])
+            publish_rank_event(
+                RankEventTypeEnum.rank,
+                keyword_id=keyword_obj["id"],
+                keyword=keyword,
+                domain=domain,
+                rank=rank,
+                old_rank=keyword_obj.get("rank"),
+            )
         print(
             "-------------------------------- Finished get_rank_task --------------------------------"
         )
 
-    def update_all_rank(self, criteria: dict = None):
+    def submit_rank_update(self, keyword: str, domain: str) -> bool:
+        """
+        Queues a scrape of `keyword` on the scrape executor. When the queue is
+        full the keyword is left to the next refresh and False is returned.
+        """
+        try:
+            scrape_executor.submit(
+                self.get_and_update_rank, keyword=keyword, domain=domain
+            )
+        except ExecutorQueueFull:
+            logging.warning(f"Scrape queue full, {keyword!r} left to the next refresh")
+            return False
+        return True
+
+    def submit_rank_refresh(self, criteria: dict, run_id: str):
+        try:
+            refresh_executor.submit(
+                self.update_all_rank, criteria=criteria, run_id=run_id
+            )
+        except ExecutorQueueFull:
+            raise RankRefreshQueueFull
+
+    @staticmethod
+    def get_run_serp(keyword_db, keyword: str, since: datetime) -> Optional[List[str]]:
+        """Result domains of `keyword` if already fetched since `since`"""
+        serp = keyword_db[collections_names.SERPS].find_one(
+            {"keyword": keyword, "fetch_datetime": {"$gte": since}},
+            projection={"_id": 0, "domains": 1},
+        )
+        return None if serp is None else serp["domains"]
+
+    @staticmethod
+    def get_refresh_queue(keyword_db, criteria: dict, day: str) -> FairShareQueue:
+        """
+        Keywords matching `criteria` in fair-share order across domains, least
+        recently updated first within a domain, limited by the domain budgets
+        left for `day`.
+        """
+        queue = FairShareQueue()
+        queue.extend(
+            keyword_db.keywords.find(
+                criteria,
+                projection={
+                    "_id": 0,
+                    "id": 1,
+                    "keyword": 1,
+                    "domain": 1,
+                    "rank": 1,
+                    "last_rank_update_time": 1,
+                },
+            ).sort("last_rank_update_time")
+        )
+        stats_by_domain = {
+            domain_stats["domain"]: domain_stats
+            for domain_stats in keyword_db[collections_names.DOMAIN_STATS].find(
+                {"domain": {"$in": list(queue.queues)}},
+                projection={
+                    "_id": 0,
+                    "domain": 1,
+                    "refresh_weight": 1,
+                    "daily_budget": 1,
+                    "budget_day": 1,
+                    "budget_used": 1,
+                },
+            )
+        }
+        for domain in queue.queues:
+            queue.weights[domain] = get_domain_weight(stats_by_domain.get(domain))
+            queue.budgets[domain] = get_domain_budget_left(
+                stats_by_domain.get(domain), day
+            )
+        return queue
+
+    @staticmethod
+    def write_budget_usage(keyword_db, budget_usage: dict, day: str):
+        if not budget_usage:
+            return
+        now = datetime.now(timezone.utc)
+        keyword_db[collections_names.DOMAIN_STATS].bulk_write(
+            [
+                get_budget_usage_request(domain, used, day, now)
+                for domain, used in budget_usage.items()
+            ],
+            ordered=False,
+        )
+
+    def update_all_rank(
+        self,
+        criteria: dict = None,
+        run_id: str = None,
+        should_stop: Callable[[], bool] = None,
+    ):
+        """
+        Refreshes the ranks of the keywords matching `criteria`. `should_stop`
+        is checked before every chunk, the keywords left are refreshed by the
+        next run.
+        """
         if criteria is None:
             criteria = {}
         print(
@@ -37,25 +652,289 @@ class KeywordController(BaseController):
         mongo = pymongo.MongoClient(config.db_settings.URI)
         keyword_db = mongo.get_database(config.db_settings.DATABASE_NAME)
         criteria["is_deleted"] = False
-        keywords = keyword_db.keywords.find(criteria).sort("last_rank_update_time")
+        day = datetime.now(timezone.utc).date().isoformat()
+        queue = self.get_refresh_queue(keyword_db, criteria, day)
+        total = queue.get_scheduled_count()
+        ledger = RankRunLedger(
+            keyword_db, run_id=run_id, criteria=criteria, total=total
+        )
+        run_id = ledger.run_id
+        publish_rank_event(RankEventTypeEnum.run_started, run_id=run_id, total=total)
 
-        for keyword in keywords:
-            rank = get_rank(keyword.get("keyword"), keyword.get("domain"), page=1)
-            devtools.debug(rank)
-            keyword_db.keywords.update_one(
-                {"keyword": keyword.get("keyword"), "domain": keyword.get("domain")},
-                {
-                    "$set": {
-                        "rank": rank,
-                        "last_rank_update_time": datetime.now(timezone.utc),
-                    }
-                },
-            )
+        rank_updates = []
+        budget_usage = {}
+        done = 0
+        try:
+            with SerpBrowser() as browser:
+                for chunk in iter_chunks(queue, browser.tabs):
+                    if should_stop is not None and should_stop():
+                        break
+                    started = time.perf_counter()
+                    serps = {}
+                    for query in {keyword["keyword"] for keyword in chunk}:
+                        domains = self.get_run_serp(
+                            keyword_db, query, since=ledger.start_datetime
+                        )
+                        if domains is not None:
+                            serps[query] = domains
+                    to_fetch = {keyword["keyword"] for keyword in chunk} - set(serps)
+                    fetch_seconds = None
+                    if to_fetch:
+                        fetched = browser.get_serps(list(to_fetch), page=1)
+                        fetch_seconds = time.perf_counter() - started
+                        for query, domains in fetched.items():
+                            if not isinstance(domains, Exception):
+                                self.store_serp(keyword_db, query, domains)
+                        serps.update(fetched)
+
+                    for keyword in chunk:
+                        done += 1
+                        budget_usage[keyword["domain"]] = (
+                            budget_usage.get(keyword["domain"], 0) + 1
+                        )
+                        domains = serps[keyword["keyword"]]
+                        # the first keyword of a fetched query pays for the page
+                        cache_hit = keyword["keyword"] not in to_fetch
+                        to_fetch.discard(keyword["keyword"])
+                        if isinstance(domains, Exception):
+                            ledger.add_attempt(
+                                keyword,
+                                outcome=RankAttemptOutcomeEnum.blocked
+                                if isinstance(domains, SerpBlocked)
+                                else RankAttemptOutcomeEnum.failed,
+                                total_seconds=time.perf_counter() - started,
+                                error=repr(domains),
+                            )
+                            publish_rank_event(
+                                RankEventTypeEnum.progress,
+                                run_id=run_id,
+                                done=done,
+                                total=total,
+                            )
+                            continue
+                        rank = find_domain_rank(domains, keyword.get("domain"))
+                        devtools.debug(rank)
+                        rank_updates.append(self.get_rank_update(keyword, rank))
+                        ledger.add_attempt(
+                            keyword,
+                            outcome=RankAttemptOutcomeEnum.not_found
+                            if rank is None
+                            else RankAttemptOutcomeEnum.succeeded,
+                            total_seconds=time.perf_counter() - started,
+                            rank=rank,
+                            cache_hit=cache_hit,
+                            fetch_seconds=None if cache_hit else fetch_seconds,
+                        )
+                        publish_rank_event(
+                            RankEventTypeEnum.rank,
+                            run_id=run_id,
+                            keyword_id=keyword.get("id"),
+                            keyword=keyword.get("keyword"),
+                            domain=keyword.get("domain"),
+                            rank=rank,
+                            old_rank=keyword.get("rank"),
+                        )
+                        publish_rank_event(
+                            RankEventTypeEnum.progress,
+                            run_id=run_id,
+                            done=done,
+                            total=total,
+                        )
+                    if len(rank_updates) >= rank_settings.WRITE_BATCH_SIZE:
+                        self.write_ranks(keyword_db, rank_updates)
+                        rank_updates = []
+                        self.write_budget_usage(keyword_db, budget_usage, day)
+                        budget_usage = {}
+                        ledger.flush()
+            self.write_ranks(keyword_db, rank_updates)
+            rank_updates = []
+            self.write_budget_usage(keyword_db, budget_usage, day)
+            budget_usage = {}
+        except Exception:
+            # the ranks already scraped are kept even though the run failed
+            try:
+                self.write_ranks(keyword_db, rank_updates)
+                self.write_budget_usage(keyword_db, budget_usage, day)
+            finally:
+                ledger.finish(
+                    status=RankRunStatusEnum.failed,
+                    deferred=sum(queue.deferred.values()),
+                )
+            raise
+        ledger.finish(deferred=sum(queue.deferred.values()))
+        publish_rank_event(
+            RankEventTypeEnum.run_finished, run_id=run_id, done=done, total=total
+        )
         print(
             "-------------------------------- Finished get_rank_daily_task --------------------------------"
         )
 
+    @staticmethod
+    async def stream_rank_events(websocket: WebSocket, run_id: Optional[str] = None):
+        """
+        Forwards the published rank events to `websocket`, only the events of
+        `run_id` when given. Returns when the channel is closed.
+        """
+        pubsub = global_services.CACHE.pubsub()
+        await pubsub.subscribe(RANK_EVENTS_CHANNEL)
+        try:
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = message["data"]
+                if isinstance(data, bytes):
+                    data = data.decode()
+                if run_id and json.loads(data).get("run_id") != run_id:
+                    continue
+                await websocket.send_text(data)
+        finally:
+            await pubsub.unsubscribe(RANK_EVENTS_CHANNEL)
+            await pubsub.reset()
+
+    async def get_domains_visibility(
+        self, criteria: Optional[dict] = None
+    ) -> List[DomainVisibilityOut]:
+        if criteria is None:
+            criteria = {"is_deleted": False}
+        documents = await self.crud.aggregate(
+            pipeline=[
+                {"$match": criteria},
+                {"$project": {"_id": 0, "domain": 1, "rank": 1}},
+            ],
+            batchSize=10000,
+        )
+        report = compute_domains_visibility(
+            domains=[document["domain"] for document in documents],
+            ranks=[document.get("rank") for document in documents],
+        )
+        return [DomainVisibilityOut(**item) for item in report]
+
+    @staticmethod
+    async def sync_rank_matrix():
+        """
+        Copies the daily ranks stored since the last synced day into the local
+        rank matrix, at most every `MATRIX_SYNC_SECONDS`. The last synced day
+        is copied again as it may have been refreshed further since.
+        """
+        if not rank_matrix.is_sync_due(rank_settings.MATRIX_SYNC_SECONDS):
+            return
+        last_day = rank_matrix.last_day
+        daily_ranks = daily_ranks_crud.iter_list(
+            criteria={}
+            if last_day is None
+            else {"day": {"$gte": last_day.isoformat()}},
+            sort=[("day", pymongo.ASCENDING)],
+            projection={"_id": 0, "day": 1, "keyword_id": 1, "domain": 1, "rank": 1},
+            deleted=None,
+            as_dict=True,
+        )
+        day, ranks = None, {}
+        async for daily_rank in daily_ranks:
+            if daily_rank["day"] != day:
+                if ranks:
+                    await asyncio.to_thread(
+                        rank_matrix.append_day, date.fromisoformat(day), ranks
+                    )
+                day, ranks = daily_rank["day"], {}
+            ranks[daily_rank["keyword_id"]] = (daily_rank["domain"], daily_rank["rank"])
+        if ranks:
+            await asyncio.to_thread(
+                rank_matrix.append_day, date.fromisoformat(day), ranks
+            )
+        rank_matrix.set_synced()
+
+    async def get_domain_average_rank(
+        self, domain: str, days: int
+    ) -> DomainAverageRankOut:
+        await self.sync_rank_matrix()
+        rows = rank_matrix.get_domain_rows(domain)
+        return DomainAverageRankOut(
+            domain=domain,
+            days=days,
+            average_rank=rank_matrix.average_rank(rows, days),
+            daily_average_rank=rank_matrix.daily_average_rank(rows, days),
+        )
+
+    async def get_rank_drops(
+        self, days: int, places: int, domain: Optional[str] = None
+    ) -> List[RankDropOut]:
+        await self.sync_rank_matrix()
+        rows = rank_matrix.get_domain_rows(domain) if domain else None
+        rows, old_ranks, new_ranks = rank_matrix.dropped(days, places, rows)
+        keyword_ids = rank_matrix.get_keyword_ids(rows)
+        keywords = {
+            keyword.id: keyword
+            for keyword in await self.crud.get_list_by_ids(ids=keyword_ids) or []
+        }
+        return [
+            RankDropOut(
+                id=keyword_id,
+                keyword=keywords[keyword_id].keyword,
+                domain=keywords[keyword_id].domain,
+                old_rank=old_rank,
+                new_rank=new_rank,
+            )
+            for keyword_id, old_rank, new_rank in zip(
+                keyword_ids, old_ranks.tolist(), new_ranks.tolist()
+            )
+            if keyword_id in keywords
+        ]
+
 
 keyword_controller = KeywordController(
     crud=keywords_crud,
 )
+
+
+class SerpIndexController(BaseController):
+    pass
+
+
+serp_index_controller = SerpIndexController(
+    crud=serp_index_crud,
+)
+
+
+class DomainStatsController(BaseController):
+    async def set_domain_schedule(
+        self, domain: str, schedule: DomainScheduleIn
+    ) -> DomainStatsOut:
+        """Sets the refresh weight / daily budget of `domain`, `None` resets to the defaults"""
+        await self.crud.bulk_write(
+            [
+                get_domain_stats_request(
+                    domain,
+                    {},
+                    datetime.now(timezone.utc),
+                    rank_changed=False,
+                    fields=schedule.dict(),
+                )
+            ]
+        )
+        domain_stats = await self.crud.get_object(criteria={"domain": domain})
+        return DomainStatsOut(**domain_stats.dict())
+
+
+domain_stats_controller = DomainStatsController(
+    crud=domain_stats_crud,
+)
+
+
+class RankRunController(BaseController):
+    pass
+
+
+rank_run_controller = RankRunController(
+    crud=rank_runs_crud,
+    get_out_schema=RankRunOut,
+)
+
+
+class RankAttemptController(BaseController):
+    pass
+
+
+rank_attempt_controller = RankAttemptController(
+    crud=rank_attempts_crud,
+    get_out_schema=RankAttemptOut,
+)
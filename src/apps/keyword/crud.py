@@ -7,9 +7,27 @@ from bson import Decimal128
 from src.apps.language.enum import LanguageEnum
 from src.apps.keyword.exception import KeywordNotFound
 from src.apps.keyword.models import (
+    DailyRankDBCreateModel,
+    DailyRankDBReadModel,
+    DailyRankDBUpdateModel,
+    DomainStatsDBCreateModel,
+    DomainStatsDBReadModel,
+    DomainStatsDBUpdateModel,
     KeywordDBCreateModel,
     KeywordDBReadModel,
     KeywordDBUpdateModel,
+    RankAttemptDBCreateModel,
+    RankAttemptDBReadModel,
+    RankAttemptDBUpdateModel,
+    RankRunDBCreateModel,
+    RankRunDBReadModel,
+    RankRunDBUpdateModel,
+    SerpDBCreateModel,
+    SerpDBReadModel,
+    SerpDBUpdateModel,
+    SerpIndexDBCreateModel,
+    SerpIndexDBReadModel,
+    SerpIndexDBUpdateModel,
 )
 from src.core.base.crud import BaseCRUD
 from src.core.base.schema import BaseSchema
@@ -30,3 +48,69 @@ keywords_crud = KeywordCRUD(
     create_db_model=KeywordDBCreateModel,
     update_db_model=KeywordDBUpdateModel,
 )
+
+
+class SerpIndexCRUD(BaseCRUD):
+    pass
+
+
+serp_index_crud = SerpIndexCRUD(
+    read_db_model=SerpIndexDBReadModel,
+    create_db_model=SerpIndexDBCreateModel,
+    update_db_model=SerpIndexDBUpdateModel,
+)
+
+
+class SerpCRUD(BaseCRUD):
+    pass
+
+
+serps_crud = SerpCRUD(
+    read_db_model=SerpDBReadModel,
+    create_db_model=SerpDBCreateModel,
+    update_db_model=SerpDBUpdateModel,
+)
+
+
+class DomainStatsCRUD(BaseCRUD):
+    pass
+
+
+domain_stats_crud = DomainStatsCRUD(
+    read_db_model=DomainStatsDBReadModel,
+    create_db_model=DomainStatsDBCreateModel,
+    update_db_model=DomainStatsDBUpdateModel,
+)
+
+
+class DailyRankCRUD(BaseCRUD):
+    pass
+
+
+daily_ranks_crud = DailyRankCRUD(
+    read_db_model=DailyRankDBReadModel,
+    create_db_model=DailyRankDBCreateModel,
+    update_db_model=DailyRankDBUpdateModel,
+)
+
+
+class RankRunCRUD(BaseCRUD):
+    pass
+
+
+rank_runs_crud = RankRunCRUD(
+    read_db_model=RankRunDBReadModel,
+    create_db_model=RankRunDBCreateModel,
+    update_db_model=RankRunDBUpdateModel,
+)
+
+
+class RankAttemptCRUD(BaseCRUD):
+    pass
+
+
+rank_attempts_crud = RankAttemptCRUD(
+    read_db_model=RankAttemptDBReadModel,
+    create_db_model=RankAttemptDBCreateModel,
+    update_db_model=RankAttemptDBUpdateModel,
+)
@@ -0,0 +1,137 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from pymongo import UpdateOne
+
+from src.core.mixins import default_id
+
+RANK_BUCKETS = {"top_3": 3, "top_10": 10, "top_100": 100}
+DOMAIN_STATS_COUNTERS = ("keywords", "ranked", "not_ranked", "rank_sum", *RANK_BUCKETS)
+
+
+def get_rank_contribution(rank: Optional[int]) -> Dict[str, int]:
+    """Counters a measured keyword with `rank` adds to its domain rollup"""
+    if rank is None:
+        return {"keywords": 1, "not_ranked": 1}
+    contribution = {"keywords": 1, "ranked": 1, "rank_sum": rank}
+    for bucket, max_rank in RANK_BUCKETS.items():
+        if rank <= max_rank:
+            contribution[bucket] = 1
+    return contribution
+
+
+def get_domain_stats_delta(
+    old_rank: Optional[int],
+    new_rank: Optional[int],
+    was_measured: bool = True,
+    is_measured: bool = True,
+) -> Dict[str, int]:
+    """
+    `$inc` delta of a domain rollup for a keyword going from `old_rank` to
+    `new_rank`. `was_measured` is False for the first rank write of a keyword,
+    `is_measured` is False when a keyword is removed.
+    """
+    delta = get_rank_contribution(new_rank) if is_measured else {}
+    if was_measured:
+        for field, value in get_rank_contribution(old_rank).items():
+            delta[field] = delta.get(field, 0) - value
+    return {field: value for field, value in delta.items() if value}
+
+
+def merge_domain_stats_deltas(
+    deltas: Dict[str, Dict[str, int]], domain: str, delta: Dict[str, int]
+) -> Dict[str, Dict[str, int]]:
+    domain_delta = deltas.setdefault(domain, {})
+    for field, value in delta.items():
+        domain_delta[field] = domain_delta.get(field, 0) + value
+    return deltas
+
+
+def get_domain_stats_request(
+    domain: str,
+    delta: Dict[str, int],
+    now: datetime,
+    rank_changed: bool = True,
+    fields: Optional[dict] = None,
+) -> UpdateOne:
+    update = {
+        "$set": {**(fields or {}), "update_datetime": now},
+        "$setOnInsert": {
+            "id": default_id(),
+            "is_deleted": False,
+            "create_datetime": now,
+        },
+    }
+    if delta := {field: value for field, value in delta.items() if value}:
+        update["$inc"] = delta
+    if rank_changed:
+        update["$set"]["last_change_datetime"] = now
+    return UpdateOne({"domain": domain}, update, upsert=True)
+
+
+def get_domain_stats_rebuild_pipeline() -> List[dict]:
+    """Aggregation of the measured keywords into the counters of their domains"""
+    is_ranked = {"$ne": [{"$ifNull": ["$rank", None]}, None]}
+    group = {
+        "_id": "$domain",
+        "keywords": {"$sum": 1},
+        "ranked": {"$sum": {"$cond": [is_ranked, 1, 0]}},
+        "not_ranked": {"$sum": {"$cond": [is_ranked, 0, 1]}},
+        "rank_sum": {"$sum": {"$ifNull": ["$rank", 0]}},
+        "last_change_datetime": {"$max": "$rank_changed_at"},
+    }
+    for bucket, max_rank in RANK_BUCKETS.items():
+        group[bucket] = {
+            "$sum": {
+                "$cond": [{"$and": [is_ranked, {"$lte": ["$rank", max_rank]}]}, 1, 0]
+            }
+        }
+    return [
+        {"$match": {"is_deleted": False, "last_rank_update_time": {"$ne": None}}},
+        {"$group": group},
+    ]
+
+
+def get_domain_stats_rebuild_request(counters: dict, now: datetime) -> UpdateOne:
+    """
+    Replaces the counters of a domain rollup with `counters`, an item of
+    `get_domain_stats_rebuild_pipeline`. Schedule and budget fields are kept.
+    """
+    fields = {field: counters.get(field, 0) for field in DOMAIN_STATS_COUNTERS}
+    if counters.get("last_change_datetime") is not None:
+        fields["last_change_datetime"] = counters["last_change_datetime"]
+    return get_domain_stats_request(
+        domain=counters["_id"],
+        delta={},
+        now=now,
+        rank_changed=False,
+        fields={**fields, "rebuild_datetime": now},
+    )
+
+
+def get_budget_usage_request(
+    domain: str, used: int, day: str, now: datetime
+) -> UpdateOne:
+    """Adds `used` refreshes to the `day` budget counter of `domain`, resetting it on a new day"""
+    return UpdateOne(
+        {"domain": domain},
+        [
+            {
+                "$set": {
+                    "budget_used": {
+                        "$cond": [
+                            {"$eq": ["$budget_day", day]},
+                            {"$add": [{"$ifNull": ["$budget_used", 0]}, used]},
+                            used,
+                        ]
+                    },
+                    "budget_day": day,
+                    "update_datetime": now,
+                    "id": {"$ifNull": ["$id", default_id()]},
+                    "is_deleted": {"$ifNull": ["$is_deleted", False]},
+                    "create_datetime": {"$ifNull": ["$create_datetime", now]},
+                }
+            }
+        ],
+        upsert=True,
+    )
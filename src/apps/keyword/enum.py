@@ -51,6 +51,12 @@ class KeywordErrorMessageEnum(str, Enum):
     invalid_quantity: str = "invalid_quantity"
 
 
+class KeywordServiceUnavailableDetailEnum(List[str], Enum):
+    refresh_queue_full: List[str] = [
+        "A rank refresh is already running or queued, try again later"
+    ]
+
+
 class KeywordDetailEnum(List[str], Enum):
     no_admin_for_keyword: List[str] = ["Failed"]
 
@@ -85,3 +91,23 @@ class KeywordErrorDetailEnum(list, Enum):
     invalid_quantity: List[str] = ["invalid quantity"]
     duplicated_detail: List[str] = ["duplicated detail"]
     duplicated_detail_id: List[str] = ["duplicated detail id"]
+
+
+class RankEventTypeEnum(str, Enum):
+    run_started: str = "run_started"
+    rank: str = "rank"
+    progress: str = "progress"
+    run_finished: str = "run_finished"
+
+
+class RankRunStatusEnum(str, Enum):
+    running: str = "running"
+    finished: str = "finished"
+    failed: str = "failed"
+
+
+class RankAttemptOutcomeEnum(str, Enum):
+    succeeded: str = "succeeded"
+    not_found: str = "not_found"
+    blocked: str = "blocked"
+    failed: str = "failed"
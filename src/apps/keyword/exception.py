@@ -14,3 +14,10 @@ InvalidQuantity = CustomHTTPException(
     message=messages.KeywordErrorMessageEnum.invalid_quantity,
     status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
 )
+
+RankRefreshQueueFull = CustomHTTPException(
+    detail=enum.KeywordServiceUnavailableDetailEnum.refresh_queue_full,
+    message=messages.KeywordServiceUnavailableMessageEnum.refresh_queue_full,
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    headers={"Retry-After": "60"},
+)
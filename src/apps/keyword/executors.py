@@ -0,0 +1,15 @@
+from src.core.executors import BoundedExecutor
+from src.main.config import rank_settings
+
+# single keyword scrapes, e.g. after a keyword is created
+scrape_executor = BoundedExecutor(
+    name="rank_scrape",
+    max_workers=rank_settings.SCRAPE_WORKERS,
+    max_queue=rank_settings.SCRAPE_QUEUE_SIZE,
+)
+# full refreshes, one at a time so they don't take all the browsers
+refresh_executor = BoundedExecutor(
+    name="rank_refresh",
+    max_workers=1,
+    max_queue=rank_settings.REFRESH_QUEUE_SIZE,
+)
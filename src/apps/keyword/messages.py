@@ -26,3 +26,7 @@ class KeywordErrorMessageEnum(str, Enum):
     not_found: str = "keyword_not_found"
     # not_found_or_disabled: str = "keyword_not_found_or_disabled"
     invalid_quantity: str = "invalid_quantity"
+
+
+class KeywordServiceUnavailableMessageEnum(str, Enum):
+    refresh_queue_full: str = "rank_refresh_queue_full"
@@ -1,13 +1,15 @@
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 import pymongo
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, validator
 
+from src.apps.keyword.enum import RankAttemptOutcomeEnum, RankRunStatusEnum
+from src.apps.keyword.sharding import get_query_shard
 from src.core import mixins
-from src.core.base.models import BaseDBReadModel, BaseDBModel
+from src.core.base.models import BaseDBReadModel, BaseDBModel, not_deleted_index
 from src.core.mixins import DB_ID, default_id
-from src.main.config import collections_names
+from src.main.config import collections_names, rank_settings
 
 
 class RelatedKeywordModel(BaseModel):
@@ -25,6 +27,10 @@ class KeywordBaseModel(
     domain: str
     rank: None | int
     last_rank_update_time: None | datetime
+    previous_rank: None | int
+    rank_changed_at: None | datetime
+    rank_change_seq: None | int
+    shard: None | int
 
     class Config(BaseModel.Config):
         arbitrary_types_allowed = True
@@ -32,7 +38,28 @@ class KeywordBaseModel(
     class Meta:
         collection_name = collections_names.KEYWORDS
         entity_name = "keyword"
-        indexes = [pymongo.IndexModel("id", name="id", unique=True)]
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel("rank_change_seq", name="rank_change_seq", sparse=True),
+            not_deleted_index(
+                [("create_datetime", pymongo.DESCENDING), ("id", pymongo.ASCENDING)],
+                name="not_deleted_create_datetime_id",
+            ),
+            not_deleted_index(
+                [("keyword", pymongo.ASCENDING), ("domain", pymongo.ASCENDING)],
+                name="not_deleted_keyword_domain",
+            ),
+            not_deleted_index(
+                "last_rank_update_time", name="not_deleted_last_rank_update_time"
+            ),
+            pymongo.IndexModel(
+                [
+                    ("shard", pymongo.ASCENDING),
+                    ("last_rank_update_time", pymongo.ASCENDING),
+                ],
+                name="shard_last_rank_update_time",
+            ),
+        ]
 
 
 class KeywordDBReadModel(KeywordBaseModel, BaseDBReadModel):
@@ -45,8 +72,269 @@ class KeywordDBReadModel(KeywordBaseModel, BaseDBReadModel):
 
 class KeywordDBCreateModel(KeywordBaseModel, mixins.CreateDatetimeMixin):
     id: DB_ID = Field(default_factory=default_id)
-    pass
+
+    # pylint: disable=no-self-argument,no-self-use
+    @validator("shard", always=True)
+    def set_shard(cls, value: Optional[int], values: dict) -> Optional[int]:
+        if value is None and values.get("keyword"):
+            return get_query_shard(values["keyword"])
+        return value
 
 
 class KeywordDBUpdateModel(KeywordBaseModel, mixins.UpdateDatetimeMixin):
     pass
+
+
+class SerpIndexBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    keyword: str
+    domain: str
+    position: int
+    fetch_datetime: datetime
+
+    class Meta:
+        collection_name = collections_names.SERP_INDEX
+        entity_name = "serp_index"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel(
+                [("domain", pymongo.ASCENDING), ("position", pymongo.ASCENDING)],
+                name="domain_position",
+            ),
+            pymongo.IndexModel(
+                [("keyword", pymongo.ASCENDING), ("domain", pymongo.ASCENDING)],
+                name="keyword_domain",
+                unique=True,
+            ),
+        ]
+
+
+class SerpIndexDBReadModel(SerpIndexBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class SerpIndexDBCreateModel(SerpIndexBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class SerpIndexDBUpdateModel(SerpIndexBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class SerpBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    keyword: str
+    domains: List[str] = []
+    fetch_datetime: datetime
+
+    class Meta:
+        collection_name = collections_names.SERPS
+        entity_name = "serp"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel("keyword", name="keyword", unique=True),
+        ]
+
+
+class SerpDBReadModel(SerpBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class SerpDBCreateModel(SerpBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class SerpDBUpdateModel(SerpBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class DomainStatsBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    domain: str
+    keywords: int = 0
+    ranked: int = 0
+    not_ranked: int = 0
+    rank_sum: int = 0
+    top_3: int = 0
+    top_10: int = 0
+    top_100: int = 0
+    last_change_datetime: Optional[datetime]
+    refresh_weight: Optional[float]
+    daily_budget: Optional[int]
+    budget_day: Optional[str]
+    budget_used: int = 0
+
+    class Meta:
+        collection_name = collections_names.DOMAIN_STATS
+        entity_name = "domain_stats"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel("domain", name="domain", unique=True),
+            not_deleted_index(
+                [("keywords", pymongo.DESCENDING), ("id", pymongo.ASCENDING)],
+                name="not_deleted_keywords_id",
+            ),
+        ]
+
+
+class DomainStatsDBReadModel(DomainStatsBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class DomainStatsDBCreateModel(DomainStatsBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class DomainStatsDBUpdateModel(DomainStatsBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class RankRunBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    criteria: dict = {}
+    status: RankRunStatusEnum = RankRunStatusEnum.running
+    start_datetime: datetime
+    end_datetime: Optional[datetime]
+    duration_seconds: Optional[float]
+    total: int = 0
+    attempted: int = 0
+    succeeded: int = 0
+    not_found: int = 0
+    blocked: int = 0
+    failed: int = 0
+    pages_fetched: int = 0
+    cache_hits: int = 0
+    deferred: int = 0
+    latency_p50: Optional[float]
+    latency_p95: Optional[float]
+
+    class Meta:
+        collection_name = collections_names.RANK_RUNS
+        entity_name = "rank_run"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel(
+                [("start_datetime", pymongo.DESCENDING)], name="start_datetime"
+            ),
+        ]
+
+
+class RankRunDBReadModel(RankRunBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class RankRunDBCreateModel(RankRunBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class RankRunDBUpdateModel(RankRunBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class RankAttemptBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    run_id: Optional[DB_ID]
+    keyword_id: DB_ID
+    keyword: str
+    domain: str
+    outcome: RankAttemptOutcomeEnum
+    rank: Optional[int]
+    cache_hit: bool = False
+    fetch_seconds: Optional[float]
+    total_seconds: float
+    error: Optional[str]
+    attempt_datetime: datetime
+
+    class Meta:
+        collection_name = collections_names.RANK_ATTEMPTS
+        entity_name = "rank_attempt"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel(
+                [
+                    ("run_id", pymongo.ASCENDING),
+                    ("attempt_datetime", pymongo.ASCENDING),
+                ],
+                name="run_id_attempt_datetime",
+            ),
+            pymongo.IndexModel(
+                "attempt_datetime",
+                name="attempt_datetime_ttl",
+                expireAfterSeconds=rank_settings.ATTEMPTS_TTL_SECONDS,
+            ),
+        ]
+
+
+class RankAttemptDBReadModel(RankAttemptBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class RankAttemptDBCreateModel(RankAttemptBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class RankAttemptDBUpdateModel(RankAttemptBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class DailyRankBaseModel(BaseDBModel, mixins.SoftDeleteMixin):
+    keyword_id: DB_ID
+    domain: str
+    day: str
+    rank: Optional[int]
+
+    class Meta:
+        collection_name = collections_names.DAILY_RANKS
+        entity_name = "daily_rank"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel(
+                [("day", pymongo.ASCENDING), ("keyword_id", pymongo.ASCENDING)],
+                name="day_keyword_id",
+                unique=True,
+            ),
+        ]
+
+
+class DailyRankDBReadModel(DailyRankBaseModel, BaseDBReadModel):
+    id: DB_ID
+
+
+class DailyRankDBCreateModel(DailyRankBaseModel, mixins.CreateDatetimeMixin):
+    id: DB_ID = Field(default_factory=default_id)
+
+
+class DailyRankDBUpdateModel(DailyRankBaseModel, mixins.UpdateDatetimeMixin):
+    pass
+
+
+class RankShardBaseModel(BaseDBModel):
+    shard: int
+    owner: Optional[str]
+    heartbeat_datetime: Optional[datetime]
+
+    class Meta:
+        collection_name = collections_names.RANK_SHARDS
+        entity_name = "rank_shard"
+        indexes = [
+            pymongo.IndexModel("shard", name="shard", unique=True),
+            pymongo.IndexModel("owner", name="owner"),
+        ]
+
+
+class RankShardDBReadModel(RankShardBaseModel, BaseDBReadModel):
+    create_datetime: Optional[datetime]
+
+
+class RankWorkerBaseModel(BaseDBModel):
+    host: str
+    pid: int
+    shards: List[int] = []
+    heartbeat_datetime: datetime
+
+    class Meta:
+        collection_name = collections_names.RANK_WORKERS
+        entity_name = "rank_worker"
+        indexes = [
+            pymongo.IndexModel("id", name="id", unique=True),
+            pymongo.IndexModel("heartbeat_datetime", name="heartbeat_datetime"),
+        ]
+
+
+class RankWorkerDBReadModel(RankWorkerBaseModel, BaseDBReadModel):
+    id: str
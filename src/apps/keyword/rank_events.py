@@ -0,0 +1,39 @@
+import json
+import logging
+from typing import Optional
+
+import redis
+
+from src.apps.keyword.enum import RankEventTypeEnum
+from src.core.utils import DecimalEncoder
+from src.main.config import cache_settings
+
+RANK_EVENTS_CHANNEL = "keywords:rank_events"
+
+_redis_client: Optional[redis.Redis] = None
+
+
+def get_redis_client() -> redis.Redis:
+    """Sync client for publishing from the threads running the scrapes"""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=cache_settings.HOST,
+            port=cache_settings.PORT,
+            db=cache_settings.DB,
+            password=cache_settings.PASSWORD,
+            socket_timeout=cache_settings.TIMEOUT_SECONDS,
+        )
+    return _redis_client
+
+
+def publish_rank_event(event_type: RankEventTypeEnum, **data):
+    """
+    Publishes a rank event for the live streams. Failing to publish never
+    breaks a rank refresh.
+    """
+    message = json.dumps({"type": event_type, **data}, cls=DecimalEncoder)
+    try:
+        get_redis_client().publish(RANK_EVENTS_CHANNEL, message)
+    except redis.RedisError:
+        logging.exception("Publishing rank event failed:")
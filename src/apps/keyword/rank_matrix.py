@@ -0,0 +1,259 @@
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.main.config import rank_settings
+
+NOT_MEASURED = -1
+NOT_RANKED = 0
+
+
+class RankMatrix(object):
+    """
+    Dense keywords x days matrix of daily ranks, kept in a memory-mapped
+    `int16` file.
+
+    The file is stored column-major, so appending a day only appends bytes at
+    the end of the file. Rows are pre-allocated and the file is rewritten
+    (with doubled capacity) only when keywords outgrow it.
+    Cells hold the rank, `NOT_RANKED` if the domain was not found in the
+    results or `NOT_MEASURED` if the keyword was not fetched that day.
+
+    The matrix is a local cache of the `daily_ranks` collection, synced by
+    each host reading it. Writes are serialized across the processes of the
+    host with an exclusive `flock` on `lock`.
+    """
+
+    dtype = np.int16
+
+    def __init__(self, path: str, initial_capacity: int = 1024):
+        self.path = path
+        self.data_path = os.path.join(path, "ranks.dat")
+        self.meta_path = os.path.join(path, "meta.json")
+        self.lock_path = os.path.join(path, "lock")
+        self.initial_capacity = initial_capacity
+        self.sync_time: Optional[float] = None
+        self._lock = threading.Lock()
+        self._meta_mtime = None
+        self._meta = None
+        self._domains = None
+        self._matrix = None
+
+    def _empty_meta(self) -> dict:
+        return {
+            "start_day": None,
+            "days": 0,
+            "capacity": self.initial_capacity,
+            "rows": {},
+            "domains": [],
+        }
+
+    def _load(self):
+        try:
+            mtime = os.path.getmtime(self.meta_path)
+        except FileNotFoundError:
+            if self._meta is None:
+                self._meta = self._empty_meta()
+                self._domains = np.array([], dtype=object)
+            return
+        if mtime == self._meta_mtime:
+            return
+        with open(self.meta_path, encoding="utf-8") as meta_file:
+            self._meta = json.load(meta_file)
+        self._meta_mtime = mtime
+        self._domains = np.array(self._meta["domains"], dtype=object)
+        self._matrix = None
+
+    def _save_meta(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as meta_file:
+            json.dump(self._meta, meta_file)
+        os.replace(tmp_path, self.meta_path)
+        self._meta_mtime = os.path.getmtime(self.meta_path)
+
+    def _open(self, mode: str = "r") -> Optional[np.memmap]:
+        if not self._meta["days"]:
+            return None
+        return np.memmap(
+            self.data_path,
+            dtype=self.dtype,
+            mode=mode,
+            shape=(self._meta["capacity"], self._meta["days"]),
+            order="F",
+        )
+
+    @property
+    def matrix(self) -> np.ndarray:
+        """Read-only view of the used part of the matrix (rows x days)"""
+        self._load()
+        if self._matrix is None:
+            self._matrix = self._open()
+        if self._matrix is None:
+            return np.empty((0, 0), dtype=self.dtype)
+        return self._matrix[: len(self._meta["domains"])]
+
+    @property
+    def start_day(self) -> Optional[date]:
+        self._load()
+        if start_day := self._meta["start_day"]:
+            return date.fromisoformat(start_day)
+        return None
+
+    @property
+    def last_day(self) -> Optional[date]:
+        self._load()
+        if start_day := self.start_day:
+            return start_day + timedelta(days=self._meta["days"] - 1)
+        return None
+
+    def is_sync_due(self, seconds: int) -> bool:
+        return self.sync_time is None or time.monotonic() - self.sync_time >= seconds
+
+    def set_synced(self):
+        self.sync_time = time.monotonic()
+
+    @contextmanager
+    def _write_lock(self):
+        with self._lock:
+            os.makedirs(self.path, exist_ok=True)
+            with open(self.lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _grow_capacity(self, rows_needed: int):
+        capacity = self._meta["capacity"]
+        while capacity < rows_needed:
+            capacity *= 2
+        if self._meta["days"]:
+            old = self._open()
+            tmp_path = f"{self.data_path}.tmp"
+            new = np.memmap(
+                tmp_path,
+                dtype=self.dtype,
+                mode="w+",
+                shape=(capacity, self._meta["days"]),
+                order="F",
+            )
+            new[:] = NOT_MEASURED
+            new[: old.shape[0]] = old
+            new.flush()
+            del old, new
+            os.replace(tmp_path, self.data_path)
+        self._meta["capacity"] = capacity
+
+    def _extend_days(self, days: int):
+        new_columns = days - self._meta["days"]
+        os.makedirs(self.path, exist_ok=True)
+        with open(self.data_path, "ab") as data_file:
+            np.full(
+                self._meta["capacity"] * new_columns, NOT_MEASURED, dtype=self.dtype
+            ).tofile(data_file)
+        self._meta["days"] = days
+
+    def get_rows(self, keyword_ids: List[str]) -> np.ndarray:
+        self._load()
+        rows = self._meta["rows"]
+        return np.array(
+            [rows[_id] for _id in keyword_ids if _id in rows], dtype=np.int64
+        )
+
+    def get_domain_rows(self, domain: str) -> np.ndarray:
+        self._load()
+        return np.flatnonzero(self._domains == domain)
+
+    def get_keyword_ids(self, rows: np.ndarray) -> List[str]:
+        self._load()
+        ids_by_row = {row: _id for _id, row in self._meta["rows"].items()}
+        return [ids_by_row[int(row)] for row in rows]
+
+    def append_day(self, day: date, ranks: Dict[str, Tuple[str, Optional[int]]]):
+        """
+        Stores the ranks of `day` as a column.
+        :param ranks: keyword id -> (domain, rank or None)
+        """
+        with self._write_lock():
+            self._meta_mtime = None
+            self._load()
+            meta = self._meta
+            if meta["start_day"] is None:
+                meta["start_day"] = day.isoformat()
+            column = (day - date.fromisoformat(meta["start_day"])).days
+            if column < 0:
+                raise ValueError(f"{day} is before the matrix start day")
+            for keyword_id, (domain, _) in ranks.items():
+                if keyword_id not in meta["rows"]:
+                    meta["rows"][keyword_id] = len(meta["domains"])
+                    meta["domains"].append(domain)
+            if len(meta["domains"]) > meta["capacity"]:
+                self._grow_capacity(len(meta["domains"]))
+            if column >= meta["days"]:
+                self._extend_days(column + 1)
+            matrix = self._open(mode="r+")
+            rows = np.fromiter(
+                (meta["rows"][keyword_id] for keyword_id in ranks),
+                dtype=np.int64,
+                count=len(ranks),
+            )
+            values = np.fromiter(
+                (rank or NOT_RANKED for _, rank in ranks.values()),
+                dtype=self.dtype,
+                count=len(ranks),
+            )
+            matrix[rows, column] = values
+            matrix.flush()
+            del matrix
+            self._save_meta()
+            self._domains = np.array(meta["domains"], dtype=object)
+            self._matrix = None
+
+    def average_rank(self, rows: np.ndarray, days: int) -> Optional[float]:
+        """Average of the measured ranks of `rows` over the last `days` days"""
+        window = self.matrix[rows, -days:]
+        ranked = window > NOT_RANKED
+        if not ranked.any():
+            return None
+        return float(window[ranked].mean())
+
+    def daily_average_rank(self, rows: np.ndarray, days: int) -> List[Optional[float]]:
+        window = self.matrix[rows, -days:].astype(np.float32)
+        window[window <= NOT_RANKED] = np.nan
+        ranked_count = np.count_nonzero(~np.isnan(window), axis=0)
+        sums = np.nansum(window, axis=0)
+        return [
+            float(total / count) if count else None
+            for total, count in zip(sums, ranked_count)
+        ]
+
+    def dropped(
+        self, days: int, places: int, rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Rows whose rank got worse by more than `places` between `days` days ago
+        and the latest day.
+        :return: (rows, old ranks, new ranks)
+        """
+        matrix = self.matrix if rows is None else self.matrix[rows]
+        if matrix.shape[1] == 0:
+            empty = np.array([], dtype=np.int64)
+            return empty, empty, empty
+        old = matrix[:, max(matrix.shape[1] - 1 - days, 0)]
+        new = matrix[:, -1]
+        mask = (old > NOT_RANKED) & (new > NOT_RANKED) & (new - old > places)
+        matched = np.flatnonzero(mask)
+        if rows is not None:
+            return rows[matched], old[matched], new[matched]
+        return matched, old[matched], new[matched]
+
+
+rank_matrix = RankMatrix(path=rank_settings.MATRIX_PATH)
@@ -0,0 +1,110 @@
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import numpy as np
+
+from src.apps.keyword.enum import RankAttemptOutcomeEnum, RankRunStatusEnum
+from src.core.mixins import default_id
+from src.main.config import collections_names
+
+
+class RankRunLedger(object):
+    """
+    Counters and per-keyword attempt rows of one rank refresh run, kept in
+    `rank_runs` and `rank_attempts`. Attempts are buffered and written with
+    the rank batches, the run document is refreshed on every flush so a
+    running refresh can be watched.
+    """
+
+    def __init__(self, keyword_db, run_id: Optional[str], criteria: dict, total: int):
+        self.runs = keyword_db[collections_names.RANK_RUNS]
+        self.attempts = keyword_db[collections_names.RANK_ATTEMPTS]
+        self.run_id = run_id or default_id()
+        self.start_datetime = datetime.now(timezone.utc)
+        self.counters = {outcome.value: 0 for outcome in RankAttemptOutcomeEnum}
+        self.counters.update(attempted=0, pages_fetched=0, cache_hits=0)
+        self.latencies: List[float] = []
+        self._pending: List[dict] = []
+        self.runs.insert_one(
+            {
+                "id": self.run_id,
+                "criteria": dict(criteria),
+                "status": RankRunStatusEnum.running.value,
+                "start_datetime": self.start_datetime,
+                "total": total,
+                **self.counters,
+                "is_deleted": False,
+                "create_datetime": self.start_datetime,
+            }
+        )
+
+    def add_attempt(
+        self,
+        keyword: dict,
+        outcome: RankAttemptOutcomeEnum,
+        total_seconds: float,
+        rank: Optional[int] = None,
+        cache_hit: bool = False,
+        fetch_seconds: Optional[float] = None,
+        error: Optional[str] = None,
+    ):
+        now = datetime.now(timezone.utc)
+        self.counters["attempted"] += 1
+        self.counters[outcome.value] += 1
+        if cache_hit:
+            self.counters["cache_hits"] += 1
+        if fetch_seconds is not None:
+            self.counters["pages_fetched"] += 1
+            self.latencies.append(fetch_seconds)
+        self._pending.append(
+            {
+                "id": default_id(),
+                "run_id": self.run_id,
+                "keyword_id": keyword.get("id"),
+                "keyword": keyword.get("keyword"),
+                "domain": keyword.get("domain"),
+                "outcome": outcome.value,
+                "rank": rank,
+                "cache_hit": cache_hit,
+                "fetch_seconds": fetch_seconds,
+                "total_seconds": total_seconds,
+                "error": error,
+                "attempt_datetime": now,
+                "is_deleted": False,
+                "create_datetime": now,
+            }
+        )
+
+    def get_latency_percentiles(self) -> dict:
+        if not self.latencies:
+            return {"latency_p50": None, "latency_p95": None}
+        p50, p95 = np.percentile(self.latencies, [50, 95])
+        return {
+            "latency_p50": round(float(p50), 3),
+            "latency_p95": round(float(p95), 3),
+        }
+
+    def flush(self, **fields):
+        if self._pending:
+            self.attempts.insert_many(self._pending, ordered=False)
+            self._pending = []
+        self.runs.update_one(
+            {"id": self.run_id},
+            {
+                "$set": {
+                    **self.counters,
+                    **self.get_latency_percentiles(),
+                    "update_datetime": datetime.now(timezone.utc),
+                    **fields,
+                }
+            },
+        )
+
+    def finish(self, status: RankRunStatusEnum = RankRunStatusEnum.finished, **fields):
+        end_datetime = datetime.now(timezone.utc)
+        self.flush(
+            **fields,
+            status=status.value,
+            end_datetime=end_datetime,
+            duration_seconds=(end_datetime - self.start_datetime).total_seconds(),
+        )
@@ -0,0 +1,73 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+MAX_POSITION = 100
+
+# Estimated organic click-through rate by position, index 0 = not ranked
+CTR_BY_POSITION = np.zeros(MAX_POSITION + 1, dtype=np.float64)
+CTR_BY_POSITION[1:11] = [
+    0.316,
+    0.158,
+    0.100,
+    0.072,
+    0.051,
+    0.040,
+    0.031,
+    0.026,
+    0.022,
+    0.020,
+]
+CTR_BY_POSITION[11:21] = np.linspace(0.012, 0.006, 10)
+CTR_BY_POSITION[21:] = np.linspace(0.004, 0.0005, MAX_POSITION - 20)
+
+
+def get_ranks_array(ranks: Sequence[Optional[int]]) -> np.ndarray:
+    """Converts ranks to an int array, `None` and out of range ranks become 0"""
+    array = np.fromiter((rank or 0 for rank in ranks), dtype=np.int64, count=len(ranks))
+    array[(array < 0) | (array > MAX_POSITION)] = 0
+    return array
+
+
+def compute_domains_visibility(
+    domains: Sequence[str], ranks: Sequence[Optional[int]]
+) -> List[dict]:
+    """
+    Per-domain visibility report over all (domain, rank) pairs.
+
+    `visibility` is the CTR-weighted score of the domain in percent of the
+    score it would get ranking first for all its keywords, `share_of_voice`
+    is its part of the CTR-weighted score of all domains in percent.
+    """
+    if not len(domains):
+        return []
+    names, codes = np.unique(np.asarray(domains, dtype=object), return_inverse=True)
+    ranks_array = get_ranks_array(ranks)
+    minlength = len(names)
+    ranked = ranks_array > 0
+    ctr = CTR_BY_POSITION[ranks_array]
+
+    keywords = np.bincount(codes, minlength=minlength)
+    top_3 = np.bincount(codes, weights=ranked & (ranks_array <= 3), minlength=minlength)
+    top_10 = np.bincount(
+        codes, weights=ranked & (ranks_array <= 10), minlength=minlength
+    )
+    top_100 = np.bincount(codes, weights=ranked, minlength=minlength)
+    ctr_sum = np.bincount(codes, weights=ctr, minlength=minlength)
+    visibility = ctr_sum / (keywords * CTR_BY_POSITION[1]) * 100
+    total_ctr = ctr_sum.sum()
+    share_of_voice = ctr_sum / total_ctr * 100 if total_ctr else np.zeros(minlength)
+
+    order = np.argsort(-share_of_voice, kind="stable")
+    return [
+        {
+            "domain": names[idx],
+            "keywords": int(keywords[idx]),
+            "top_3": int(top_3[idx]),
+            "top_10": int(top_10[idx]),
+            "top_100": int(top_100[idx]),
+            "visibility": round(float(visibility[idx]), 4),
+            "share_of_voice": round(float(share_of_voice[idx]), 4),
+        }
+        for idx in order
+    ]
@@ -0,0 +1,89 @@
+import heapq
+from collections import deque
+from typing import Dict, Iterable, Iterator, Optional
+
+from src.main.config import rank_settings
+
+
+def get_domain_weight(domain_stats: Optional[dict]) -> float:
+    weight = (domain_stats or {}).get("refresh_weight")
+    return weight if weight and weight > 0 else rank_settings.DEFAULT_DOMAIN_WEIGHT
+
+
+def get_domain_budget_left(domain_stats: Optional[dict], day: str) -> Optional[int]:
+    """Scrapes `domain` may still do on `day`, `None` means unlimited"""
+    domain_stats = domain_stats or {}
+    budget = domain_stats.get("daily_budget")
+    if budget is None:
+        budget = rank_settings.DEFAULT_DAILY_BUDGET
+    if not budget:
+        return None
+    used = domain_stats.get("budget_used", 0)
+    if domain_stats.get("budget_day") != day:
+        used = 0
+    return max(budget - used, 0)
+
+
+class FairShareQueue(object):
+    """
+    Weighted fair queuing of keywords across domains.
+
+    Every domain has its own FIFO of keywords and a virtual finish time that
+    grows by `1 / weight` per served keyword; the domain with the smallest
+    finish time is served next. A domain with weight 2 gets twice the
+    refreshes of a domain with weight 1 while both have work, and a domain
+    that runs out of keywords or budget leaves its share to the others.
+    """
+
+    def __init__(
+        self,
+        weights: Optional[Dict[str, float]] = None,
+        budgets: Optional[Dict[str, Optional[int]]] = None,
+    ):
+        self.weights = weights or {}
+        self.budgets = budgets or {}
+        self.queues: Dict[str, deque] = {}
+        self.deferred: Dict[str, int] = {}
+        self._heap = []
+        self._counter = 0
+
+    def __len__(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def get_scheduled_count(self) -> int:
+        """Keywords that will be served, the rest is over the domain budgets"""
+        return sum(
+            len(queue)
+            if self.budgets.get(domain) is None
+            else min(len(queue), self.budgets[domain])
+            for domain, queue in self.queues.items()
+        )
+
+    def extend(self, keywords: Iterable[dict]):
+        for keyword in keywords:
+            self.queues.setdefault(keyword["domain"], deque()).append(keyword)
+
+    def _push(self, domain: str, finish: float):
+        self._counter += 1
+        heapq.heappush(self._heap, (finish, self._counter, domain))
+
+    def _has_budget(self, domain: str) -> bool:
+        budget = self.budgets.get(domain)
+        return budget is None or budget > 0
+
+    def __iter__(self) -> Iterator[dict]:
+        self._heap = []
+        for domain in self.queues:
+            self._push(domain, 1 / self.weights.get(domain, 1))
+        while self._heap:
+            finish, _, domain = heapq.heappop(self._heap)
+            queue = self.queues[domain]
+            if not self._has_budget(domain):
+                self.deferred[domain] = len(queue)
+                queue.clear()
+                continue
+            yield queue.popleft()
+            if self.budgets.get(domain) is not None:
+                self.budgets[domain] -= 1
+            if queue:
+                self._push(domain, finish + 1 / self.weights.get(domain, 1))
@@ -1,4 +1,7 @@
 from datetime import datetime
+from typing import List, Optional
+
+from pydantic import Field, root_validator
 
 from src.core.base.schema import BaseSchema
 
@@ -55,3 +58,145 @@ class KeywordDetailSchema(BaseKeywordSchema):
 
 class KeywordListSchema(BaseKeywordSchema):
     pass
+
+
+class SerpPositionSchema(BaseSchema):
+    keyword: str
+    domain: str
+    position: int
+    fetch_datetime: datetime
+
+
+class DomainAverageRankOut(BaseSchema):
+    domain: str
+    days: int
+    average_rank: Optional[float]
+    daily_average_rank: List[Optional[float]] = []
+
+
+class RankDropOut(BaseSchema):
+    id: str
+    keyword: str
+    domain: str
+    old_rank: int
+    new_rank: int
+
+
+class DomainVisibilityOut(BaseSchema):
+    domain: str
+    keywords: int
+    top_3: int
+    top_10: int
+    top_100: int
+    visibility: float
+    share_of_voice: float
+
+
+class DomainStatsOut(BaseSchema):
+    domain: str
+    keywords: int = 0
+    ranked: int = 0
+    not_ranked: int = 0
+    top_3: int = 0
+    top_10: int = 0
+    top_100: int = 0
+    average_rank: Optional[float]
+    last_change_datetime: Optional[datetime]
+    refresh_weight: Optional[float]
+    daily_budget: Optional[int]
+    budget_day: Optional[str]
+    budget_used: int = 0
+
+    # pylint: disable=no-self-argument,no-self-use
+    @root_validator(pre=True)
+    def set_average_rank(cls, values: dict) -> dict:
+        if values.get("ranked") and values.get("rank_sum") is not None:
+            values["average_rank"] = values["rank_sum"] / values["ranked"]
+        return values
+
+
+class KeywordRankChangeOut(BaseSchema):
+    id: str
+    keyword: str
+    domain: str
+    previous_rank: Optional[int]
+    rank: Optional[int]
+    rank_changed_at: datetime
+    rank_change_seq: int
+
+
+class KeywordRankChangesOut(BaseSchema):
+    since: int
+    next_since: int
+    has_more: bool
+    result: List[KeywordRankChangeOut] = []
+
+
+class RankRunOut(BaseSchema):
+    id: str
+    status: str
+    criteria: dict = {}
+    start_datetime: datetime
+    end_datetime: Optional[datetime]
+    duration_seconds: Optional[float]
+    total: int = 0
+    attempted: int = 0
+    succeeded: int = 0
+    not_found: int = 0
+    blocked: int = 0
+    failed: int = 0
+    pages_fetched: int = 0
+    cache_hits: int = 0
+    deferred: int = 0
+    latency_p50: Optional[float]
+    latency_p95: Optional[float]
+
+
+class RankAttemptOut(BaseSchema):
+    keyword_id: str
+    keyword: str
+    domain: str
+    outcome: str
+    rank: Optional[int]
+    cache_hit: bool = False
+    fetch_seconds: Optional[float]
+    total_seconds: float
+    error: Optional[str]
+    attempt_datetime: datetime
+
+
+class DomainScheduleIn(BaseSchema):
+    refresh_weight: Optional[float] = Field(None, gt=0)
+    daily_budget: Optional[int] = Field(None, ge=0)
+
+
+class ExecutorMetricsOut(BaseSchema):
+    name: str
+    max_workers: int
+    max_queue: int
+    running: int
+    queued: int
+    submitted: int
+    rejected: int
+    completed: int
+    failed: int
+    avg_wait_seconds: Optional[float]
+    max_wait_seconds: float
+    avg_run_seconds: Optional[float]
+
+
+class BrowserStatsOut(BaseSchema):
+    pid: int
+    processes: int
+    rss_mb: float
+    age_seconds: int
+
+
+class BrowsersStatsOut(BaseSchema):
+    browsers: int
+    processes: int
+    rss_mb: float
+    max_rss_mb: int
+    reaped: int
+    killed_over_rss: int
+    detail: List[BrowserStatsOut] = []
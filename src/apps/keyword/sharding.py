@@ -0,0 +1,194 @@
+import hashlib
+import math
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from src.core.mixins import default_id
+from src.main.config import collections_names, rank_settings
+
+
+def normalize_query(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+def get_query_shard(keyword: str, shards: int = None) -> int:
+    """
+    Stable shard of a query. Keywords of the same query land in the same
+    shard, so a query is only scraped by the worker owning it.
+    """
+    digest = hashlib.md5(normalize_query(keyword).encode()).digest()
+    return int.from_bytes(digest[:8], "big") % (shards or rank_settings.SHARDS)
+
+
+def assign_missing_shards(keyword_db, batch_size: int = 1000) -> int:
+    """Sets `shard` on keywords stored before sharding"""
+    requests = []
+    assigned = 0
+    for keyword in keyword_db.keywords.find(
+        {"shard": None}, projection={"_id": 0, "id": 1, "keyword": 1}
+    ):
+        requests.append(
+            UpdateOne(
+                {"id": keyword["id"]},
+                {"$set": {"shard": get_query_shard(keyword["keyword"])}},
+            )
+        )
+        if len(requests) >= batch_size:
+            assigned += keyword_db.keywords.bulk_write(
+                requests, ordered=False
+            ).modified_count
+            requests = []
+    if requests:
+        assigned += keyword_db.keywords.bulk_write(
+            requests, ordered=False
+        ).modified_count
+    return assigned
+
+
+class ShardClaimer(object):
+    """
+    Claims a fair part of the shards for this worker in `rank_shards`.
+
+    Every heartbeat refreshes the worker in `rank_workers` and its claims,
+    then releases or claims shards to own `ceil(shards / live workers)`.
+    Shards of a worker whose heartbeat is older than the timeout are free to
+    be claimed by the others. The shard being refreshed is never released.
+    A failed heartbeat drops the owned shards until the next successful one,
+    as they may be claimed by the others meanwhile.
+    """
+
+    def __init__(self, keyword_db, worker_id: Optional[str] = None):
+        self.shards_collection = keyword_db[collections_names.RANK_SHARDS]
+        self.workers_collection = keyword_db[collections_names.RANK_WORKERS]
+        self.worker_id = worker_id or default_id()
+        self.shards = rank_settings.SHARDS
+        self.owned: List[int] = []
+        self.busy: Optional[int] = None
+        # monotonic start time of the last successful heartbeat
+        self.heartbeat_time: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def ensure_shards(self):
+        # workers starting together upsert the same shards, only one may insert
+        self.shards_collection.create_index("shard", name="shard", unique=True)
+        try:
+            self.shards_collection.bulk_write(
+                [
+                    UpdateOne(
+                        {"shard": shard},
+                        {"$setOnInsert": {"owner": None, "heartbeat_datetime": None}},
+                        upsert=True,
+                    )
+                    for shard in range(self.shards)
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            if any(error["code"] != 11000 for error in e.details["writeErrors"]):
+                raise
+
+    def set_busy(self, shard: Optional[int]):
+        with self._lock:
+            self.busy = shard
+
+    def owns(self, shard: int) -> bool:
+        """
+        Whether `shard` is claimed by this worker, as of a heartbeat recent
+        enough for the claim not to have expired for the other workers.
+        """
+        with self._lock:
+            if self.heartbeat_time is None or shard not in self.owned:
+                return False
+            claim_seconds = (
+                rank_settings.WORKER_TIMEOUT_SECONDS
+                - rank_settings.WORKER_HEARTBEAT_SECONDS
+            )
+            return time.monotonic() - self.heartbeat_time < claim_seconds
+
+    def _claim_one(self, now: datetime, stale: datetime) -> Optional[int]:
+        shard = self.shards_collection.find_one_and_update(
+            {
+                "$or": [
+                    {"owner": None},
+                    {"heartbeat_datetime": {"$lt": stale}},
+                ]
+            },
+            {"$set": {"owner": self.worker_id, "heartbeat_datetime": now}},
+            sort=[("shard", 1)],
+            projection={"_id": 0, "shard": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        return None if shard is None else shard["shard"]
+
+    def heartbeat(self) -> List[int]:
+        with self._lock:
+            try:
+                return self._heartbeat()
+            except Exception:
+                self.owned = []
+                self.heartbeat_time = None
+                raise
+
+    def _heartbeat(self) -> List[int]:
+        started = time.monotonic()
+        now = datetime.now(timezone.utc)
+        stale = now - timedelta(seconds=rank_settings.WORKER_TIMEOUT_SECONDS)
+        self.workers_collection.update_one(
+            {"id": self.worker_id},
+            {
+                "$set": {
+                    "heartbeat_datetime": now,
+                    "host": socket.gethostname(),
+                    "pid": os.getpid(),
+                    "shards": self.owned,
+                },
+                "$setOnInsert": {"create_datetime": now},
+            },
+            upsert=True,
+        )
+        live_workers = self.workers_collection.count_documents(
+            {"heartbeat_datetime": {"$gte": stale}}
+        )
+        target = math.ceil(self.shards / max(live_workers, 1))
+
+        self.shards_collection.update_many(
+            {"owner": self.worker_id}, {"$set": {"heartbeat_datetime": now}}
+        )
+        owned = sorted(
+            shard["shard"]
+            for shard in self.shards_collection.find(
+                {"owner": self.worker_id}, projection={"_id": 0, "shard": 1}
+            )
+        )
+        releasable = [shard for shard in reversed(owned) if shard != self.busy]
+        extra = releasable[: max(len(owned) - target, 0)]
+        if extra:
+            self.shards_collection.update_many(
+                {"owner": self.worker_id, "shard": {"$in": extra}},
+                {"$set": {"owner": None, "heartbeat_datetime": None}},
+            )
+            owned = [shard for shard in owned if shard not in extra]
+        while len(owned) < target:
+            shard = self._claim_one(now, stale)
+            if shard is None:
+                break
+            owned.append(shard)
+        self.owned = sorted(owned)
+        self.heartbeat_time = started
+        return self.owned
+
+    def release_all(self):
+        with self._lock:
+            self.shards_collection.update_many(
+                {"owner": self.worker_id},
+                {"$set": {"owner": None, "heartbeat_datetime": None}},
+            )
+            self.workers_collection.delete_one({"id": self.worker_id})
+            self.owned = []
@@ -0,0 +1,150 @@
+from copy import deepcopy
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.apps.keyword.controller import KeywordController, keyword_controller
+from src.apps.keyword.domain_stats import (
+    get_rank_contribution,
+    merge_domain_stats_deltas,
+)
+
+
+def matches(document: dict, criteria: dict) -> bool:
+    for field, condition in criteria.items():
+        if condition == {"$ne": None}:
+            if document.get(field) is None:
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class UpdateResult(object):
+    def __init__(self, matched_count: int):
+        self.matched_count = matched_count
+
+
+class FakeCollection(object):
+    def __init__(self):
+        self.documents = []
+        self.requests = []
+
+    def find_one(self, criteria: dict, projection: dict = None):
+        for document in self.documents:
+            if matches(document, criteria):
+                return deepcopy(document)
+
+    def update_one(self, criteria: dict, update: dict) -> UpdateResult:
+        for document in self.documents:
+            if matches(document, criteria):
+                document.update(update["$set"])
+                return UpdateResult(1)
+        return UpdateResult(0)
+
+    def bulk_write(self, requests: list, ordered: bool = True):
+        self.requests.extend(requests)
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name: str) -> FakeCollection:
+        self[name] = FakeCollection()
+        return self[name]
+
+    def __getattr__(self, name: str) -> FakeCollection:
+        return self[name]
+
+
+@pytest.fixture
+def keyword_db(monkeypatch) -> FakeDatabase:
+    monkeypatch.setattr(
+        KeywordController,
+        "reserve_rank_changes",
+        staticmethod(lambda keyword_db, count: 1),
+    )
+    monkeypatch.setattr(
+        KeywordController,
+        "release_rank_changes",
+        staticmethod(lambda keyword_db, first_change_seq: None),
+    )
+    keyword_db = FakeDatabase()
+    keyword_db.keywords.documents.append(
+        {
+            "id": "k1",
+            "domain": "a.com",
+            "rank": 5,
+            "is_deleted": False,
+            "last_rank_update_time": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        }
+    )
+    return keyword_db
+
+
+def get_stats_deltas(keyword_db: FakeDatabase) -> dict:
+    deltas = {}
+    for request in keyword_db.domain_stats.requests:
+        merge_domain_stats_deltas(
+            deltas, request._filter["domain"], request._doc.get("$inc", {})
+        )
+    return deltas
+
+
+def test_rank_write_racing_a_soft_delete_is_dropped(keyword_db):
+    keyword = keyword_db.keywords.find_one({"id": "k1"})
+    rank_update = keyword_controller.get_rank_update(keyword, 2)
+    # soft_delete_keywords already took the keyword out of its rollup
+    keyword_db.keywords.documents[0]["is_deleted"] = True
+
+    keyword_controller.write_ranks(keyword_db, [rank_update])
+
+    assert keyword_db.keywords.documents[0]["rank"] == 5
+    assert keyword_db.daily_ranks.requests == []
+    assert keyword_db.domain_stats.requests == []
+
+
+def test_overlapping_writers_apply_deltas_from_the_stored_rank(keyword_db):
+    keyword = keyword_db.keywords.find_one({"id": "k1"})
+    first = keyword_controller.get_rank_update(keyword, 3)
+    second = keyword_controller.get_rank_update(keyword, 7)
+
+    keyword_controller.write_ranks(keyword_db, [first])
+    keyword_controller.write_ranks(keyword_db, [second])
+
+    stored = keyword_db.keywords.documents[0]
+    assert stored["rank"] == 7
+    assert stored["previous_rank"] == 3
+    expected = {}
+    merge_domain_stats_deltas(expected, "a.com", get_rank_contribution(7))
+    merge_domain_stats_deltas(
+        expected,
+        "a.com",
+        {field: -value for field, value in get_rank_contribution(5).items()},
+    )
+    assert {
+        field: value
+        for field, value in get_stats_deltas(keyword_db)["a.com"].items()
+        if value
+    } == {field: value for field, value in expected["a.com"].items() if value}
+
+
+def test_change_feed_stops_below_pending_blocks():
+    now = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    counter = {
+        "seq": 40,
+        "pending": [
+            {"first": 31, "reserved_at": now.replace(tzinfo=None)},
+            {"first": 21, "reserved_at": now - timedelta(seconds=5)},
+        ],
+    }
+    assert keyword_controller.get_rank_changes_limit(counter, now) == 20
+    assert keyword_controller.get_rank_changes_limit({"seq": 40}, now) == 40
+    assert keyword_controller.get_rank_changes_limit(None, now) == 0
+
+
+def test_change_feed_ignores_expired_blocks():
+    now = datetime(2024, 1, 1, 12, tzinfo=timezone.utc)
+    counter = {
+        "seq": 40,
+        "pending": [{"first": 21, "reserved_at": now - timedelta(days=1)}],
+    }
+    assert keyword_controller.get_rank_changes_limit(counter, now) == 40
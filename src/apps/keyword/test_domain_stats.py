@@ -0,0 +1,115 @@
+import random
+from datetime import datetime
+
+from src.apps.keyword.domain_stats import (
+    DOMAIN_STATS_COUNTERS,
+    get_domain_stats_delta,
+    get_domain_stats_rebuild_request,
+    get_domain_stats_request,
+    get_rank_contribution,
+    merge_domain_stats_deltas,
+)
+
+
+def test_rank_contribution_buckets():
+    assert get_rank_contribution(None) == {"keywords": 1, "not_ranked": 1}
+    assert get_rank_contribution(2) == {
+        "keywords": 1,
+        "ranked": 1,
+        "rank_sum": 2,
+        "top_3": 1,
+        "top_10": 1,
+        "top_100": 1,
+    }
+    assert get_rank_contribution(50) == {
+        "keywords": 1,
+        "ranked": 1,
+        "rank_sum": 50,
+        "top_100": 1,
+    }
+
+
+def test_first_measurement_adds_the_keyword():
+    assert get_domain_stats_delta(None, 7, was_measured=False) == {
+        "keywords": 1,
+        "ranked": 1,
+        "rank_sum": 7,
+        "top_10": 1,
+        "top_100": 1,
+    }
+
+
+def test_rank_move_only_carries_changed_counters():
+    assert get_domain_stats_delta(5, 2) == {"rank_sum": -3, "top_3": 1}
+    assert get_domain_stats_delta(4, 4) == {}
+    assert get_domain_stats_delta(8, None) == {
+        "ranked": -1,
+        "not_ranked": 1,
+        "rank_sum": -8,
+        "top_10": -1,
+        "top_100": -1,
+    }
+
+
+def test_removal_takes_the_keyword_out():
+    assert get_domain_stats_delta(None, None, is_measured=False) == {
+        "keywords": -1,
+        "not_ranked": -1,
+    }
+    assert get_domain_stats_delta(None, None, False, False) == {}
+
+
+def test_folded_deltas_match_the_final_ranks():
+    rng = random.Random(7)
+    ranks = {}
+    deltas = {}
+    for _ in range(500):
+        keyword = rng.randrange(30)
+        domain = f"d{keyword % 4}"
+        new_rank = rng.choice([None, rng.randint(1, 150)])
+        is_measured = rng.random() > 0.1
+        was_measured = keyword in ranks
+        delta = get_domain_stats_delta(
+            ranks.get(keyword), new_rank, was_measured, is_measured
+        )
+        merge_domain_stats_deltas(deltas, domain, delta)
+        if is_measured:
+            ranks[keyword] = new_rank
+        else:
+            ranks.pop(keyword, None)
+
+    expected = {}
+    for keyword, rank in ranks.items():
+        merge_domain_stats_deltas(
+            expected, f"d{keyword % 4}", get_rank_contribution(rank)
+        )
+    for domain in set(deltas) | set(expected):
+        assert {
+            field: value for field, value in deltas.get(domain, {}).items() if value
+        } == expected.get(domain, {})
+
+
+def test_stats_request_skips_zero_increments():
+    now = datetime(2024, 1, 1)
+    request = get_domain_stats_request(
+        "a.com", {"keywords": 1, "ranked": 0}, now, rank_changed=False
+    )
+    update = request._doc
+    assert request._filter == {"domain": "a.com"}
+    assert update["$inc"] == {"keywords": 1}
+    assert "last_change_datetime" not in update["$set"]
+    assert "$inc" not in get_domain_stats_request("a.com", {}, now)._doc
+
+
+def test_rebuild_request_replaces_every_counter():
+    now = datetime(2024, 1, 1)
+    update = get_domain_stats_rebuild_request(
+        {"_id": "a.com", "keywords": 2, "ranked": 1}, now
+    )._doc
+    assert "$inc" not in update
+    assert {field: update["$set"][field] for field in DOMAIN_STATS_COUNTERS} == {
+        field: {"keywords": 2, "ranked": 1}.get(field, 0)
+        for field in DOMAIN_STATS_COUNTERS
+    }
+    assert update["$set"]["rebuild_datetime"] == now
+    assert "last_change_datetime" not in update["$set"]
@@ -0,0 +1,50 @@
+from src.apps.keyword.scheduling import FairShareQueue, get_domain_budget_left
+
+
+def get_keywords(domain: str, count: int) -> list:
+    return [{"domain": domain, "keyword": f"{domain}-{i}"} for i in range(count)]
+
+
+def test_domains_are_served_by_weight():
+    queue = FairShareQueue(weights={"a": 2, "b": 1})
+    queue.extend(get_keywords("a", 10) + get_keywords("b", 10))
+    served = [keyword["domain"] for keyword in queue][:9]
+    assert served.count("a") == 6
+    assert served.count("b") == 3
+
+
+def test_domain_keywords_keep_their_order():
+    queue = FairShareQueue()
+    queue.extend(get_keywords("a", 3) + get_keywords("b", 2))
+    served = [keyword["keyword"] for keyword in queue]
+    assert [keyword for keyword in served if keyword.startswith("a")] == [
+        "a-0",
+        "a-1",
+        "a-2",
+    ]
+    assert len(served) == 5
+
+
+def test_exhausted_domain_leaves_its_share():
+    queue = FairShareQueue(weights={"a": 1, "b": 10})
+    queue.extend(get_keywords("a", 5) + get_keywords("b", 1))
+    served = [keyword["domain"] for keyword in queue]
+    assert served.count("a") == 5
+
+
+def test_budget_defers_the_rest_of_a_domain():
+    queue = FairShareQueue(budgets={"a": 2, "b": None})
+    queue.extend(get_keywords("a", 5) + get_keywords("b", 3))
+    assert len(queue) == 8
+    assert queue.get_scheduled_count() == 5
+    served = [keyword["domain"] for keyword in queue]
+    assert served.count("a") == 2
+    assert served.count("b") == 3
+    assert queue.deferred == {"a": 3}
+
+
+def test_budget_left_resets_on_a_new_day():
+    stats = {"daily_budget": 10, "budget_used": 4, "budget_day": "2024-01-01"}
+    assert get_domain_budget_left(stats, "2024-01-01") == 6
+    assert get_domain_budget_left(stats, "2024-01-02") == 10
+    assert get_domain_budget_left({**stats, "budget_used": 12}, "2024-01-01") == 0
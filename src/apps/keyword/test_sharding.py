@@ -0,0 +1,166 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.apps.keyword import sharding
+from src.apps.keyword.sharding import ShardClaimer, get_query_shard
+from src.main.config import rank_settings
+
+
+def matches(document: dict, criteria: dict) -> bool:
+    for field, condition in criteria.items():
+        if field == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(field)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == "$in" and value not in operand:
+                return False
+            if operator == "$lt" and (value is None or not value < operand):
+                return False
+            if operator == "$gte" and (value is None or not value >= operand):
+                return False
+    return True
+
+
+class FakeCollection(object):
+    def __init__(self):
+        self.documents = []
+
+    def create_index(self, *args, **kwargs):
+        pass
+
+    def find(self, criteria: dict, projection: dict = None) -> list:
+        return [
+            dict(document) for document in self.documents if matches(document, criteria)
+        ]
+
+    def count_documents(self, criteria: dict) -> int:
+        return len(self.find(criteria))
+
+    def update_one(self, criteria: dict, update: dict, upsert: bool = False):
+        for document in self.documents:
+            if matches(document, criteria):
+                document.update(update.get("$set", {}))
+                return
+        if upsert:
+            self.documents.append(
+                {**criteria, **update.get("$setOnInsert", {}), **update.get("$set", {})}
+            )
+
+    def update_many(self, criteria: dict, update: dict):
+        for document in self.documents:
+            if matches(document, criteria):
+                document.update(update["$set"])
+
+    def bulk_write(self, requests: list, ordered: bool = True):
+        for request in requests:
+            self.update_one(request._filter, request._doc, upsert=request._upsert)
+
+    def find_one_and_update(self, criteria: dict, update: dict, sort=None, **kwargs):
+        candidates = sorted(
+            (document for document in self.documents if matches(document, criteria)),
+            key=lambda document: document[sort[0][0]],
+        )
+        if not candidates:
+            return None
+        candidates[0].update(update["$set"])
+        return dict(candidates[0])
+
+    def delete_one(self, criteria: dict):
+        self.documents = [
+            document for document in self.documents if not matches(document, criteria)
+        ]
+
+
+class FakeDatabase(dict):
+    def __missing__(self, name: str) -> FakeCollection:
+        self[name] = FakeCollection()
+        return self[name]
+
+
+@pytest.fixture
+def keyword_db(monkeypatch) -> FakeDatabase:
+    monkeypatch.setattr(rank_settings, "SHARDS", 4)
+    return FakeDatabase()
+
+
+def get_claimer(keyword_db: FakeDatabase, worker_id: str) -> ShardClaimer:
+    claimer = ShardClaimer(keyword_db, worker_id=worker_id)
+    claimer.ensure_shards()
+    return claimer
+
+
+def test_query_shard_ignores_case_and_spacing():
+    assert get_query_shard("Best  Shoes", 64) == get_query_shard("best shoes", 64)
+
+
+def test_workers_split_the_shards(keyword_db):
+    first = get_claimer(keyword_db, "w1")
+    second = get_claimer(keyword_db, "w2")
+    assert first.heartbeat() == [0, 1, 2, 3]
+    # every shard is owned by a live worker
+    assert second.heartbeat() == []
+    assert first.heartbeat() == [0, 1]
+    assert second.heartbeat() == [2, 3]
+
+
+def test_busy_shard_is_not_released(keyword_db):
+    first = get_claimer(keyword_db, "w1")
+    second = get_claimer(keyword_db, "w2")
+    first.heartbeat()
+    second.heartbeat()
+    first.set_busy(3)
+    assert first.heartbeat() == [0, 3]
+
+
+def test_shards_of_a_dead_worker_are_taken_over(keyword_db):
+    first = get_claimer(keyword_db, "w1")
+    second = get_claimer(keyword_db, "w2")
+    first.heartbeat()
+    stale = datetime.now(timezone.utc) - timedelta(
+        seconds=rank_settings.WORKER_TIMEOUT_SECONDS + 1
+    )
+    for collection in (
+        sharding.collections_names.RANK_SHARDS,
+        sharding.collections_names.RANK_WORKERS,
+    ):
+        for document in keyword_db[collection].documents:
+            document["heartbeat_datetime"] = stale
+    assert second.heartbeat() == [0, 1, 2, 3]
+
+
+def test_claims_expire_without_heartbeat(keyword_db, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(sharding.time, "monotonic", lambda: now[0])
+    claimer = get_claimer(keyword_db, "w1")
+    assert not claimer.owns(0)
+    claimer.heartbeat()
+    assert claimer.owns(0)
+    now[0] += (
+        rank_settings.WORKER_TIMEOUT_SECONDS - rank_settings.WORKER_HEARTBEAT_SECONDS
+    )
+    assert not claimer.owns(0)
+
+
+def test_failed_heartbeat_drops_the_claims(keyword_db, monkeypatch):
+    claimer = get_claimer(keyword_db, "w1")
+    claimer.heartbeat()
+
+    def count_documents(criteria):
+        raise ConnectionError
+
+    monkeypatch.setattr(
+        keyword_db[sharding.collections_names.RANK_WORKERS],
+        "count_documents",
+        count_documents,
+    )
+    with pytest.raises(ConnectionError):
+        claimer.heartbeat()
+    assert claimer.owned == []
+    assert not claimer.owns(0)
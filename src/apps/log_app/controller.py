@@ -9,6 +9,7 @@ from src.apps.log_app.crud import logs_crud
 from src.apps.log_app.enum import LogActionEnum
 from src.core.base.controller import BaseController
 from src.core.base.schema import PaginatedResponse
+from src.core.common.enums import CountStrategyEnum
 from src.core.mixins.fields import SchemaID
 from src.core.pagination import Pagination
 from src.main.config import CollectionsNames
@@ -38,6 +39,7 @@ class LogController(BaseController):
             crud=logs_crud,
             list_item_model=log_schema.LogGetListSchema,
             pipeline=pipeline,
+            count_strategy=CountStrategyEnum.cached,
         )
 
     async def get_single_log(
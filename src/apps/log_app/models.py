@@ -26,6 +26,9 @@ class LogBaseModel(
         entity_name = "log"
         indexes = [
             pymongo.IndexModel("action_by", name="action_by"),
+            pymongo.IndexModel(
+                [("create_datetime", pymongo.DESCENDING)], name="create_datetime"
+            ),
         ]
 
 
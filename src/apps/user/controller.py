@@ -53,7 +53,7 @@ from src.apps.user.schema import (
 )
 from src.core import token, otp
 from src.core.base.controller import BaseController
-from src.core.base.schema import PaginatedResponse, Response
+from src.core.base.schema import KeysetPaginatedResponse, Response
 from src.core.common import exceptions
 from src.core.common.enums.auth import RoleEnum
 from src.core.common.exceptions import DeleteFailed, UpdateFailed
@@ -62,7 +62,7 @@ from src.core.mixins.fields import SchemaID
 from src.core.mixins.models import USERNAME_IS_EMAIL, USERNAME_IS_PHONE
 from src.core.ordering import Ordering
 from src.core.otp import OtpRequestType
-from src.core.pagination import Pagination
+from src.core.pagination import KeysetPagination
 from src.core.security import user_password
 from src.services import global_services
 from src.services.db.mongodb import UpdateOperatorsEnum
@@ -292,10 +292,10 @@ class UserController(BaseController):
 
     @staticmethod
     async def get_all_users(
-        pagination: Pagination,
+        pagination: KeysetPagination,
         ordering: Ordering,
         criteria: dict = None,
-    ) -> PaginatedResponse[List[UsersGetUserSubListOut]]:
+    ) -> KeysetPaginatedResponse[List[UsersGetUserSubListOut]]:
         if not criteria:
             criteria = {}
         pipeline = [
@@ -419,10 +419,10 @@ class UserController(BaseController):
 
     async def get_all_customers(
         self,
-        pagination: Pagination,
+        pagination: KeysetPagination,
         ordering: Ordering,
         criteria: dict = None,
-    ) -> PaginatedResponse[List[UsersGetCustomerSubListOut]]:
+    ) -> KeysetPaginatedResponse[List[UsersGetCustomerSubListOut]]:
         if not criteria:
             criteria = {}
         pipeline = [
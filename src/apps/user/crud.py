@@ -32,9 +32,10 @@ class UserCRUD(BaseCRUD):
             updated_item["block_info"] = BlockInfoModel(
                 **data_dict.get("block_reason"), blocked_by=current_user.id
             )
-        updated_user, is_updated = await self.update_and_get(
+        updated_user, is_updated = await self.update_diff_and_get(
             criteria={"id": target_id},
-            new_doc=self.update_db_model(**updated_item).dict(),
+            stored_obj=stored_item_model,
+            new_doc=updated_item,
         )
 
         return is_updated, updated_user
@@ -137,7 +138,7 @@ class UserCRUD(BaseCRUD):
             "login_datetime": 1,
             "create_datetime": 1,
         }
-        entities = await self.aggregate(
+        entities = self.iter_aggregate(
             pipeline=[
                 {"$match": criteria},
                 {"$project": {"_id": 0, **project}},
@@ -1,12 +1,25 @@
 from . import user_fixture
 from ..crud import users_crud
 from ..models import UserDBCreateModel
+from src.core.security import user_password
+from src.main.config import app_settings
+from src.services import global_services
 
 
 async def default_users():
+    if not app_settings.FIXTURES_ADMIN_PASSWORD:
+        global_services.LOGGER.warning(
+            "FIXTURES_ADMIN_PASSWORD is not set, default users are not created"
+        )
+        return
     if await users_crud.count() == 0:
+        hashed_password = str(
+            user_password.get_password_hash(app_settings.FIXTURES_ADMIN_PASSWORD)
+        )
         for entity in user_fixture.all_users:
-            await users_crud.create(UserDBCreateModel(**entity))
+            await users_crud.create(
+                UserDBCreateModel(**{**entity, "hashed_password": hashed_password})
+            )
 
 
 async def run_fixtures():
@@ -18,7 +18,7 @@ from src.apps.user.enum import (
     UserBlockReasonEnum,
 )
 from src.core import mixins
-from src.core.base.models import BaseDBReadModel, BaseDBModel
+from src.core.base.models import BaseDBReadModel, BaseDBModel, not_deleted_index
 from src.core.common.enums import RoleEnum
 from src.core.mixins import DB_ID, default_id
 from src.core.mixins.fields import OptionalEmailStr, PointField, SchemaID
@@ -138,6 +138,14 @@ class UserBaseModel(
                 [("mobile_number", pymongo.ASCENDING)], name="mobile_number"
             ),
             pymongo.IndexModel("id", name="user_id", unique=True),
+            not_deleted_index(
+                [
+                    ("role", pymongo.ASCENDING),
+                    ("create_datetime", pymongo.DESCENDING),
+                    ("id", pymongo.ASCENDING),
+                ],
+                name="not_deleted_role_create_datetime_id",
+            ),
         ]
 
 
@@ -0,0 +1,270 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+import psutil
+
+from src.main.config import rank_settings
+
+BROWSER_PROCESS_NAMES = ("chrome", "chromedriver", "google-chrome", "chromium")
+# passed to every browser the scraper starts, to tell them apart from any
+# other browser of the host (Chrome ignores unknown switches)
+BROWSER_MARKER_ARGUMENT = "--serp-browser"
+
+
+def is_browser_process(process: psutil.Process) -> bool:
+    try:
+        name = process.name().lower()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+    return any(name.startswith(browser) for browser in BROWSER_PROCESS_NAMES)
+
+
+def has_marker(process: psutil.Process) -> bool:
+    try:
+        return BROWSER_MARKER_ARGUMENT in process.cmdline()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return False
+
+
+def get_process_key(process: psutil.Process) -> Optional[Tuple[int, float]]:
+    """(pid, create time), unlike the pid alone it is not reused by another process"""
+    try:
+        return process.pid, process.create_time()
+    except psutil.NoSuchProcess:
+        return None
+
+
+def get_process_tree(pid: int) -> List[psutil.Process]:
+    try:
+        process = psutil.Process(pid)
+        return [process, *process.children(recursive=True)]
+    except psutil.NoSuchProcess:
+        return []
+
+
+def is_alive(process: psutil.Process) -> bool:
+    try:
+        return process.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+
+def get_tree_rss(processes: List[psutil.Process]) -> int:
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    return rss
+
+
+def kill_processes(processes: List[psutil.Process]):
+    for process in processes:
+        try:
+            process.kill()
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+    psutil.wait_procs(processes, timeout=5)
+
+
+class BrowserSupervisor(object):
+    """
+    Keeps track of the chromedriver process of every browser the scraper
+    starts and, from a background thread:
+
+    - waits zombie children so they leave the process table,
+    - kills browser processes left behind by the scraper (whose chromedriver
+      is gone or that are no longer tracked). Only processes seen in a tracked
+      browser tree or started with `BROWSER_MARKER_ARGUMENT` are reaped, never
+      other browsers of the host,
+    - kills browsers over the RSS ceiling. The `SerpBrowser` using it restarts
+      a fresh one and fetches the pages it lost again, see `pop_killed`.
+    """
+
+    def __init__(self, max_rss_mb: int, interval_seconds: int):
+        self.max_rss = max_rss_mb * 1024 * 1024
+        self.interval_seconds = interval_seconds
+        self._browsers: Dict[int, float] = {}
+        # processes seen in the tracked trees, reaped if left behind
+        self._seen: Set[Tuple[int, float]] = set()
+        # chromedriver pid -> kill time of the browsers over the RSS ceiling
+        self._killed: Dict[int, float] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self.reaped = 0
+        self.killed_over_rss = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="browser-supervisor", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval_seconds)
+            try:
+                self.reap()
+            except Exception:
+                logging.exception("Browser supervisor failed:")
+
+    def register(self, driver) -> Optional[int]:
+        """Tracks the browser of `driver`, returns its chromedriver pid"""
+        process = getattr(driver.service, "process", None)
+        if process is None:
+            return None
+        with self._lock:
+            self._browsers[process.pid] = time.time()
+        self._remember(get_process_tree(process.pid))
+        self.start()
+        return process.pid
+
+    def _remember(self, processes: List[psutil.Process]):
+        keys = {key for process in processes if (key := get_process_key(process))}
+        with self._lock:
+            self._seen |= keys
+
+    def pop_killed(self, pid: Optional[int]) -> bool:
+        """Whether the browser of chromedriver `pid` was killed over the RSS ceiling"""
+        with self._lock:
+            return self._killed.pop(pid, None) is not None
+
+    def close(self, driver, pid: Optional[int]):
+        """
+        Quits `driver` and kills whatever it left running. The process tree is
+        taken before quitting, chrome processes are reparented once their
+        chromedriver exits.
+        """
+        tree = get_process_tree(pid) if pid is not None else []
+        try:
+            driver.quit()
+        except Exception:
+            logging.exception(f"Quitting browser {pid} failed:")
+        with self._lock:
+            self._browsers.pop(pid, None)
+        if leftovers := [process for process in tree if is_alive(process)]:
+            kill_processes(leftovers)
+            self.reaped += len(leftovers)
+        self._wait_zombies()
+
+    def _wait_zombies(self):
+        for child in psutil.Process().children():
+            try:
+                if child.status() == psutil.STATUS_ZOMBIE:
+                    os.waitpid(child.pid, os.WNOHANG)
+                    self.reaped += 1
+            except (psutil.NoSuchProcess, ChildProcessError):
+                continue
+
+    def _get_tracked_trees(self) -> Dict[int, List[psutil.Process]]:
+        with self._lock:
+            pids = list(self._browsers)
+        trees = {}
+        for pid in pids:
+            if tree := get_process_tree(pid):
+                trees[pid] = tree
+                self._remember(tree)
+            else:
+                with self._lock:
+                    self._browsers.pop(pid, None)
+        return trees
+
+    def _is_ours(self, process: psutil.Process) -> bool:
+        """Whether `process` or one of its children was started by the scraper"""
+        for tree_process in get_process_tree(process.pid):
+            if has_marker(tree_process):
+                return True
+            with self._lock:
+                if get_process_key(tree_process) in self._seen:
+                    return True
+        return False
+
+    def _get_orphans(self, tracked: Dict[int, List[psutil.Process]]) -> List:
+        """
+        Untracked browser processes of the scraper whose parent is gone (or
+        init), younger ones are skipped as they may be a browser being started.
+        """
+        tracked_pids = {process.pid for tree in tracked.values() for process in tree}
+        username = psutil.Process().username()
+        min_create_time = time.time() - self.interval_seconds
+        orphans = []
+        for process in psutil.process_iter(["ppid", "username", "create_time"]):
+            if process.pid in tracked_pids or not is_browser_process(process):
+                continue
+            if (
+                process.info["username"] != username
+                or process.info["create_time"] > min_create_time
+            ):
+                continue
+            ppid = process.info["ppid"]
+            if (ppid == 1 or not psutil.pid_exists(ppid)) and self._is_ours(process):
+                orphans.append(process)
+        return orphans
+
+    def _forget_gone(self):
+        now = time.time()
+        with self._lock:
+            self._seen = {key for key in self._seen if psutil.pid_exists(key[0])}
+            self._killed = {
+                pid: killed_time
+                for pid, killed_time in self._killed.items()
+                if now - killed_time < self.interval_seconds * 10
+            }
+
+    def reap(self):
+        self._wait_zombies()
+        tracked = self._get_tracked_trees()
+        for pid, tree in tracked.items():
+            if get_tree_rss(tree) > self.max_rss:
+                logging.warning(f"Browser {pid} is over the RSS ceiling, killing it")
+                kill_processes(tree)
+                self.killed_over_rss += 1
+                with self._lock:
+                    self._browsers.pop(pid, None)
+                    self._killed[pid] = time.time()
+        if orphans := self._get_orphans(tracked):
+            orphans = {
+                process.pid: process
+                for orphan in orphans
+                for process in get_process_tree(orphan.pid)
+            }
+            kill_processes(list(orphans.values()))
+            self.reaped += len(orphans)
+        self._wait_zombies()
+        self._forget_gone()
+
+    def get_stats(self) -> dict:
+        tracked = self._get_tracked_trees()
+        browsers = [
+            {
+                "pid": pid,
+                "processes": len(tree),
+                "rss_mb": round(get_tree_rss(tree) / 1024 / 1024, 1),
+                "age_seconds": round(
+                    time.time() - self._browsers.get(pid, time.time())
+                ),
+            }
+            for pid, tree in tracked.items()
+        ]
+        return {
+            "browsers": len(browsers),
+            "processes": sum(browser["processes"] for browser in browsers),
+            "rss_mb": round(sum(browser["rss_mb"] for browser in browsers), 1),
+            "max_rss_mb": self.max_rss // 1024 // 1024,
+            "reaped": self.reaped,
+            "killed_over_rss": self.killed_over_rss,
+            "detail": browsers,
+        }
+
+
+browser_supervisor = BrowserSupervisor(
+    max_rss_mb=rank_settings.BROWSER_MAX_RSS_MB,
+    interval_seconds=rank_settings.BROWSER_REAP_SECONDS,
+)
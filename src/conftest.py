@@ -0,0 +1,4 @@
+import os
+
+# tests never drive a real browser, this also skips the chromedriver download
+os.environ.setdefault("RANK_SERP_FETCH_MODE", "replay")
@@ -1,15 +1,16 @@
-from typing import List, Optional, TypeVar
+from typing import List, Optional, TypeVar, Union
 
 from pydantic import BaseModel
 
+from src.core.common.enums import CountStrategyEnum
 from src.core.mixins import SchemaID
 from src.core.ordering import Ordering
-from src.core.pagination import Pagination
+from src.core.pagination import KeysetPagination, Pagination
 from .crud import BaseCRUD
 from .exception import EntitiesNotFound
 from .schema import CommonExportCsvSchemaOut
 from ..common import exceptions
-from ..csv_utils import write_csv_file
+from ..csv_utils import write_csv_file_from_iterator
 
 T = TypeVar("T", bound=BaseModel)
 
@@ -73,14 +74,14 @@ class BaseController(object):
         new_data: UPDATE_IN_SCHEMA,
     ) -> UPDATE_OUT_SCHEMA:
         stored_item_model = await self.crud.get_object_in_model(criteria=criteria)
-        data_dict = new_data.dict(exclude_unset=True)
-        updated_item = stored_item_model.copy(update=data_dict).dict()
+        updated_item = stored_item_model.copy(
+            update=new_data.dict(exclude_unset=True)
+        ).dict()
         (
             updated_obj,
             is_updated,
-        ) = await self.crud.default_update_and_get(
-            criteria=criteria,
-            new_doc=updated_item,
+        ) = await self.crud.update_diff_and_get(
+            criteria=criteria, stored_obj=stored_item_model, new_doc=updated_item
         )
         if not is_updated:
             raise exceptions.UpdateFailed
@@ -100,8 +101,8 @@ class BaseController(object):
             (
                 updated_obj,
                 is_updated,
-            ) = await self.crud.default_update_and_get(
-                criteria=criteria, new_doc=updated_item
+            ) = await self.crud.update_diff_and_get(
+                criteria=criteria, stored_obj=stored_item_model, new_doc=updated_item
             )
             if not is_updated:
                 raise exceptions.UpdateFailed
@@ -126,33 +127,40 @@ class BaseController(object):
 
     async def get_list_objs(
         self,
-        pagination: Pagination,
+        pagination: Union[Pagination, KeysetPagination],
         ordering: Ordering,
         criteria: dict = None,
         pipeline: List[dict] = None,
         sub_list_schema: Optional[T] = None,
+        trusted: bool = False,
+        count_strategy: Optional[CountStrategyEnum] = None,
     ):
         if criteria is None:
             criteria = {"is_deleted": False}
+        kwargs = {}
+        if count_strategy is not None:
+            kwargs["count_strategy"] = count_strategy
         return await pagination.paginate(
             crud=self.crud,
             list_item_model=sub_list_schema or self.get_sub_list_out_schema,
             criteria=criteria,
             pipeline=pipeline,
             _sort=await ordering.get_ordering_criteria(),
+            trusted=trusted,
+            **kwargs,
         )
 
     async def get_list_objs_without_pagination(self, criteria: dict = None):
         return await self.crud.get_list(criteria=criteria)
 
     async def bulk_create_objs(self, new_data_objs: List[T], **kwargs) -> List[T]:
-        created_items = []
-        for new_data in new_data_objs:
-            created = await self.crud.create(
+        created_items = await self.crud.create_many(
+            [
                 self.create_model(**new_data.dict(exclude_none=True), **kwargs)
-            )
-            created_items.append(created)
-        return created_items
+                for new_data in new_data_objs
+            ]
+        )
+        return created_items or []
 
     async def bulk_update_objs(
         self,
@@ -195,8 +203,7 @@ class BaseController(object):
         entities, fieldnames = await self.crud.export_csv_join_aggregate(
             criteria=criteria
         )
-        if not entities:
-            raise EntitiesNotFound
         path = f"{files_path}/export_{entity_name}.csv"
-        write_csv_file(path, entities, fieldnames)
+        if not await write_csv_file_from_iterator(path, entities, fieldnames):
+            raise EntitiesNotFound
         return CommonExportCsvSchemaOut(url=path)
@@ -1,13 +1,15 @@
 import abc
-from typing import List, Optional, Tuple, Type, TypeVar, Union
+from typing import AsyncIterator, Iterable, List, Optional, Tuple, Type, TypeVar, Union
 
 from fastapi import HTTPException, status
 from pydantic import BaseModel
 from pymongo.results import BulkWriteResult
 
 from src.core.async_tools import force_sync
+from src.core.base.db_utils import get_schema_projection
 from src.core.base.schema import BaseSchema
 from src.core.common import exceptions
+from src.core.helpers.diff_helper import get_changed_fields
 from src.core.mixins import DB_ID, SchemaID
 from src.services import global_services
 from src.services.db.mongodb import UpdateOperatorsEnum
@@ -187,6 +189,23 @@ class BaseCRUD(metaclass=abc.ABCMeta):
             deleted=deleted,
         )
 
+    def get_projection(
+        self,
+        schema: Type[BaseModel],
+        trusted: bool = False,
+        extra_fields: Iterable[str] = (),
+    ) -> Optional[dict]:
+        """
+        Projection of the fields `schema` needs. Documents not read in trusted
+        mode are validated into the read model, so its required fields are
+        kept too.
+        """
+        return get_schema_projection(
+            schema,
+            model=None if trusted else self.read_db_model,
+            extra_fields=extra_fields,
+        )
+
     async def get_list(
         self,
         criteria: dict = None,
@@ -195,11 +214,19 @@ class BaseCRUD(metaclass=abc.ABCMeta):
         sort: Optional[list] = None,
         projection: Optional[dict] = None,
         deleted: Optional[bool] = False,
+        trusted: bool = False,
+        schema: Optional[Type[BaseModel]] = None,
     ) -> List[T]:
+        """
+        :param schema: schema the documents end up in, the projection is
+                       derived from it when not given
+        """
         if not criteria:
             criteria = {}
         if deleted is not None:
             criteria.update(is_deleted=deleted)
+        if projection is None and schema is not None:
+            projection = self.get_projection(schema, trusted=trusted)
         return await global_services.DB.raw_read_many(
             criteria=criteria,
             skip=skip,
@@ -207,8 +234,38 @@ class BaseCRUD(metaclass=abc.ABCMeta):
             sort=sort,
             model=self.read_db_model,
             projection=projection,
+            trusted=trusted,
         )
 
+    async def iter_list(
+        self,
+        criteria: dict = None,
+        sort: Optional[list] = None,
+        projection: Optional[dict] = None,
+        deleted: Optional[bool] = False,
+        batch_size: int = 1000,
+        trusted: bool = False,
+        as_dict: bool = False,
+    ) -> AsyncIterator[Union[T, dict]]:
+        """
+        Streaming `get_list`, for exports and jobs going through whole
+        collections: only one batch of documents is held at a time.
+        """
+        if not criteria:
+            criteria = {}
+        if deleted is not None:
+            criteria.update(is_deleted=deleted)
+        async for item in global_services.DB.raw_iter_read_many(
+            criteria=criteria,
+            sort=sort,
+            model=self.read_db_model,
+            projection=projection,
+            batch_size=batch_size,
+            trusted=trusted,
+            as_dict=as_dict,
+        ):
+            yield item
+
     async def get_list_by_ids(
         self,
         ids=Optional[List[DB_ID]],
@@ -240,7 +297,7 @@ class BaseCRUD(metaclass=abc.ABCMeta):
     async def create_many(
         self,
         obj_list: List[T],
-    ) -> Optional[T]:
+    ) -> Optional[List[T]]:
         return await global_services.DB.raw_insert_many(
             obj_list=obj_list, model=self.create_db_model, read_model=self.read_db_model
         )
@@ -252,6 +309,9 @@ class BaseCRUD(metaclass=abc.ABCMeta):
             criteria=criteria, model=self.read_db_model
         )
 
+    async def estimated_count(self) -> int:
+        return await global_services.DB.raw_estimated_count(model=self.read_db_model)
+
     async def default_update(
         self,
         criteria: dict,
@@ -278,38 +338,39 @@ class BaseCRUD(metaclass=abc.ABCMeta):
         operator: UpdateOperatorsEnum = UpdateOperatorsEnum.set_,
         upsert: Optional[bool] = False,
         deleted: Optional[bool] = False,
+        projection: Optional[dict] = None,
         **kwargs,
     ) -> Tuple[T, bool]:
-        is_updated: bool = await self.default_update(
+        return await self.update_and_get(
             upsert=upsert,
             criteria=criteria,
-            new_doc=new_doc,
+            new_doc=self.update_db_model(**new_doc).dict(exclude_none=True),
             operator=operator,
             deleted=deleted,
+            projection=projection,
             **kwargs,
         )
-        result = await self.get_object(criteria=criteria)
-        return result, is_updated
 
     async def default_update_many_and_get(
         self,
         criteria: dict,
         new_doc: dict,
         operator: UpdateOperatorsEnum = UpdateOperatorsEnum.set_,
-        upsert: Optional[bool] = False,
         deleted: Optional[bool] = False,
         **kwargs,
     ) -> Tuple[List[T], bool]:
-        is_updated: bool = await self.update_many(
+        if not criteria:
+            criteria = {}
+        if deleted is not None:
+            criteria.update(is_deleted=deleted)
+        result = await global_services.DB.raw_update_many_and_get(
             criteria=criteria,
-            update=new_doc,
-            upsert=upsert,
-            deleted=deleted,
+            new_values=new_doc,
+            model=self.read_db_model,
             operator=operator,
             **kwargs,
         )
-        result = await self.get_list(criteria=criteria)
-        return result, is_updated
+        return result, True
 
     async def update_and_get(
         self,
@@ -318,18 +379,58 @@ class BaseCRUD(metaclass=abc.ABCMeta):
         operator: UpdateOperatorsEnum = UpdateOperatorsEnum.set_,
         upsert: Optional[bool] = False,
         deleted: Optional[bool] = False,
+        projection: Optional[dict] = None,
         **kwargs,
-    ) -> Tuple[T, bool]:
-        is_updated: bool = await self.update(
+    ) -> Tuple[Union[T, dict], bool]:
+        if not criteria:
+            criteria = {}
+        if deleted is not None:
+            criteria.update(is_deleted=deleted)
+        result = await global_services.DB.raw_update_and_get(
             upsert=upsert,
             criteria=criteria,
-            new_doc=new_doc,
+            new_values=new_doc,
             operator=operator,
+            model=self.read_db_model,
+            projection=projection,
+            **kwargs,
+        )
+        if result is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"{self.read_db_model.Meta.entity_name} not found.",
+            )
+        return result, True
+
+    async def update_diff_and_get(
+        self,
+        criteria: dict,
+        stored_obj: T,
+        new_doc: dict,
+        deleted: Optional[bool] = False,
+        **kwargs,
+    ) -> Tuple[T, bool]:
+        """
+        Validates `stored_obj` and `new_doc` with `update_db_model`, then
+        `$set`s only the paths that differ and `$unset`s the ones cleared.
+        A patch changing nothing returns `stored_obj` without writing.
+        """
+        to_set, to_unset = get_changed_fields(
+            self.update_db_model(**stored_obj.dict()).dict(),
+            self.update_db_model(**new_doc).dict(),
+        )
+        if not to_set and not to_unset:
+            return stored_obj, True
+        update = {"$set": to_set}
+        if to_unset:
+            update["$unset"] = dict.fromkeys(to_unset, "")
+        return await self.update_and_get(
+            criteria=criteria,
+            new_doc=update,
+            operator=None,
             deleted=deleted,
             **kwargs,
         )
-        result = await self.get_object(criteria=criteria)
-        return result, is_updated
 
     async def update(
         self,
@@ -465,6 +566,17 @@ class BaseCRUD(metaclass=abc.ABCMeta):
             pipeline=pipeline, model=self.read_db_model, **kwargs
         )
 
+    async def iter_aggregate(
+        self, pipeline: List[dict], batch_size: int = 1000, **kwargs
+    ) -> AsyncIterator[dict]:
+        async for document in global_services.DB.raw_iter_aggregate(
+            pipeline=pipeline,
+            model=self.read_db_model,
+            batch_size=batch_size,
+            **kwargs,
+        ):
+            yield document
+
     async def raw_aggregate_schema(
         self,
         pipeline: List[dict],
@@ -579,5 +691,5 @@ class BaseCRUD(metaclass=abc.ABCMeta):
         )
 
     async def export_csv_join_aggregate(self, criteria):
-        entities = await self.get_list(criteria=criteria)
-        return [entity.dict() for entity in entities], None
+        entities = self.iter_list(criteria=criteria)
+        return (entity.dict() async for entity in entities), None
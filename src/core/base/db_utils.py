@@ -2,7 +2,13 @@ import importlib
 import inspect
 import pkgutil
 import pyclbr
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, List, Optional, Type
+
+from pydantic import BaseModel
+from pymongo.errors import OperationFailure, PyMongoError
+
+from src.services import global_services
 
 
 def get_models(app_settings, logger) -> list:
@@ -41,18 +47,139 @@ def get_models(app_settings, logger) -> list:
     return list(filter(lambda x: issubclass(x, BaseDBReadModel), models))
 
 
-async def create_indexes(app_settings, logger) -> List[str]:
+INDEX_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds")
+
+
+def get_index_spec(index: dict) -> dict:
+    """
+    Comparable keys and options of a declared (`IndexModel.document`) or an
+    existing (`index_information()` item) index.
+    """
+    keys = index["key"].items() if hasattr(index["key"], "items") else index["key"]
+    spec = {
+        "key": [
+            (field, int(direction) if isinstance(direction, float) else direction)
+            for field, direction in keys
+        ]
+    }
+    for option in INDEX_OPTIONS:
+        if index.get(option) not in (None, False):
+            value = index[option]
+            spec[option] = dict(value) if isinstance(value, dict) else value
+    return spec
+
+
+def get_unused_indexes(
+    index_stats: List[dict], excluded: Iterable[str], min_usage_seconds: int
+) -> List[str]:
+    """
+    Names of the indexes without any access in `index_stats`. `$indexStats`
+    counts accesses since the server (re)start or the index creation, indexes
+    counted for less than `min_usage_seconds` are never reported.
+    """
+    counted_before = datetime.now(timezone.utc) - timedelta(seconds=min_usage_seconds)
+    unused = []
+    for stats in index_stats:
+        since = stats["accesses"]["since"]
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if (
+            stats["name"] not in ("_id_", *excluded)
+            and not stats["accesses"]["ops"]
+            and since <= counted_before
+        ):
+            unused.append(stats["name"])
+    return unused
+
+
+async def sync_model_indexes(model, logger, min_usage_seconds: int) -> dict:
+    """
+    Builds the declared indexes missing in the collection of `model`, and
+    reports the declared ones defined differently in the database (never
+    rebuilt automatically), the unexpected extra ones and the ones unused
+    for at least `min_usage_seconds`.
+    """
+    declared = {index.document["name"]: index for index in model.Meta.indexes}
+    existing = await global_services.DB.get_index_information(model)
+    missing = [name for name in declared if name not in existing]
+    changed = [
+        name
+        for name, index in declared.items()
+        if name in existing
+        and get_index_spec(index.document) != get_index_spec(existing[name])
+    ]
+    extra = [name for name in existing if name != "_id_" and name not in declared]
+    if missing:
+        try:
+            await model.create_indexes([declared[name] for name in missing])
+        except OperationFailure as e:
+            logger.error(
+                f"Creating indexes {missing} of {model.Meta.collection_name} failed: {e}"
+            )
+    unused = get_unused_indexes(
+        await global_services.DB.get_index_stats(model), missing, min_usage_seconds
+    )
+    report = {
+        "collection": model.Meta.collection_name,
+        "created": missing,
+        "changed": changed,
+        "extra": extra,
+        "unused": unused,
+    }
+    if changed or extra or unused:
+        logger.warning(f"Index drift: {report}")
+    return report
+
+
+async def create_indexes(app_settings, logger) -> List[dict]:
     """
-    Gets all models in project and then creates indexes for each one of them.
-    :return: list of indexes that has been invoked to create
-             (could've been created earlier, it doesn't raise in this case)
+    Gets all models in project and syncs the indexes of their collections
+    with their `Meta.indexes`, see `sync_model_indexes`.
+    Index builds can be long, run it in the background of the startup.
+    :return: index report of every collection
     """
     models = get_models(app_settings, logger)
-    indexes = []
+    reports = []
+    collections = set()
     for model in models:
-        res = await model.create_indexes()
-        indexes.append(res)
-    return list(filter(None, indexes))
+        meta = getattr(model, "Meta", None)
+        if not getattr(meta, "indexes", None) or meta.collection_name in collections:
+            continue
+        collections.add(meta.collection_name)
+        try:
+            reports.append(
+                await sync_model_indexes(
+                    model, logger, app_settings.INDEX_USAGE_MIN_SECONDS
+                )
+            )
+        except PyMongoError:
+            logger.exception(f"Syncing indexes of {meta.collection_name} failed:")
+    return reports
+
+
+def get_schema_projection(
+    schema: Type[BaseModel],
+    model: Optional[Type[BaseModel]] = None,
+    extra_fields: Iterable[str] = (),
+) -> Optional[dict]:
+    """
+    Inclusion projection of the fields `schema` is built from, plus the
+    required fields of `model` when the documents are validated into it first.
+    :return: None if `schema` or `model` has `pre` root validators, which may
+             read any field of the document
+    """
+    if schema.__pre_root_validators__ or (
+        model is not None and model.__pre_root_validators__
+    ):
+        return None
+    fields = set(extra_fields)
+    for name, field in schema.__fields__.items():
+        fields.update((name, field.alias))
+    if model is not None:
+        fields.update(
+            name for name, field in model.__fields__.items() if field.required
+        )
+    return dict.fromkeys(sorted(fields), 1)
 
 
 async def get_fixtures(app_settings, logger) -> list:
@@ -2,10 +2,22 @@ import abc
 from datetime import datetime
 from typing import Optional, List
 
+import pymongo
+
 from src.core.mixins.models import AddFieldsBaseModel
 from src.services import global_services
 
 
+def not_deleted_index(keys, name: str, **kwargs) -> pymongo.IndexModel:
+    """
+    Partial index of the documents not soft deleted, used by the queries
+    filtering on `is_deleted: False` (all the `BaseCRUD` reads by default).
+    """
+    return pymongo.IndexModel(
+        keys, name=name, partialFilterExpression={"is_deleted": False}, **kwargs
+    )
+
+
 class BaseDBModel(metaclass=abc.ABCMeta):
     class Config:
         anystr_strip_whitespace = True
@@ -14,9 +26,11 @@ class BaseDBModel(metaclass=abc.ABCMeta):
         pass
 
     @classmethod
-    async def create_indexes(cls) -> Optional[List[str]]:
+    async def create_indexes(
+        cls, indexes: Optional[List[pymongo.IndexModel]] = None
+    ) -> Optional[List[str]]:
         if hasattr(cls.Meta, "indexes"):
-            return await global_services.DB.create_indexes(cls)
+            return await global_services.DB.create_indexes(cls, indexes=indexes)
 
 
 class BaseDBReadModel(AddFieldsBaseModel):
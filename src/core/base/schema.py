@@ -64,6 +64,7 @@ class PaginatedResponse(GenericModel, Generic[ListDataT]):
     total: Optional[int]
     offset: Optional[int]
     limit: Optional[int]
+    has_more: Optional[bool]
     next: Optional[AnyHttpUrl]
     previous: Optional[AnyHttpUrl]
     result: Optional[ListDataT] = []
@@ -97,3 +98,13 @@ class CursorPaginatedResponse(GenericModel, Generic[ListDataT]):
 
     class Config(BaseConfig):
         pass
+
+
+class KeysetPaginatedResponse(GenericModel, Generic[ListDataT]):
+    limit: Optional[int]
+    next_cursor: Optional[str]
+    previous_cursor: Optional[str]
+    result: Optional[ListDataT] = []
+
+    class Config(BaseConfig):
+        pass
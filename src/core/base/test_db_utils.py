@@ -0,0 +1,85 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from pymongo import IndexModel
+
+from src.core.base.db_utils import get_unused_indexes, sync_model_indexes
+from src.services import global_services
+
+WEEK_SECONDS = 7 * 24 * 60 * 60
+
+
+def get_index_stats(name: str, ops: int, age: timedelta) -> dict:
+    # $indexStats dates are naive UTC
+    since = (datetime.now(timezone.utc) - age).replace(tzinfo=None)
+    return {"name": name, "accesses": {"ops": ops, "since": since}}
+
+
+class Thing(object):
+    created = []
+
+    class Meta:
+        collection_name = "things"
+        indexes = [
+            IndexModel([("name", 1)], name="name", unique=True),
+            IndexModel([("a", 1), ("b", -1)], name="a_b"),
+            IndexModel([("c", 1)], name="c"),
+        ]
+
+    @classmethod
+    async def create_indexes(cls, indexes):
+        cls.created.extend(index.document["name"] for index in indexes)
+
+
+class FakeDB(object):
+    async def get_index_information(self, model) -> dict:
+        return {
+            "_id_": {"key": [("_id", 1)], "v": 2},
+            # declared unique
+            "name": {"key": [("name", 1)], "v": 2},
+            "a_b": {"key": [("a", 1.0), ("b", -1.0)], "v": 2},
+            "old": {"key": [("old", 1)], "v": 2},
+        }
+
+    async def get_index_stats(self, model) -> list:
+        return [
+            get_index_stats("_id_", 0, timedelta(days=30)),
+            get_index_stats("name", 0, timedelta(days=30)),
+            get_index_stats("a_b", 0, timedelta(hours=1)),
+            get_index_stats("old", 5, timedelta(days=30)),
+            get_index_stats("c", 0, timedelta(seconds=1)),
+        ]
+
+
+@pytest.fixture(autouse=True)
+def db(monkeypatch):
+    Thing.created = []
+    monkeypatch.setattr(global_services, "DB", FakeDB(), raising=False)
+
+
+def test_index_drift_report():
+    report = asyncio.run(
+        sync_model_indexes(Thing, logging.getLogger(__name__), WEEK_SECONDS)
+    )
+    assert report == {
+        "collection": "things",
+        "created": ["c"],
+        "changed": ["name"],
+        "extra": ["old"],
+        "unused": ["name"],
+    }
+    assert Thing.created == ["c"]
+
+
+def test_unused_indexes_need_a_minimum_counting_time():
+    index_stats = [
+        get_index_stats("recent", 0, timedelta(days=1)),
+        get_index_stats("idle", 0, timedelta(days=8)),
+        get_index_stats("used", 1, timedelta(days=8)),
+        get_index_stats("_id_", 0, timedelta(days=8)),
+        get_index_stats("new", 0, timedelta(days=8)),
+    ]
+    assert get_unused_indexes(index_stats, ["new"], WEEK_SECONDS) == ["idle"]
+    assert get_unused_indexes(index_stats, [], 0) == ["recent", "idle", "new"]
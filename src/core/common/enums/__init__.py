@@ -1,2 +1,3 @@
 from .auth import *  # noqa
 from .common_response import *  # noqa
+from .pagination import *  # noqa
@@ -0,0 +1,8 @@
+from enum import Enum
+
+
+class CountStrategyEnum(str, Enum):
+    exact: str = "exact"
+    cached: str = "cached"
+    estimated: str = "estimated"
+    none: str = "none"
@@ -1,7 +1,7 @@
 import csv
 import os
 from itertools import islice
-from typing import List
+from typing import AsyncIterator, List
 
 
 def csv_to_dict_generator(
@@ -49,3 +49,28 @@ def write_csv_file(file_path: str, csv_list: List[dict], fieldnames=None):
             writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
             writer.writeheader()
             writer.writerows(csv_list)
+
+
+async def write_csv_file_from_iterator(
+    file_path: str, rows: AsyncIterator[dict], fieldnames=None
+) -> int:
+    """
+    Writes the rows as they are produced, without holding them all in memory.
+    :return: number of written rows, the file is not created if there is none
+    """
+    first_row = await anext(rows, None)
+    if first_row is None:
+        return 0
+    if fieldnames is None:
+        fieldnames = list(first_row.keys())
+    if directory := os.path.dirname(file_path):
+        os.makedirs(directory, exist_ok=True)
+    count = 1
+    with open(file_path, "w+", encoding="utf-8-sig") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+        writer.writeheader()
+        writer.writerow(first_row)
+        async for row in rows:
+            writer.writerow(row)
+            count += 1
+    return count
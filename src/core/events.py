@@ -1,11 +1,18 @@
+import asyncio
 from typing import Callable
 
 from src import services
 from src.apps.config.crud import configs_crud
+from src.apps.keyword.controller import keyword_controller
 from src.core.base.db_utils import create_indexes, create_fixtures
+from src.core.executors import shutdown_executors
 from src.main.config import app_settings
 from src.services import global_services
 from src.services import events
+from src.web_scraper import shared_serp_browser
+
+# keeps a reference to the index builds running in background
+index_sync_tasks = set()
 
 
 def create_start_app_handler() -> Callable:
@@ -14,14 +21,22 @@ def create_start_app_handler() -> Callable:
         services.global_services.LOGGER.info("LOGGER Connected :)")
         services.global_services.DB = await events.initialize_db()
         services.global_services.LOGGER.info("DB Connected :)")
-        await create_indexes(
-            app_settings=app_settings, logger=services.global_services.LOGGER
-        )
-        services.global_services.LOGGER.info("Create DB indexes")
-        await create_fixtures(
-            app_settings=app_settings, logger=services.global_services.LOGGER
+        index_sync_task = asyncio.create_task(
+            create_indexes(
+                app_settings=app_settings, logger=services.global_services.LOGGER
+            )
         )
-        services.global_services.LOGGER.info("DB Fixtures Created")
+        index_sync_tasks.add(index_sync_task)
+        index_sync_task.add_done_callback(index_sync_tasks.discard)
+        services.global_services.LOGGER.info("Syncing DB indexes in background")
+        # domain rollups must be complete before rank writes apply deltas
+        await asyncio.to_thread(keyword_controller.ensure_domain_stats)
+        services.global_services.LOGGER.info("Domain stats built")
+        if app_settings.LOAD_FIXTURES:
+            await create_fixtures(
+                app_settings=app_settings, logger=services.global_services.LOGGER
+            )
+            services.global_services.LOGGER.info("DB Fixtures Created")
         services.global_services.S3 = await events.initialize_storage()
         services.global_services.LOGGER.info("S3 Connected :)")
         services.global_services.SES = await events.initialize_ses()
@@ -43,6 +58,8 @@ def create_start_app_handler() -> Callable:
 def create_stop_app_handler() -> Callable:
     async def stop_app() -> None:
         print("shutting down...")
+        shutdown_executors()
+        shared_serp_browser.close()
         await events.close_db_connection(global_services.DB)
         services.global_services.LOGGER.info("entries deleted")
 
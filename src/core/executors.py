@@ -0,0 +1,100 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+
+class ExecutorQueueFull(Exception):
+    pass
+
+
+class BoundedExecutor(object):
+    """
+    Thread pool with its own threads and a limit on waiting jobs, for blocking
+    work that must not run in (and exhaust) the server's shared threadpool.
+    `submit` raises `ExecutorQueueFull` instead of queueing without bound.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix=f"{name}-executor"
+        )
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "completed": 0,
+            "failed": 0,
+        }
+        self._wait_seconds = 0.0
+        self._max_wait_seconds = 0.0
+        self._run_seconds = 0.0
+        executors.append(self)
+
+    def submit(self, fn: Callable, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters["rejected"] += 1
+                raise ExecutorQueueFull(self.name)
+            self._queued += 1
+            self._counters["submitted"] += 1
+        return self._pool.submit(self._run, time.perf_counter(), fn, *args, **kwargs)
+
+    def _run(self, submitted_at: float, fn: Callable, *args, **kwargs):
+        started_at = time.perf_counter()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            wait_seconds = started_at - submitted_at
+            self._wait_seconds += wait_seconds
+            self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+        result_counter = "failed"
+        try:
+            result = fn(*args, **kwargs)
+            result_counter = "completed"
+            return result
+        except Exception:
+            logging.exception(f"{self.name} executor job {fn.__name__} failed:")
+            raise
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._counters[result_counter] += 1
+                self._run_seconds += time.perf_counter() - started_at
+
+    def get_metrics(self) -> dict:
+        with self._lock:
+            finished = self._counters["completed"] + self._counters["failed"]
+            started = finished + self._running
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "running": self._running,
+                "queued": self._queued,
+                **self._counters,
+                "avg_wait_seconds": self._wait_seconds / started if started else None,
+                "max_wait_seconds": self._max_wait_seconds,
+                "avg_run_seconds": self._run_seconds / finished if finished else None,
+            }
+
+    def shutdown(self, wait: bool = False):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+executors: List[BoundedExecutor] = []
+
+
+def get_executors_metrics() -> List[Dict]:
+    return [executor.get_metrics() for executor in executors]
+
+
+def shutdown_executors(wait: bool = False):
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,35 @@
+from typing import Any, Dict, List, Tuple
+
+
+def get_changed_fields(
+    stored: dict, new: dict, prefix: str = ""
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Dotted paths of `new` whose value differs from `stored`, for an update
+    touching only what changed. Embedded documents are compared field by
+    field, lists and other values as a whole. Fields `new` sets to None, or
+    leaves out of an embedded document, are cleared.
+    :return: (paths to `$set` with their value, paths to `$unset`)
+    """
+    to_set, to_unset = {}, []
+    for field, value in new.items():
+        path = f"{prefix}{field}"
+        stored_value = stored.get(field)
+        if value is None:
+            if stored_value is not None:
+                to_unset.append(path)
+        elif isinstance(value, dict) and isinstance(stored_value, dict) and value:
+            nested_set, nested_unset = get_changed_fields(
+                stored_value, value, prefix=f"{path}."
+            )
+            to_set.update(nested_set)
+            to_unset.extend(nested_unset)
+        elif field not in stored or value != stored_value:
+            to_set[path] = value
+    if prefix:
+        to_unset.extend(
+            f"{prefix}{field}"
+            for field, value in stored.items()
+            if field not in new and value is not None
+        )
+    return to_set, to_unset
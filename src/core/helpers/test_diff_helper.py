@@ -0,0 +1,44 @@
+from src.core.helpers.diff_helper import get_changed_fields
+
+
+def test_unchanged_document_has_no_changes():
+    stored = {"name": "a", "meta": {"x": 1}, "tags": ["a"]}
+    assert get_changed_fields(stored, dict(stored)) == ({}, [])
+
+
+def test_changed_and_new_fields_are_set():
+    stored = {"name": "a", "age": 1}
+    assert get_changed_fields(stored, {"name": "b", "age": 1, "city": "c"}) == (
+        {"name": "b", "city": "c"},
+        [],
+    )
+
+
+def test_none_unsets_only_stored_values():
+    stored = {"name": "a", "city": None}
+    assert get_changed_fields(stored, {"name": None, "city": None, "zip": None}) == (
+        {},
+        ["name"],
+    )
+
+
+def test_embedded_documents_are_compared_by_path():
+    stored = {"meta": {"x": 1, "y": 2, "z": None}}
+    to_set, to_unset = get_changed_fields(stored, {"meta": {"x": 3}})
+    assert to_set == {"meta.x": 3}
+    assert to_unset == ["meta.y"]
+
+
+def test_lists_and_empty_documents_are_replaced_whole():
+    stored = {"tags": ["a", "b"], "meta": {"x": 1}}
+    assert get_changed_fields(stored, {"tags": ["a"], "meta": {}}) == (
+        {"tags": ["a"], "meta": {}},
+        [],
+    )
+
+
+def test_embedded_document_replacing_a_scalar_is_set():
+    assert get_changed_fields({"meta": None}, {"meta": {"x": 1}}) == (
+        {"meta": {"x": 1}},
+        [],
+    )
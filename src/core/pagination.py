@@ -1,23 +1,143 @@
 import asyncio
+import hashlib
+import hmac
 from functools import cached_property
-from base64 import b64encode, b64decode
+from base64 import b64encode, b64decode, urlsafe_b64decode, urlsafe_b64encode
 from binascii import Error
 from urllib import parse
 from collections import namedtuple
 from datetime import datetime
-from typing import List, Optional, Tuple, Type, TypeVar, Union
+from typing import (
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+from bson import json_util
 from fastapi import Query
 from pydantic import BaseModel
 from starlette.requests import Request
 from src.core.mixins.fields import PyObjectId
 from src.core.base.crud import BaseCRUD
-from src.core.base.schema import PaginatedResponse, CursorPaginatedResponse  # noqa
+from src.core.base.db_utils import get_schema_projection
+from src.core.base.schema import (  # noqa
+    CursorPaginatedResponse,
+    KeysetPaginatedResponse,
+    PaginatedResponse,
+)
+from src.core.common.enums import CountStrategyEnum
 from src.core.common.exceptions import CustomHTTPException
+from src.main.config import app_settings, jwt_settings
+from src.services import global_services
 
 ModelT = TypeVar("ModelT", bound=BaseModel)
 
 
+def get_trusted_items(
+    list_item_model: Type[BaseModel], items: list, by_alias=True
+) -> List[dict]:
+    """
+    Same dicts as `list_item_model(**item).dict(exclude_none=True)` for
+    documents read in trusted mode, picked field by field without validating.
+    Only for schemas without validators computing their values.
+    """
+    fields = [
+        (name, field.alias, field.alias if by_alias else name, field)
+        for name, field in list_item_model.__fields__.items()
+    ]
+    result = []
+    for item in items:
+        values = item if isinstance(item, dict) else item.__dict__
+        trusted_item = {}
+        for name, alias, key, field in fields:
+            if name in values:
+                value = values[name]
+            elif alias in values:
+                value = values[alias]
+            else:
+                value = field.get_default()
+            if value is not None:
+                trusted_item[key] = value
+        result.append(trusted_item)
+    return result
+
+
+ENRICHMENT_STAGES = ("$lookup", "$addFields", "$set", "$project", "$unset")
+
+
+def get_stage_output_fields(stage: dict) -> set:
+    """Root fields a stage computes"""
+    operator, spec = next(iter(stage.items()))
+    if operator == "$lookup":
+        fields = {spec["as"]}
+    elif operator in ("$addFields", "$set"):
+        fields = set(spec)
+    elif operator == "$project":
+        fields = {
+            field for field, value in spec.items() if not isinstance(value, (bool, int))
+        }
+    elif operator == "$unwind":
+        fields = {(spec["path"] if isinstance(spec, dict) else spec).lstrip("$")}
+    else:
+        fields = set()
+    return {field.split(".")[0] for field in fields}
+
+
+def is_enrichment_pipeline(stages: List[dict], sort_fields: set) -> bool:
+    """
+    Whether `stages` only add data to each row: they keep the rows, their
+    number and their order. An `$unwind` counts as such only with
+    `preserveNullAndEmptyArrays`, on the result of a previous `$lookup`
+    (joins on unique keys, as done here).
+    """
+    lookups = set()
+    for stage in stages:
+        operator, spec = next(iter(stage.items()))
+        if operator == "$lookup":
+            lookups.add(spec["as"])
+        if operator == "$unwind":
+            if not (
+                isinstance(spec, dict)
+                and spec.get("preserveNullAndEmptyArrays")
+                and spec["path"].lstrip("$") in lookups
+            ):
+                return False
+        elif operator not in ENRICHMENT_STAGES:
+            return False
+        if get_stage_output_fields(stage) & sort_fields:
+            return False
+    return True
+
+
+def split_pipeline(pipeline: List[dict], sort) -> Tuple[List[dict], List[dict]]:
+    """
+    Splits `pipeline` into the stages selecting the rows, to run before
+    `$sort`/`$skip`/`$limit`, and the longest tail of enrichment stages
+    (joins, computed fields) which can run on the page rows only.
+    Stages computing a `sort` field stay before the page.
+    """
+    sort_fields = {field.split(".")[0] for field in dict(sort)}
+    for idx in range(len(pipeline)):
+        if is_enrichment_pipeline(pipeline[idx:], sort_fields):
+            return pipeline[:idx], pipeline[idx:]
+    return pipeline, []
+
+
 class Pagination(object):
+    """
+    Offset pagination. The total of the page is counted with the
+    `count_strategy` given to `paginate`:
+    `exact` counts every time, `cached` keeps the count of the same criteria
+    for `PAGINATION_COUNT_CACHE_SECONDS`, `estimated` reads the collection
+    size from its metadata when the listing is not filtered (else `cached`)
+    and `none` leaves the total out. Except for `exact`, one row more is
+    fetched to know if there is a next page.
+    """
+
     default_offset = 0
     default_limit = 10
     max_offset = None
@@ -35,16 +155,83 @@ class Pagination(object):
         self.crud = None
         self.list_item_model = None
         self.count = None
+        self.has_more = None
         self.list = []
 
-    async def get_count(self, criteria: dict = None) -> int:
+    @staticmethod
+    def is_unfiltered(criteria: dict) -> bool:
+        return not [field for field in criteria if field != "is_deleted"]
+
+    async def get_cached_count(
+        self, key_source, count: Callable[[], Awaitable[int]]
+    ) -> int:
+        normalized = json_util.dumps(key_source, sort_keys=True)
+        key = (
+            f"pagination_count:{self.crud.read_db_model.Meta.collection_name}:"
+            f"{hashlib.sha1(normalized.encode()).hexdigest()}"
+        )
+        if (cached := await global_services.CACHE.get(key)) is not None:
+            return int(cached)
+        result = await count()
+        await global_services.CACHE.set(
+            key, result, expiry=app_settings.PAGINATION_COUNT_CACHE_SECONDS
+        )
+        return result
+
+    async def get_count(
+        self,
+        criteria: dict = None,
+        count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
+    ) -> Optional[int]:
         if criteria is None:
             criteria = {}
-        self.count = await self.crud.count(criteria=criteria)
+        if count_strategy == CountStrategyEnum.none:
+            self.count = None
+        elif count_strategy == CountStrategyEnum.exact:
+            self.count = await self.crud.count(criteria=criteria)
+        elif count_strategy == CountStrategyEnum.estimated and self.is_unfiltered(
+            criteria
+        ):
+            self.count = await self.crud.estimated_count()
+        else:
+            self.count = await self.get_cached_count(
+                criteria, lambda: self.crud.count(criteria=criteria)
+            )
+        return self.count
+
+    async def get_aggregate_count(
+        self,
+        pipeline: List[dict],
+        count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
+        **kwargs,
+    ) -> Optional[int]:
+        """Count of the rows `pipeline` outputs, estimated counts are cached ones"""
+        if count_strategy == CountStrategyEnum.none:
+            self.count = None
+            return self.count
+
+        async def count() -> int:
+            result = await self.crud.aggregate(
+                pipeline=[*pipeline, {"$count": "count"}], **kwargs
+            )
+            return result[0]["count"] if result else 0
+
+        if count_strategy == CountStrategyEnum.exact:
+            self.count = await count()
+        else:
+            self.count = await self.get_cached_count(pipeline, count)
         return self.count
 
+    def set_has_more(self, rows: list) -> list:
+        """Drops the look-ahead row, if fetched"""
+        self.has_more = len(rows) > self.limit
+        return rows[: self.limit]
+
     def get_next_url(self) -> Union[str, None]:
-        if self.offset + self.limit >= self.count:
+        if self.has_more is not None:
+            if not self.has_more:
+                return None
+        elif self.offset + self.limit >= self.count:
             return None
         return str(
             self.request.url.include_query_params(
@@ -67,13 +254,23 @@ class Pagination(object):
             )
         )
 
-    async def get_list(self, criteria: dict = None, _sort=None) -> list:
+    async def get_list(
+        self,
+        criteria: dict = None,
+        _sort=None,
+        trusted: bool = False,
+        look_ahead: bool = False,
+    ) -> list:
         self.list = await self.crud.get_list(
             criteria=criteria,
-            limit=self.limit,
+            limit=self.limit + 1 if look_ahead else self.limit,
             skip=self.offset,
             sort=_sort,
+            trusted=trusted,
+            schema=self.list_item_model,
         )
+        if look_ahead:
+            self.list = self.set_has_more(self.list)
         return self.list
 
     async def get_list_aggregate(
@@ -81,18 +278,36 @@ class Pagination(object):
         pipeline: List[dict] = None,
         criteria: dict = None,
         _sort: dict = None,
+        count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
         **kwargs,
     ) -> Tuple[List[dict], int]:
+        """
+        The `exact` count is computed in the same `$facet` as the page, other
+        strategies fetch the page alone. The enrichment stages ending the
+        pipeline run after `$limit`, on the rows of the page only.
+        """
         if not pipeline:
             pipeline = []
         if criteria:
             pipeline.insert(0, {"$match": criteria})
+        pipeline, post_page_pipeline = split_pipeline(pipeline, _sort or {})
+        look_ahead = count_strategy != CountStrategyEnum.exact
         _list_pipeline = [
             {"$skip": self.offset},
-            {"$limit": self.limit},
+            {"$limit": self.limit + 1 if look_ahead else self.limit},
+            *post_page_pipeline,
         ]
         if _sort:
             _list_pipeline.insert(0, {"$sort": _sort})
+        if projection := get_schema_projection(self.list_item_model):
+            _list_pipeline.append({"$project": projection})
+        if look_ahead:
+            rows, _ = await asyncio.gather(
+                self.crud.aggregate(pipeline=[*pipeline, *_list_pipeline], **kwargs),
+                self.get_aggregate_count(pipeline, count_strategy, **kwargs),
+            )
+            self.list = self.set_has_more(rows)
+            return self.list, self.count
         paginate_pipe = [
             {
                 "$facet": {
@@ -122,8 +337,14 @@ class Pagination(object):
         pipeline: List[dict] = None,
         _sort: Optional[List[tuple]] = None,
         by_alias=True,
+        trusted: bool = False,
+        count_strategy: CountStrategyEnum = CountStrategyEnum.exact,
         **kwargs,
     ) -> PaginatedResponse[List[Type[ModelT]]]:
+        """
+        `trusted` skips the validation of the documents and of the page, the
+        result is meant to be returned in a `TrustedJSONResponse`.
+        """
         self.crud = crud
         self.list_item_model = list_item_model
         if pipeline:
@@ -133,17 +354,35 @@ class Pagination(object):
                 pipeline=pipeline,
                 _sort=_sort,
                 criteria=criteria,
+                count_strategy=count_strategy,
                 **kwargs,
             )
+        else:
+            await asyncio.gather(
+                self.get_list(
+                    criteria=criteria,
+                    _sort=_sort,
+                    trusted=trusted,
+                    look_ahead=count_strategy != CountStrategyEnum.exact,
+                ),
+                self.get_count(criteria=criteria, count_strategy=count_strategy),
+            )
+        if trusted:
+            return PaginatedResponse[List[list_item_model]].construct(
+                total=self.count,
+                offset=self.offset,
+                limit=self.limit,
+                has_more=self.has_more,
+                next=self.get_next_url(),
+                previous=self.get_previous_url(),
+                result=get_trusted_items(list_item_model, self.list, by_alias),
+            )
+        if pipeline:
             items = [
                 self.list_item_model(**item).dict(exclude_none=True, by_alias=by_alias)
                 for item in self.list
             ]
         else:
-            await asyncio.gather(
-                self.get_list(criteria=criteria, _sort=_sort),
-                self.get_count(criteria=criteria),
-            )
             items = [
                 self.list_item_model(**item.dict(exclude_none=True, by_alias=by_alias))
                 for item in self.list
@@ -152,6 +391,7 @@ class Pagination(object):
             total=self.count,
             offset=self.offset,
             limit=self.limit,
+            has_more=self.has_more,
             next=self.get_next_url(),
             previous=self.get_previous_url(),
             result=items,
@@ -271,6 +511,10 @@ class CursorPagination:
             {"$sort": dict(self._sort)},
             {"$limit": self.limit},
         ]
+        if projection := get_schema_projection(
+            self.list_item_model, extra_fields=[self.ordering.field]
+        ):
+            _list_pipeline.append({"$project": projection})
         paginate_pipe = [
             {
                 "$facet": {
@@ -298,7 +542,7 @@ class CursorPagination:
         self.count = await self.crud.count(criteria=criteria)
         return self.count
 
-    async def get_list(self, criteria: dict = None) -> list:
+    async def get_list(self, criteria: dict = None, trusted: bool = False) -> list:
         criteria = criteria if criteria else {}
         criteria = {**criteria}
         if self._cursor:
@@ -308,6 +552,12 @@ class CursorPagination:
             criteria=criteria,
             limit=self.limit,
             sort=self._sort,
+            trusted=trusted,
+            projection=self.crud.get_projection(
+                self.list_item_model,
+                trusted=trusted,
+                extra_fields=[self.ordering.field],
+            ),
         )
         return self.list
 
@@ -319,6 +569,7 @@ class CursorPagination:
         pipeline: List[dict] = None,
         criteria: dict = None,
         by_alias=True,
+        trusted: bool = False,
         **kwargs,
     ) -> dict:
         self.crud = crud
@@ -330,15 +581,19 @@ class CursorPagination:
                 criteria=criteria,
                 **kwargs,
             )
+        else:
+            await asyncio.gather(
+                self.get_list(criteria=criteria, trusted=trusted),
+                self.get_count(criteria=criteria),
+            )
+        if trusted:
+            items = get_trusted_items(self.list_item_model, self.list, by_alias)
+        elif pipeline:
             items = [
                 self.list_item_model(**item).dict(exclude_none=True, by_alias=by_alias)
                 for item in self.list
             ]
         else:
-            await asyncio.gather(
-                self.get_list(criteria=criteria),
-                self.get_count(criteria=criteria),
-            )
             items = [
                 self.list_item_model(**item.dict(exclude_none=True, by_alias=by_alias))
                 for item in self.list
@@ -349,3 +604,222 @@ class CursorPagination:
             "previous_cursor": self.previous_cursor,
             "result": items,
         }
+
+
+class KeysetPagination(object):
+    """
+    Seeks from the sort key values of the last (or first) row of the page
+    instead of skipping rows, so every page costs the same. `id` is added as
+    tie-breaker, and the cursors are opaque and signed: they carry the sort
+    key values of the row and are only valid for the same ordering.
+    """
+
+    default_limit = 10
+    max_limit = 500
+    tie_breaker = "id"
+
+    def __init__(
+        self,
+        limit: int = Query(default=default_limit, ge=1, le=max_limit),
+        cursor: Optional[str] = Query(None, description="next or previous cursor"),
+    ):
+        self.cursor = cursor
+        self.limit = limit
+        self.crud = None
+        self.list_item_model = None
+        self.list = []
+
+    @staticmethod
+    def get_signature(payload: bytes) -> str:
+        digest = hmac.new(
+            jwt_settings.SECRET_KEY.encode(), payload, hashlib.sha256
+        ).digest()
+        return urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+    def encode_cursor(self, sort: List[tuple], values: list, is_previous=False) -> str:
+        payload = urlsafe_b64encode(
+            json_util.dumps(
+                {"s": sort, "v": values, "p": is_previous},
+                json_options=json_util.CANONICAL_JSON_OPTIONS,
+            ).encode()
+        ).rstrip(b"=")
+        return f"{payload.decode('ascii')}.{self.get_signature(payload)}"
+
+    def decode_cursor(self, cursor: str, sort: List[tuple]) -> Tuple[list, bool]:
+        """:return: (sort key values, is previous page cursor)"""
+        payload, _, signature = cursor.encode("ascii", "ignore").partition(b".")
+        if not hmac.compare_digest(
+            self.get_signature(payload).encode("ascii"), signature
+        ):
+            raise CustomHTTPException(status_code=422, detail="invalid cursor")
+        try:
+            decoded = json_util.loads(
+                urlsafe_b64decode(payload + b"=" * (-len(payload) % 4)).decode()
+            )
+        except (Error, ValueError):
+            raise CustomHTTPException(status_code=422, detail="invalid cursor")
+        if [tuple(key) for key in decoded["s"]] != sort:
+            raise CustomHTTPException(
+                status_code=422, detail="cursor of another ordering"
+            )
+        return decoded["v"], decoded["p"]
+
+    def get_sort(self, _sort: Optional[List[tuple]]) -> List[tuple]:
+        sort = [tuple(key) for key in _sort or []]
+        if self.tie_breaker not in [field for field, _ in sort]:
+            sort.append((self.tie_breaker, 1))
+        return sort
+
+    @staticmethod
+    def reverse_sort(sort: List[tuple]) -> List[tuple]:
+        return [(field, -direction) for field, direction in sort]
+
+    @staticmethod
+    def get_after_criteria(field: str, value, direction: int) -> Optional[dict]:
+        """
+        Criteria of the values of `field` sorting strictly after `value`,
+        None if there is none. Missing and null values sort first.
+        """
+        if value is None:
+            return {field: {"$ne": None}} if direction == 1 else None
+        if direction == 1:
+            return {field: {"$gt": value}}
+        return {"$or": [{field: {"$lt": value}}, {field: None}]}
+
+    def get_seek_criteria(self, sort: List[tuple], values: list) -> dict:
+        """Rows after `values` in `sort` order, compared key by key"""
+        branches = []
+        for idx, (field, direction) in enumerate(sort):
+            after = self.get_after_criteria(field, values[idx], direction)
+            if after is not None:
+                equal = {
+                    prior_field: values[prior_idx]
+                    for prior_idx, (prior_field, _) in enumerate(sort[:idx])
+                }
+                branches.append({"$and": [equal, after]} if equal else after)
+        return {"$or": branches} if branches else {"_id": {"$exists": False}}
+
+    @staticmethod
+    def get_value(item, field: str):
+        for part in field.split("."):
+            if item is None:
+                return None
+            if isinstance(item, dict):
+                item = item.get(part)
+            else:
+                item = getattr(item, part, None)
+        return item
+
+    def get_cursor(self, sort: List[tuple], item, is_previous=False) -> str:
+        values = [self.get_value(item, field) for field, _ in sort]
+        return self.encode_cursor(sort, values, is_previous=is_previous)
+
+    async def get_list(
+        self,
+        sort: List[tuple],
+        criteria: dict = None,
+        pipeline: List[dict] = None,
+        seek: Optional[dict] = None,
+        trusted: bool = False,
+        **kwargs,
+    ) -> list:
+        """`seek` is only used with a `pipeline`, after its row selecting stages"""
+        fields = [field for field, _ in sort]
+        if pipeline is None:
+            return await self.crud.get_list(
+                criteria=criteria,
+                limit=self.limit + 1,
+                sort=sort,
+                trusted=trusted,
+                projection=self.crud.get_projection(
+                    self.list_item_model, trusted=trusted, extra_fields=fields
+                ),
+            )
+        pipeline = [*pipeline]
+        if criteria:
+            pipeline.insert(0, {"$match": criteria})
+        pipeline, post_page_pipeline = split_pipeline(pipeline, sort)
+        if seek:
+            pipeline.append({"$match": seek})
+        pipeline += [
+            {"$sort": dict(sort)},
+            {"$limit": self.limit + 1},
+            *post_page_pipeline,
+        ]
+        if projection := get_schema_projection(
+            self.list_item_model, extra_fields=fields
+        ):
+            pipeline.append({"$project": projection})
+        return await self.crud.aggregate(pipeline=pipeline, **kwargs)
+
+    async def paginate(
+        self,
+        crud: BaseCRUD,
+        list_item_model: Type[BaseModel],
+        criteria: dict = None,
+        pipeline: List[dict] = None,
+        _sort: Optional[List[tuple]] = None,
+        by_alias=True,
+        trusted: bool = False,
+        **kwargs,
+    ) -> KeysetPaginatedResponse[List[Type[ModelT]]]:
+        """
+        The row selecting stages of `pipeline` run before the seek, the sort
+        and the limit, its enrichment tail after them (see `split_pipeline`).
+        """
+        self.crud = crud
+        self.list_item_model = list_item_model
+        sort = self.get_sort(_sort)
+        is_previous = False
+        query_sort = sort
+        if self.cursor:
+            values, is_previous = self.decode_cursor(self.cursor, sort)
+            if is_previous:
+                query_sort = self.reverse_sort(sort)
+            seek = self.get_seek_criteria(query_sort, values)
+            if pipeline is None:
+                criteria = {"$and": [criteria, seek]} if criteria else seek
+        else:
+            seek = None
+        rows = await self.get_list(
+            sort=query_sort,
+            criteria=criteria,
+            pipeline=pipeline,
+            seek=seek,
+            trusted=trusted,
+            **kwargs,
+        )
+        has_more = len(rows) > self.limit
+        rows = rows[: self.limit]
+        if is_previous:
+            rows.reverse()
+        self.list = rows
+        next_cursor = previous_cursor = None
+        if rows and (has_more or is_previous):
+            next_cursor = self.get_cursor(sort, rows[-1])
+        if rows and ((has_more and is_previous) or (self.cursor and not is_previous)):
+            previous_cursor = self.get_cursor(sort, rows[0], is_previous=True)
+        if trusted:
+            items = get_trusted_items(list_item_model, rows, by_alias)
+            return KeysetPaginatedResponse[List[list_item_model]].construct(
+                limit=self.limit,
+                next_cursor=next_cursor,
+                previous_cursor=previous_cursor,
+                result=items,
+            )
+        if pipeline is not None:
+            items = [
+                list_item_model(**item).dict(exclude_none=True, by_alias=by_alias)
+                for item in rows
+            ]
+        else:
+            items = [
+                list_item_model(**item.dict(exclude_none=True, by_alias=by_alias))
+                for item in rows
+            ]
+        return KeysetPaginatedResponse[List[list_item_model]](
+            limit=self.limit,
+            next_cursor=next_cursor,
+            previous_cursor=previous_cursor,
+            result=items,
+        )
@@ -1,4 +1,10 @@
-from .base.schema import ErrorResponse
+import json
+from functools import partial
+
+from pydantic.json import custom_pydantic_encoder
+from starlette.responses import JSONResponse
+
+from .base.schema import BaseConfig, ErrorResponse
 from .common.enums.common_response import (
     Conflict409MessageEnum,
     FileSizeTooLarge413MessageEnum,
@@ -19,3 +25,23 @@ response_404 = {404: {"model": ErrorResponse[NotFound404MessageEnum]}}
 response_500 = {500: {"model": ErrorResponse[ServerError500MessageEnum]}}
 response_409 = {409: {"model": ErrorResponse[Conflict409MessageEnum]}}
 response_413 = {413: {"model": ErrorResponse[FileSizeTooLarge413MessageEnum]}}
+
+
+trusted_json_encoder = partial(custom_pydantic_encoder, BaseConfig.json_encoders)
+
+
+class TrustedJSONResponse(JSONResponse):
+    """
+    Renders the content as is, with the schemas JSON encoders, skipping the
+    validation against the `response_model` of the route. For pages built from
+    trusted reads, see `Pagination.paginate`.
+    """
+
+    def render(self, content) -> bytes:
+        return json.dumps(
+            content,
+            default=trusted_json_encoder,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from src.core.executors import BoundedExecutor, ExecutorQueueFull, executors
+
+
+@pytest.fixture
+def executor():
+    executor = BoundedExecutor(name="test", max_workers=1, max_queue=1)
+    yield executor
+    executor.shutdown(wait=True)
+    executors.remove(executor)
+
+
+def wait_for(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_submit_past_the_queue_limit_is_rejected(executor):
+    release = threading.Event()
+    running = executor.submit(release.wait)
+    wait_for(lambda: executor.get_metrics()["running"] == 1)
+    queued = executor.submit(lambda: "done")
+    with pytest.raises(ExecutorQueueFull):
+        executor.submit(lambda: "rejected")
+
+    metrics = executor.get_metrics()
+    assert (metrics["queued"], metrics["submitted"], metrics["rejected"]) == (1, 2, 1)
+
+    release.set()
+    assert running.result(timeout=5) is True
+    assert queued.result(timeout=5) == "done"
+    wait_for(lambda: executor.get_metrics()["completed"] == 2)
+    # the queue has room again
+    assert executor.submit(lambda: "accepted").result(timeout=5) == "accepted"
+
+
+def test_failed_jobs_are_counted(executor):
+    def fail():
+        raise ValueError
+
+    with pytest.raises(ValueError):
+        executor.submit(fail).result(timeout=5)
+    wait_for(lambda: executor.get_metrics()["failed"] == 1)
+    assert executor.get_metrics()["completed"] == 0
@@ -0,0 +1,216 @@
+import asyncio
+from typing import Optional
+
+import pytest
+from pydantic import BaseModel
+
+from src.core.common.exceptions import CustomHTTPException
+from src.core.pagination import KeysetPagination, split_pipeline
+
+
+class Row(BaseModel):
+    id: str
+    score: Optional[int]
+    name: Optional[str]
+
+
+def matches(document: dict, criteria: dict) -> bool:
+    """Evaluates the subset of the MongoDB query language the seek criteria use"""
+    for key, condition in criteria.items():
+        if key == "$or":
+            if not any(matches(document, branch) for branch in condition):
+                return False
+        elif key == "$and":
+            if not all(matches(document, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(key)
+            for operator, operand in condition.items():
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator in ("$gt", "$lt") and value is None:
+                    return False
+                if operator == "$gt" and not value > operand:
+                    return False
+                if operator == "$lt" and not value < operand:
+                    return False
+                if operator == "$exists" and (key in document) != operand:
+                    return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+def sort_documents(documents: list, sort: list) -> list:
+    """Sorts as MongoDB does: missing and null values first in ascending order"""
+    for field, direction in reversed(sort):
+        documents = sorted(
+            documents,
+            key=lambda document: (
+                document.get(field) is not None,
+                document.get(field) if document.get(field) is not None else 0,
+            ),
+            reverse=direction == -1,
+        )
+    return documents
+
+
+class FakeCRUD(object):
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def get_projection(self, *args, **kwargs):
+        return None
+
+    async def get_list(self, criteria, limit, sort, **kwargs):
+        documents = [
+            document
+            for document in self.documents
+            if not criteria or matches(document, criteria)
+        ]
+        return [Row(**document) for document in sort_documents(documents, sort)][:limit]
+
+
+DOCUMENTS = [
+    {"id": "a", "score": 3, "name": "x"},
+    {"id": "b", "score": None, "name": "y"},
+    {"id": "c", "score": 1, "name": None},
+    {"id": "d", "score": 3, "name": "y"},
+    {"id": "e", "score": None, "name": "x"},
+    {"id": "f", "score": 2, "name": "z"},
+    {"id": "g", "score": 1, "name": "z"},
+    {"id": "h", "name": "x"},
+]
+
+
+def paginate(limit: int, cursor: Optional[str], sort: list):
+    pagination = KeysetPagination(limit=limit, cursor=cursor)
+    return asyncio.run(
+        pagination.paginate(crud=FakeCRUD(DOCUMENTS), list_item_model=Row, _sort=sort)
+    )
+
+
+@pytest.mark.parametrize(
+    "sort",
+    [
+        [("score", 1)],
+        [("score", -1)],
+        [("score", -1), ("name", 1)],
+        [("name", -1), ("score", 1)],
+    ],
+)
+@pytest.mark.parametrize("values_row", range(len(DOCUMENTS)))
+def test_seek_criteria_selects_the_rows_after_the_cursor_row(sort, values_row):
+    pagination = KeysetPagination(limit=10, cursor=None)
+    sort = pagination.get_sort(sort)
+    ordered = sort_documents(DOCUMENTS, sort)
+    row = ordered[values_row]
+    values = [row.get(field) for field, _ in sort]
+    criteria = pagination.get_seek_criteria(sort, values)
+    after = sort_documents(
+        [document for document in DOCUMENTS if matches(document, criteria)], sort
+    )
+    assert after == ordered[values_row + 1 :]
+
+
+@pytest.mark.parametrize(
+    "sort", [[("score", 1)], [("score", -1)], [("name", 1), ("score", -1)]]
+)
+def test_next_and_previous_cursors_walk_every_page(sort):
+    expected = [
+        document["id"]
+        for document in sort_documents(
+            DOCUMENTS, KeysetPagination(limit=3, cursor=None).get_sort(sort)
+        )
+    ]
+    pages = [paginate(3, None, sort)]
+    assert pages[0].previous_cursor is None
+    while pages[-1].next_cursor:
+        pages.append(paginate(3, pages[-1].next_cursor, sort))
+    assert [row.id for page in pages for row in page.result] == expected
+
+    backwards = [pages[-1]]
+    while backwards[-1].previous_cursor:
+        backwards.append(paginate(3, backwards[-1].previous_cursor, sort))
+    assert [page.result for page in reversed(backwards)] == [
+        page.result for page in pages
+    ]
+    assert backwards[-1].previous_cursor is None
+
+
+def test_cursor_round_trip():
+    pagination = KeysetPagination(limit=10, cursor=None)
+    sort = [("score", -1), ("id", 1)]
+    cursor = pagination.encode_cursor(sort, [None, "a"], is_previous=True)
+    assert pagination.decode_cursor(cursor, sort) == ([None, "a"], True)
+
+
+def test_tampered_cursor_is_rejected():
+    pagination = KeysetPagination(limit=10, cursor=None)
+    sort = [("score", 1), ("id", 1)]
+    payload, _, signature = pagination.encode_cursor(sort, [1, "a"]).partition(".")
+    forged = pagination.encode_cursor(sort, [100, "z"]).partition(".")[0]
+    with pytest.raises(CustomHTTPException) as e:
+        pagination.decode_cursor(f"{forged}.{signature}", sort)
+    assert e.value.status_code == 422
+    with pytest.raises(CustomHTTPException):
+        pagination.decode_cursor(payload, sort)
+
+
+def test_cursor_of_another_ordering_is_rejected():
+    pagination = KeysetPagination(limit=10, cursor=None)
+    cursor = pagination.encode_cursor([("score", 1), ("id", 1)], [1, "a"])
+    with pytest.raises(CustomHTTPException) as e:
+        pagination.decode_cursor(cursor, [("score", -1), ("id", 1)])
+    assert e.value.status_code == 422
+
+
+def test_sort_gets_the_id_tie_breaker_once():
+    pagination = KeysetPagination(limit=10, cursor=None)
+    assert pagination.get_sort([("score", -1)]) == [("score", -1), ("id", 1)]
+    assert pagination.get_sort([("id", -1)]) == [("id", -1)]
+    assert pagination.get_sort(None) == [("id", 1)]
+
+
+LOOKUP = {
+    "$lookup": {
+        "from": "users",
+        "localField": "user_id",
+        "foreignField": "id",
+        "as": "user",
+    }
+}
+
+
+def test_split_pipeline_moves_the_enrichment_tail_after_the_page():
+    match = {"$match": {"is_deleted": False}}
+    unwind = {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}}
+    add_fields = {"$addFields": {"user_name": "$user.name"}}
+    assert split_pipeline([match, LOOKUP, unwind, add_fields], [("id", 1)]) == (
+        [match],
+        [LOOKUP, unwind, add_fields],
+    )
+
+
+def test_split_pipeline_keeps_stages_computing_a_sort_field():
+    add_fields = {"$addFields": {"user_name": "$user.name"}}
+    unwind = {"$unwind": {"path": "$user", "preserveNullAndEmptyArrays": True}}
+    assert split_pipeline([LOOKUP, unwind, add_fields], [("user_name", 1)]) == (
+        [LOOKUP, unwind, add_fields],
+        [],
+    )
+    assert split_pipeline([LOOKUP, add_fields], [("user.name", 1)]) == (
+        [LOOKUP],
+        [add_fields],
+    )
+
+
+def test_split_pipeline_keeps_row_changing_stages():
+    # an $unwind dropping empty joins changes the rows
+    unwind = {"$unwind": "$user"}
+    match = {"$match": {"user.is_blocked": False}}
+    assert split_pipeline([LOOKUP, unwind], [("id", 1)]) == ([LOOKUP, unwind], [])
+    assert split_pipeline([LOOKUP, match], [("id", 1)]) == ([LOOKUP, match], [])
+    # projections only excluding or including fields compute nothing
+    project = {"$project": {"password": 0}}
+    assert split_pipeline([project], [("password", 1)]) == ([], [project])
@@ -5,9 +5,10 @@ import unicodedata
 from datetime import date, datetime, time
 from decimal import Decimal
 from functools import wraps
+from itertools import islice
 from random import choice
 from string import ascii_letters, digits
-from typing import List, Type, TypeVar
+from typing import Iterable, Iterator, List, Type, TypeVar
 
 import phonenumbers
 import shortuuid
@@ -145,6 +146,12 @@ def create_short_uuid(length=8) -> str:
     return shortuuid.ShortUUID().random(length=length)
 
 
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[list]:
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
         if isinstance(o, Decimal):
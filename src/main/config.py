@@ -11,7 +11,7 @@ from pydantic import (
 
 from src.apps.config.common_model import OfficeAddress
 from src.apps.language.enum import LanguageEnum
-from src.main.enums import CountryCode, CurrencyCode
+from src.main.enums import CountryCode, CurrencyCode, SerpFetchMode
 
 __all__ = (
     "admin_settings",
@@ -22,6 +22,7 @@ __all__ = (
     "collections_names",
     "db_settings",
     "jwt_settings",
+    "rank_settings",
     "region_settings",
     "test_settings",
 )
@@ -87,7 +88,14 @@ class AppSettings(BaseSettings):
     DEFAULT_AVATARS_PATH: str = f"{DEFAULT_MEDIA_PATH}/users/avatars"
     MEDIA_SERVER: str = "https://keywords-api.fanpino.com"
     DEFAULT_PASSWORD: str = "0123456789"
-    APPS_FOLDER_NAME: str = "app/apps"
+    PAGINATION_COUNT_CACHE_SECONDS: int = 60
+    # indexes are only reported unused after this long without accesses
+    INDEX_USAGE_MIN_SECONDS: int = 7 * 24 * 60 * 60
+    APPS_FOLDER_NAME: str = "src/apps"
+    # app fixtures only run on startup when enabled explicitly
+    LOAD_FIXTURES: bool = False
+    # the default admin is only seeded with an explicitly configured password
+    FIXTURES_ADMIN_PASSWORD: Optional[str] = None
     APPS: List[str] = [
         "auth",
         "config",
@@ -106,6 +114,7 @@ class AppSettings(BaseSettings):
         "banner",
         "log_app",
         "chat",
+        "keyword",
     ]
 
 
@@ -134,6 +143,15 @@ class CollectionsNames(BaseSettings):
     STATES: str = "states"
     CITIES: str = "cities"
     KEYWORDS: str = "keywords"
+    SERP_INDEX: str = "serp_index"
+    SERPS: str = "serps"
+    DOMAIN_STATS: str = "domain_stats"
+    COUNTERS: str = "counters"
+    RANK_RUNS: str = "rank_runs"
+    RANK_ATTEMPTS: str = "rank_attempts"
+    DAILY_RANKS: str = "daily_ranks"
+    RANK_SHARDS: str = "rank_shards"
+    RANK_WORKERS: str = "rank_workers"
 
 
 collections_names = CollectionsNames()
@@ -225,6 +243,44 @@ class CelerySettings(BaseSettings):
 celery_settings = CelerySettings()
 
 
+class RankSettings(BaseSettings):
+    SERP_MAX_AGE_SECONDS: int = 24 * 60 * 60
+    # local cache of daily_ranks, rebuilt from Mongo on every host reading it
+    MATRIX_PATH: str = "data/rank_matrix"
+    MATRIX_SYNC_SECONDS: int = 5 * 60
+    WRITE_BATCH_SIZE: int = 10
+    # the change feed stops holding back a block not released by then
+    CHANGE_FEED_RESERVATION_TIMEOUT_SECONDS: int = 5 * 60
+    ATTEMPTS_TTL_SECONDS: int = 30 * 24 * 60 * 60
+    DEFAULT_DOMAIN_WEIGHT: float = 1.0
+    DEFAULT_DAILY_BUDGET: int = 0  # 0 = unlimited
+    SHARDS: int = 64
+    WORKER_HEARTBEAT_SECONDS: int = 15
+    WORKER_TIMEOUT_SECONDS: int = 60
+    WORKER_IDLE_SECONDS: int = 300
+    SCRAPE_WORKERS: int = 2
+    SCRAPE_QUEUE_SIZE: int = 50
+    REFRESH_QUEUE_SIZE: int = 1
+    BROWSER_MAX_RSS_MB: int = 1024
+    BROWSER_REAP_SECONDS: int = 30
+    TABS_PER_BROWSER: int = 4
+    SHARED_BROWSER_IDLE_SECONDS: int = 60
+    SERP_BASE_URL: str = "https://www.google.com"
+    SERP_FETCH_MODE: SerpFetchMode = SerpFetchMode.live
+    CASSETTE_PATH: str = "data/serp_cassettes"
+    REPLAY_LATENCY_SECONDS: float = 0.0
+    REPLAY_LATENCY_JITTER_SECONDS: float = 0.0
+    REPLAY_FAILURE_RATE: float = 0.0
+    REPLAY_BLOCK_RATE: float = 0.0
+    REPLAY_SEED: Optional[int] = None
+
+    class Config(BaseSettings.Config):
+        env_prefix = "RANK_"
+
+
+rank_settings = RankSettings()
+
+
 class JWTSettings(BaseSettings):
     SECRET_KEY: str
     ACCESS_TOKEN_LIFETIME_SECONDS: int = 3600
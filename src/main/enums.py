@@ -14,3 +14,9 @@ class CurrencyCode(str, Enum):
 
 
 ALL_CURRENCY_CODES = [i.value for i in CurrencyCode.__members__.values()]
+
+
+class SerpFetchMode(str, Enum):
+    live: str = "live"
+    record: str = "record"
+    replay: str = "replay"
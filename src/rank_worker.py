@@ -0,0 +1,93 @@
+"""
+Rank refresh worker.
+
+Run one per node with `python -m src.rank_worker`. Workers split the keyword
+space by claiming shards (hash of the normalized query) in MongoDB and each
+refreshes the keywords of its shards not yet updated today.
+"""
+import logging
+import signal
+import threading
+from datetime import datetime, time, timezone
+
+import pymongo
+
+from src.apps.keyword.controller import keyword_controller
+from src.apps.keyword.sharding import ShardClaimer, assign_missing_shards
+from src.main import config
+from src.main.config import rank_settings
+
+
+def get_stale_keywords_criteria(shard: int) -> dict:
+    today_start = datetime.combine(
+        datetime.now(timezone.utc).date(), time.min, tzinfo=timezone.utc
+    )
+    return {
+        "shard": shard,
+        "$or": [
+            {"last_rank_update_time": None},
+            {"last_rank_update_time": {"$lt": today_start}},
+        ],
+    }
+
+
+def run_worker():
+    mongo = pymongo.MongoClient(config.db_settings.URI)
+    keyword_db = mongo.get_database(config.db_settings.DATABASE_NAME)
+    keyword_controller.ensure_domain_stats(keyword_db)
+    claimer = ShardClaimer(keyword_db)
+    claimer.ensure_shards()
+    assign_missing_shards(keyword_db)
+    stop = threading.Event()
+
+    def stop_worker(*_):
+        stop.set()
+
+    signal.signal(signal.SIGTERM, stop_worker)
+    signal.signal(signal.SIGINT, stop_worker)
+
+    def keep_heartbeat():
+        while not stop.wait(rank_settings.WORKER_HEARTBEAT_SECONDS):
+            try:
+                claimer.heartbeat()
+            except Exception:
+                # the shards are dropped until the next successful heartbeat
+                logging.exception(f"rank worker {claimer.worker_id} heartbeat failed")
+
+    claimer.heartbeat()
+    heartbeat_thread = threading.Thread(target=keep_heartbeat, daemon=True)
+    heartbeat_thread.start()
+    print(f"rank worker {claimer.worker_id} started with shards {claimer.owned}")
+    try:
+        while not stop.is_set():
+            refreshed = False
+            for shard in list(claimer.owned):
+                if stop.is_set():
+                    break
+                claimer.set_busy(shard)
+                try:
+                    if not claimer.owns(shard):
+                        continue
+                    criteria = get_stale_keywords_criteria(shard)
+                    if not keyword_db.keywords.count_documents(
+                        {**criteria, "is_deleted": False}, limit=1
+                    ):
+                        continue
+                    keyword_controller.update_all_rank(
+                        criteria=criteria,
+                        should_stop=lambda: stop.is_set() or not claimer.owns(shard),
+                    )
+                    refreshed = True
+                finally:
+                    claimer.set_busy(None)
+            if not refreshed:
+                stop.wait(rank_settings.WORKER_IDLE_SECONDS)
+    finally:
+        stop.set()
+        heartbeat_thread.join()
+        claimer.release_all()
+        print(f"rank worker {claimer.worker_id} stopped")
+
+
+if __name__ == "__main__":
+    run_worker()
@@ -0,0 +1,56 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from src.main.config import rank_settings
+
+
+class SerpCassette(object):
+    """
+    Recorded result pages, one JSON file per request URL, holding what the
+    scraper extracted from the page: the ordered result domains, or that the
+    request was blocked.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def get_file_path(self, url: str) -> str:
+        return os.path.join(self.path, f"{hashlib.sha1(url.encode()).hexdigest()}.json")
+
+    def record(
+        self,
+        url: str,
+        keyword: str,
+        page: int,
+        domains: Optional[List[str]],
+        blocked: bool = False,
+    ):
+        os.makedirs(self.path, exist_ok=True)
+        file_path = self.get_file_path(url)
+        tmp_path = f"{file_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as cassette_file:
+            json.dump(
+                {
+                    "url": url,
+                    "keyword": keyword,
+                    "page": page,
+                    "domains": domains,
+                    "blocked": blocked,
+                    "record_datetime": datetime.now(timezone.utc).isoformat(),
+                },
+                cassette_file,
+            )
+        os.replace(tmp_path, file_path)
+
+    def load(self, url: str) -> Optional[dict]:
+        try:
+            with open(self.get_file_path(url), encoding="utf-8") as cassette_file:
+                return json.load(cassette_file)
+        except FileNotFoundError:
+            return None
+
+
+serp_cassette = SerpCassette(path=rank_settings.CASSETTE_PATH)
@@ -1,18 +1,20 @@
 from datetime import datetime
 from enum import Enum
-from typing import List, Optional, Type, TypeVar
+from typing import AsyncIterator, List, Optional, Type, TypeVar, Union
 
 import bson
 from datetime import timezone
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 from pymongo.client_session import ClientSession
+from pymongo import IndexModel, ReturnDocument
 from pymongo.collation import Collation
-from pymongo.errors import DuplicateKeyError
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 
 from src.core.base.schema import BaseSchema
 from src.core.common.exceptions import CustomHTTPException
-from src.core.utils import CustomDict
+from src.core.utils import CustomDict, iter_chunks
+from src.main.config import collections_names
 from .base import BaseDB
 
 
@@ -27,6 +29,8 @@ class UpdateOperatorsEnum(str, Enum):
 
 T = TypeVar("T", bound=BaseModel)
 
+DUPLICATE_KEY_ERROR_CODE = 11000
+
 
 class MongoDB(BaseDB):
     """This class is the concrete implementation of MongoDB database."""
@@ -82,6 +86,10 @@ class MongoDB(BaseDB):
             ),
         )
 
+    def get_sync_database(self):
+        """The pymongo database under the motor one, for sync code run in threads"""
+        return self._db.delegate
+
     async def disconnect(self):
         self._client.close()
 
@@ -102,6 +110,12 @@ class MongoDB(BaseDB):
             criteria, **kwargs
         )
 
+    async def raw_estimated_count(self, model: Type[T], **kwargs) -> int:
+        """Collection size from its metadata, without scanning, ignoring any filter"""
+        return await self._db[model.Meta.collection_name].estimated_document_count(
+            **kwargs
+        )
+
     async def raw_read_many(
         self,
         criteria: dict,
@@ -110,14 +124,51 @@ class MongoDB(BaseDB):
         skip: int = 0,
         limit: int = 0,
         projection: Optional[dict] = None,
+        trusted: bool = False,
     ) -> Optional[List[T]]:
+        """
+        `trusted` documents are built with `construct()`, skipping the
+        validation, only for data written by this app and read as is.
+        """
+        build = model.construct if trusted else model
         return [
-            model(**doc)
+            build(**doc)
             async for doc in self._db[model.Meta.collection_name].find(
                 criteria, sort=sort, skip=skip, limit=limit, projection=projection
             )
         ]
 
+    async def raw_iter_read_many(
+        self,
+        criteria: dict,
+        model: Type[T],
+        sort: list = None,
+        skip: int = 0,
+        limit: int = 0,
+        projection: Optional[dict] = None,
+        batch_size: int = 1000,
+        trusted: bool = False,
+        as_dict: bool = False,
+    ) -> AsyncIterator[Union[T, dict]]:
+        """
+        Yields the documents as the cursor streams them, fetched `batch_size`
+        at a time, instead of building the whole list.
+        """
+        build = model.construct if trusted else model
+        cursor = self._db[model.Meta.collection_name].find(
+            criteria,
+            sort=sort,
+            skip=skip,
+            limit=limit,
+            projection=projection,
+            batch_size=batch_size,
+        )
+        try:
+            async for doc in cursor:
+                yield doc if as_dict else build(**doc)
+        finally:
+            await cursor.close()
+
     async def raw_read_one(
         self,
         criteria: dict,
@@ -197,42 +248,113 @@ class MongoDB(BaseDB):
     ):
         return self._db[model.Meta.collection_name].aggregate(pipeline, **kwargs)
 
-    async def raw_update(
-        self,
-        criteria: dict,
-        model: Type[T],
+    async def raw_iter_aggregate(
+        self, pipeline: List[dict], model: Type[T], batch_size: int = 1000, **kwargs
+    ) -> AsyncIterator[CustomDict]:
+        """Yields the aggregation results as the cursor streams them"""
+        cursor = await self.raw_aggregate_cursor(
+            pipeline, model, batchSize=batch_size, **kwargs
+        )
+        try:
+            async for doc in cursor:
+                yield CustomDict(doc)
+        finally:
+            await cursor.close()
+
+    @staticmethod
+    def get_update_statement(
         new_values: dict,
         operator: Optional[UpdateOperatorsEnum],
         upsert: Optional[bool] = False,
-    ) -> bool:
+    ) -> dict:
+        now = datetime.now(timezone.utc)
         if operator == UpdateOperatorsEnum.set_:
-            new_values |= dict(update_datetime=datetime.now(timezone.utc))
+            new_values |= dict(update_datetime=now)
         if operator is not None:
             update_statement = {operator: new_values}
         else:
-            new_values["$set"] = {"update_datetime": datetime.now(timezone.utc)}
             update_statement = new_values
+            update_statement.setdefault("$set", {})["update_datetime"] = now
         if upsert:
-            update_statement["$setOnInsert"] = {
-                "create_datetime": datetime.now(timezone.utc)
-            }
+            update_statement["$setOnInsert"] = {"create_datetime": now}
+        return update_statement
+
+    async def raw_update(
+        self,
+        criteria: dict,
+        model: Type[T],
+        new_values: dict,
+        operator: Optional[UpdateOperatorsEnum],
+        upsert: Optional[bool] = False,
+    ) -> bool:
+        update_statement = self.get_update_statement(new_values, operator, upsert)
         try:
             result = await self._db[model.Meta.collection_name].update_one(
                 filter=criteria, update=update_statement, upsert=upsert
             )
         except DuplicateKeyError as e:
-            key = list(e.details["keyValue"].keys())[0]
-            raise CustomHTTPException(
-                message=f"{key} value ({e.details['keyValue'][key]}) is duplicate and can not be updated",
-                detail={
-                    "loc": ["body", key],
-                    "msg": "field duplicated",
-                    "type": "value_error.duplicate",
-                },
-                status_code=409,
-            ) from e
+            raise self.get_duplicate_key_exception(e.details, "updated") from e
         return result.acknowledged
 
+    async def raw_update_and_get(
+        self,
+        criteria: dict,
+        model: Type[T],
+        new_values: dict,
+        operator: Optional[UpdateOperatorsEnum],
+        upsert: Optional[bool] = False,
+        projection: Optional[dict] = None,
+    ) -> Optional[Union[T, dict]]:
+        """
+        Updates the first matching document and returns it as updated, in one
+        round-trip. Returns the raw document when `projection` is given.
+        """
+        update_statement = self.get_update_statement(new_values, operator, upsert)
+        try:
+            document = await self._db[model.Meta.collection_name].find_one_and_update(
+                criteria,
+                update_statement,
+                projection=projection,
+                upsert=upsert,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError as e:
+            raise self.get_duplicate_key_exception(e.details, "updated") from e
+        if document is None:
+            return None
+        return document if projection else model(**document)
+
+    async def raw_update_many_and_get(
+        self,
+        criteria: dict,
+        new_values: dict,
+        model: Type[T],
+        operator: UpdateOperatorsEnum = UpdateOperatorsEnum.set_,
+    ) -> List[T]:
+        """
+        Updates every matching document and returns them as updated. MongoDB
+        cannot return the documents of an `update_many`: the matching documents
+        are read once and updated by `_id`, and a plain `$set` is applied to
+        them in process. Other operators and dotted paths are read again by
+        `_id`. Documents the update takes out of `criteria` are still returned.
+        """
+        collection = self._db[model.Meta.collection_name]
+        documents = [document async for document in collection.find(criteria)]
+        if not documents:
+            return []
+        ids_criteria = {"_id": {"$in": [document["_id"] for document in documents]}}
+        update_statement = self.get_update_statement(new_values, operator)
+        await collection.update_many(filter=ids_criteria, update=update_statement)
+        # get_update_statement added update_datetime to `new_values`
+        if operator == UpdateOperatorsEnum.set_ and not any(
+            "." in field for field in new_values
+        ):
+            for document in documents:
+                document.update(new_values)
+        else:
+            documents = [document async for document in collection.find(ids_criteria)]
+        return [model(**document) for document in documents]
+
     async def raw_update_many(
         self,
         criteria: dict,
@@ -264,37 +386,78 @@ class MongoDB(BaseDB):
         )
         return result
 
+    def as_stored(self, document: dict) -> dict:
+        """
+        `document` as it reads back from the database (BSON types, naive UTC
+        datetimes with millisecond precision) without querying it again.
+        """
+        codec_options = self._db.codec_options
+        return bson.decode(
+            bson.encode(document, codec_options=codec_options),
+            codec_options=codec_options,
+        )
+
+    @staticmethod
+    def get_duplicate_key_exception(
+        details: dict, action: str = "inserted"
+    ) -> CustomHTTPException:
+        key = list(details["keyValue"].keys())[0]
+        return CustomHTTPException(
+            message=f"{key} value ({details['keyValue'][key]}) is duplicate and can not be {action}",
+            detail={
+                "loc": ["body", key],
+                "msg": "field duplicated",
+                "type": "value_error.duplicate",
+            },
+            status_code=409,
+        )
+
     async def raw_insert(
         self, obj: Type[T], model: Type[T], read_model: Type[T]
     ) -> Optional[T]:
+        document = obj.dict()
         try:
-            result = await self._db[model.Meta.collection_name].insert_one(obj.dict())
+            await self._db[model.Meta.collection_name].insert_one(document)
         except DuplicateKeyError as e:
-            key = list(e.details["keyValue"].keys())[0]
-            raise CustomHTTPException(
-                message=f"{key} value ({e.details['keyValue'][key]}) is duplicate and can not be inserted",
-                detail={
-                    "loc": ["body", key],
-                    "msg": "field duplicated",
-                    "type": "value_error.duplicate",
-                },
-                status_code=409,
-            ) from e
-        return await self.raw_read_one(
-            criteria={"_id": result.inserted_id}, model=read_model
-        )
+            raise self.get_duplicate_key_exception(e.details) from e
+        return read_model(**self.as_stored(document))
 
     async def raw_insert_many(
-        self, obj_list: List[Type[T]], model: Type[T], read_model: Type[T]
-    ) -> Optional[T]:
-        result = await self._db[model.Meta.collection_name].insert_many(
-            [obj.dict() for obj in obj_list]
-        )
-        if result.inserted_ids:
-            return await self.raw_read_many(
-                criteria={"_id": result.inserted_ids}, model=read_model
+        self,
+        obj_list: List[Type[T]],
+        model: Type[T],
+        read_model: Type[T],
+        chunk_size: int = 1000,
+    ) -> Optional[List[T]]:
+        """
+        Inserts unordered, in chunks of `chunk_size`. Documents failing on a
+        duplicate key are skipped and reported with a 409 once every chunk
+        has been written.
+        """
+        collection = self._db[model.Meta.collection_name]
+        inserted = []
+        duplicate_errors = []
+        for chunk in iter_chunks(obj_list, chunk_size):
+            documents = [obj.dict() for obj in chunk]
+            failed_indexes = set()
+            try:
+                await collection.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                if e.details.get("writeConcernErrors"):
+                    raise
+                for error in e.details["writeErrors"]:
+                    if error["code"] != DUPLICATE_KEY_ERROR_CODE:
+                        raise
+                    failed_indexes.add(error["index"])
+                    duplicate_errors.append(error)
+            inserted.extend(
+                read_model(**self.as_stored(document))
+                for index, document in enumerate(documents)
+                if index not in failed_indexes
             )
-        return None
+        if duplicate_errors:
+            raise self.get_duplicate_key_exception(duplicate_errors[0])
+        return inserted or None
 
     async def raw_delete(
         self,
@@ -342,8 +505,22 @@ class MongoDB(BaseDB):
             **kwargs,
         )
 
-    async def create_indexes(self, model: Type[T], **kwargs):
-        if indexes := getattr(model.Meta, "indexes", None):
+    async def create_indexes(
+        self, model: Type[T], indexes: Optional[List[IndexModel]] = None, **kwargs
+    ):
+        if indexes := indexes or getattr(model.Meta, "indexes", None):
             return await self._db[model.Meta.collection_name].create_indexes(
                 indexes, **kwargs
             )
+
+    async def get_index_information(self, model: Type[T]) -> dict:
+        return await self._db[model.Meta.collection_name].index_information()
+
+    async def get_index_stats(self, model: Type[T]) -> List[dict]:
+        """`$indexStats` of the collection, accesses are counted since the server start"""
+        return [
+            doc
+            async for doc in self._db[model.Meta.collection_name].aggregate(
+                [{"$indexStats": {}}]
+            )
+        ]
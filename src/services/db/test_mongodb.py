@@ -0,0 +1,203 @@
+import asyncio
+from copy import deepcopy
+from datetime import datetime
+from typing import Optional
+
+import bson
+import pytest
+from fastapi import HTTPException
+from pydantic import BaseModel
+from pymongo.errors import BulkWriteError
+
+from src.core.base.crud import BaseCRUD
+from src.core.common.exceptions import CustomHTTPException
+from src.services import global_services
+from src.services.db.mongodb import MongoDB, UpdateOperatorsEnum
+
+
+class Item(BaseModel):
+    name: str
+    count: int = 0
+    meta: dict = {}
+    update_datetime: Optional[datetime]
+
+    class Meta:
+        collection_name = "items"
+        entity_name = "item"
+
+
+def matches(document: dict, criteria: dict) -> bool:
+    for field, condition in criteria.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if document.get(field) not in condition["$in"]:
+                return False
+        elif document.get(field) != condition:
+            return False
+    return True
+
+
+class FakeCursor(object):
+    def __init__(self, documents: list):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for document in self.documents:
+            yield document
+
+
+class FakeCollection(object):
+    def __init__(self, documents: list = None):
+        self.documents = documents or []
+        self.calls = []
+
+    def find(self, criteria: dict, projection: dict = None) -> FakeCursor:
+        self.calls.append("find")
+        return FakeCursor(
+            [
+                deepcopy(document)
+                for document in self.documents
+                if matches(document, criteria)
+            ]
+        )
+
+    async def update_many(self, filter: dict, update: dict):
+        self.calls.append("update_many")
+        for document in self.documents:
+            if not matches(document, filter):
+                continue
+            for path, value in update.get("$set", {}).items():
+                target = document
+                *parents, field = path.split(".")
+                for parent in parents:
+                    target = target.setdefault(parent, {})
+                target[field] = value
+            for field, value in update.get("$inc", {}).items():
+                document[field] = document.get(field, 0) + value
+
+    async def insert_many(self, documents: list, ordered: bool = True):
+        """Inserts unordered, failing on a duplicate `name`"""
+        self.calls.append("insert_many")
+        errors = []
+        for index, document in enumerate(documents):
+            names = [stored["name"] for stored in self.documents]
+            if document["name"] in names:
+                errors.append(
+                    {
+                        "index": index,
+                        "code": 11000,
+                        "keyValue": {"name": document["name"]},
+                    }
+                )
+            else:
+                self.documents.append(document)
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+    async def find_one_and_update(self, criteria: dict, update: dict, **kwargs):
+        self.calls.append("find_one_and_update")
+        return None
+
+
+class FakeDatabase(dict):
+    codec_options = bson.codec_options.CodecOptions()
+
+
+@pytest.fixture
+def items() -> FakeCollection:
+    return FakeCollection(
+        [
+            {"_id": 1, "name": "a", "count": 1, "meta": {"x": 1}},
+            {"_id": 2, "name": "b", "count": 2, "meta": {"x": 2}},
+            {"_id": 3, "name": "a", "count": 3, "meta": {"x": 3}},
+        ]
+    )
+
+
+@pytest.fixture
+def db(items, monkeypatch) -> MongoDB:
+    db = MongoDB()
+    db._db = FakeDatabase(items=items)
+    monkeypatch.setattr(global_services, "DB", db, raising=False)
+    return db
+
+
+def test_update_many_and_get_applies_a_plain_set_in_process(db, items):
+    updated = asyncio.run(
+        db.raw_update_many_and_get(
+            criteria={"name": "a"}, new_values={"name": "c"}, model=Item
+        )
+    )
+    assert items.calls == ["find", "update_many"]
+    assert [item.name for item in updated] == ["c", "c"]
+    assert [item.count for item in updated] == [1, 3]
+    assert all(item.update_datetime is not None for item in updated)
+    assert [document["name"] for document in items.documents] == ["c", "b", "c"]
+
+
+def test_update_many_and_get_reads_other_operators_back(db, items):
+    updated = asyncio.run(
+        db.raw_update_many_and_get(
+            criteria={"name": "a"},
+            new_values={"count": 10},
+            model=Item,
+            operator=UpdateOperatorsEnum.inc,
+        )
+    )
+    assert items.calls == ["find", "update_many", "find"]
+    assert [item.count for item in updated] == [11, 13]
+
+    items.calls = []
+    updated = asyncio.run(
+        db.raw_update_many_and_get(
+            criteria={"name": "b"}, new_values={"meta.y": 5}, model=Item
+        )
+    )
+    assert items.calls == ["find", "update_many", "find"]
+    assert updated[0].meta == {"x": 2, "y": 5}
+
+
+def test_update_many_and_get_without_matches_does_not_write(db, items):
+    assert (
+        asyncio.run(
+            db.raw_update_many_and_get(
+                criteria={"name": "z"}, new_values={"name": "c"}, model=Item
+            )
+        )
+        == []
+    )
+    assert items.calls == ["find"]
+
+
+def test_update_and_get_of_a_missing_document_is_a_404(db, items):
+    crud = BaseCRUD(create_db_model=Item, read_db_model=Item, update_db_model=Item)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(crud.update_and_get(criteria={"name": "z"}, new_doc={"count": 1}))
+    assert e.value.status_code == 404
+    assert items.calls == ["find_one_and_update"]
+
+
+def test_insert_many_reports_duplicates_after_every_chunk(db, items):
+    objs = [Item(name=name) for name in ("c", "a", "d", "e", "b", "f")]
+    with pytest.raises(CustomHTTPException) as e:
+        asyncio.run(db.raw_insert_many(objs, model=Item, read_model=Item, chunk_size=2))
+    assert e.value.status_code == 409
+    assert items.calls == ["insert_many"] * 3
+    assert [document["name"] for document in items.documents[3:]] == [
+        "c",
+        "d",
+        "e",
+        "f",
+    ]
+
+
+def test_insert_many_returns_the_inserted_documents(db, items):
+    inserted = asyncio.run(
+        db.raw_insert_many(
+            [Item(name="c", count=5)], model=Item, read_model=Item, chunk_size=2
+        )
+    )
+    assert [(item.name, item.count) for item in inserted] == [("c", 5)]
+    assert items.calls == ["insert_many"]
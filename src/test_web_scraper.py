@@ -0,0 +1,57 @@
+import pytest
+from selenium.common.exceptions import (
+    StaleElementReferenceException,
+    WebDriverException,
+)
+
+from src.main.config import rank_settings
+from src.main.enums import SerpFetchMode
+from src.serp_cassette import serp_cassette
+from src.web_scraper import (
+    CassetteNotFound,
+    SerpBlocked,
+    SerpBrowser,
+    get_serp_url,
+)
+
+
+@pytest.fixture(autouse=True)
+def cassette(tmp_path, monkeypatch):
+    monkeypatch.setattr(serp_cassette, "path", str(tmp_path))
+    monkeypatch.setattr(rank_settings, "REPLAY_FAILURE_RATE", 0.0)
+    monkeypatch.setattr(rank_settings, "REPLAY_BLOCK_RATE", 0.0)
+    monkeypatch.setattr(rank_settings, "REPLAY_LATENCY_SECONDS", 0.0)
+    monkeypatch.setattr(rank_settings, "REPLAY_LATENCY_JITTER_SECONDS", 0.0)
+
+
+def test_record_then_replay(monkeypatch):
+    fetched = {
+        "found": ["a.com", "b.com"],
+        "empty": [],
+        "blocked": SerpBlocked("https://www.google.com/sorry/"),
+        "stale": StaleElementReferenceException("stale"),
+        "crashed": WebDriverException("chrome not reachable"),
+    }
+    monkeypatch.setattr(
+        SerpBrowser,
+        "_get_serps",
+        lambda self, keywords, page: {
+            keyword: fetched[keyword] for keyword in keywords
+        },
+    )
+    monkeypatch.setattr(rank_settings, "SERP_FETCH_MODE", SerpFetchMode.record)
+    assert SerpBrowser(tabs=2).get_serps(list(fetched)) == fetched
+
+    monkeypatch.setattr(rank_settings, "SERP_FETCH_MODE", SerpFetchMode.replay)
+    replayed = SerpBrowser(tabs=2).get_serps(list(fetched))
+    assert replayed["found"] == ["a.com", "b.com"]
+    assert replayed["empty"] == []
+    assert isinstance(replayed["blocked"], SerpBlocked)
+    assert isinstance(replayed["stale"], CassetteNotFound)
+    assert isinstance(replayed["crashed"], CassetteNotFound)
+
+
+def test_replayed_failure_of_an_older_cassette_is_not_a_result(monkeypatch):
+    monkeypatch.setattr(rank_settings, "SERP_FETCH_MODE", SerpFetchMode.replay)
+    serp_cassette.record(get_serp_url("old"), keyword="old", page=1, domains=None)
+    assert isinstance(SerpBrowser().get_serps(["old"])["old"], CassetteNotFound)
@@ -1,37 +1,336 @@
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Optional, Tuple, Union
 from urllib.parse import urlparse
 
 import tldextract
 from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
 from webdriver_manager.chrome import ChromeDriverManager
 
-print(ChromeDriverManager().install())
+from src.browser_supervisor import BROWSER_MARKER_ARGUMENT, browser_supervisor
+from src.main.config import rank_settings
+from src.main.enums import SerpFetchMode
+from src.serp_cassette import serp_cassette
 
+if rank_settings.SERP_FETCH_MODE != SerpFetchMode.replay:
+    print(ChromeDriverManager().install())
 
-def get_rank(keyword: str, domain: str, page=1) -> int | None:
-    options = webdriver.ChromeOptions()
-    options.add_argument("--headless")
-    options.add_argument("--no-sandbox")
-    options.add_argument("--disable-dev-shm-usage")
-    driver = webdriver.Chrome(options=options)
+BLOCKED_PAGE_MARKERS = ("/sorry/", "captcha")
+PAGE_LOAD_TIMEOUT_SECONDS = 30
+
+
+class SerpBlocked(Exception):
+    """The search engine answered with a captcha / unusual traffic page"""
+
+
+class CassetteNotFound(Exception):
+    """No recording of the request in replay mode"""
+
+
+class InjectedFailure(Exception):
+    """Failure injected by the replay mode"""
+
+
+replay_random = random.Random(rank_settings.REPLAY_SEED)
+
+
+def get_registered_domain(url_or_netloc: str) -> str:
+    return tldextract.extract(url_or_netloc).registered_domain
+
+
+def get_serp_url(keyword: str, page=1) -> str:
     num_in_page = 100
     keyword = keyword.replace(" ", "+")
-    driver.implicitly_wait(10)
+    url = f"{rank_settings.SERP_BASE_URL}/search?num={num_in_page}&q={keyword}"
     if page <= 1:
-        url = f"https://www.google.com/search?num={num_in_page}&q={keyword}"
-    else:
-        url = f"https://www.google.com/search?num={num_in_page}&q={keyword}&start={(page - 1) * num_in_page}"
-    driver.get(url)
+        return url
+    return f"{url}&start={(page - 1) * num_in_page}"
+
+
+def extract_result_domains(driver) -> List[str]:
+    if any(marker in driver.current_url for marker in BLOCKED_PAGE_MARKERS):
+        raise SerpBlocked(driver.current_url)
     search_results = driver.find_elements(By.CSS_SELECTOR, "div.g")
-    for idx, result in enumerate(search_results, start=1):
+    domains = []
+    for result in search_results:
         link = result.find_element(By.TAG_NAME, "a")
         parsed_url = urlparse(link.get_attribute("href"))
-        # print(f'{idx}-{parsed_url.netloc}')
-        if (
-            tldextract.extract(parsed_url.netloc).registered_domain
-            == tldextract.extract(domain).registered_domain
-        ):
-            driver.quit()
+        domains.append(get_registered_domain(parsed_url.netloc))
+    return domains
+
+
+class SerpBrowser(object):
+    """
+    One Chrome fetching up to `tabs` result pages at once, each in its own
+    tab, instead of one browser per concurrent scrape. The browser is reused
+    between batches and restarted if it dies.
+    """
+
+    def __init__(self, tabs: int = None):
+        self.tabs = max(tabs or rank_settings.TABS_PER_BROWSER, 1)
+        self.driver = None
+        self.pid = None
+
+    def __enter__(self) -> "SerpBrowser":
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def start(self):
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        options.add_argument(BROWSER_MARKER_ARGUMENT)
+        self.driver = webdriver.Chrome(options=options)
+        self.pid = browser_supervisor.register(self.driver)
+        self.driver.implicitly_wait(10)
+
+    def close(self):
+        if self.driver is not None:
+            browser_supervisor.close(self.driver, self.pid)
+        self.driver = None
+        self.pid = None
+
+    def is_alive(self) -> bool:
+        try:
+            return bool(self.driver.window_handles)
+        except WebDriverException:
+            return False
+
+    def get_serps(
+        self, keywords: List[str], page=1
+    ) -> Dict[str, Union[List[str], Exception]]:
+        """
+        Result domains of every keyword, or the exception its page failed
+        with. Pages are recorded to / replayed from the cassettes depending on
+        `RANK_SERP_FETCH_MODE`.
+        """
+        keywords = list(dict.fromkeys(keywords))
+        fetch_mode = rank_settings.SERP_FETCH_MODE
+        get_serps = (
+            self._replay_serps
+            if fetch_mode == SerpFetchMode.replay
+            else self._get_serps
+        )
+        results = {}
+        for start in range(0, len(keywords), self.tabs):
+            results.update(get_serps(keywords[start : start + self.tabs], page))
+        if fetch_mode == SerpFetchMode.record:
+            # only pages read to the end, other failures are not replayable
+            for keyword, result in results.items():
+                if isinstance(result, (list, SerpBlocked)):
+                    serp_cassette.record(
+                        get_serp_url(keyword, page),
+                        keyword=keyword,
+                        page=page,
+                        domains=None if isinstance(result, SerpBlocked) else result,
+                        blocked=isinstance(result, SerpBlocked),
+                    )
+        return results
+
+    @staticmethod
+    def _replay_serps(keywords: List[str], page) -> Dict[str, Union[List, Exception]]:
+        """
+        Serves the recorded pages, as a batch of tabs would: after one
+        (jittered) latency, with the configured rates of injected failures
+        and blocks.
+        """
+        time.sleep(
+            rank_settings.REPLAY_LATENCY_SECONDS
+            + replay_random.uniform(0, rank_settings.REPLAY_LATENCY_JITTER_SECONDS)
+        )
+        results = {}
+        for keyword in keywords:
+            url = get_serp_url(keyword, page)
+            roll = replay_random.random()
+            if roll < rank_settings.REPLAY_FAILURE_RATE:
+                results[keyword] = InjectedFailure(url)
+            elif (
+                roll
+                < rank_settings.REPLAY_FAILURE_RATE + rank_settings.REPLAY_BLOCK_RATE
+            ):
+                results[keyword] = SerpBlocked(url)
+            elif (recording := serp_cassette.load(url)) is None:
+                results[keyword] = CassetteNotFound(url)
+            elif recording["blocked"]:
+                results[keyword] = SerpBlocked(url)
+            elif recording["domains"] is None:
+                # recorded failure of an older cassette
+                results[keyword] = CassetteNotFound(url)
+            else:
+                results[keyword] = recording["domains"]
+        return results
+
+    def _open_tabs(self, keywords: List[str], page) -> Dict[str, str]:
+        """Starts loading every page in a new tab, returns keyword -> tab handle"""
+        handles = {}
+        for keyword in keywords:
+            known_handles = set(self.driver.window_handles)
+            self.driver.execute_script(
+                "window.open(arguments[0], '_blank');", get_serp_url(keyword, page)
+            )
+            new_handles = set(self.driver.window_handles) - known_handles
+            handles[keyword] = new_handles.pop()
+        return handles
+
+    def _get_serps(
+        self, keywords: List[str], page
+    ) -> Dict[str, Union[List, Exception]]:
+        """
+        Fetches the pages as tabs. If the supervisor killed the browser over
+        the RSS ceiling meanwhile, the pages it failed are fetched again once
+        in a fresh browser.
+        """
+        results, pid = self._get_tabs_serps(keywords, page)
+        if browser_supervisor.pop_killed(pid):
+            if retry := [
+                keyword
+                for keyword, result in results.items()
+                if isinstance(result, WebDriverException)
+            ]:
+                results.update(self._get_tabs_serps(retry, page)[0])
+        return results
+
+    def _get_tabs_serps(
+        self, keywords: List[str], page
+    ) -> Tuple[Dict[str, Union[List, Exception]], Optional[int]]:
+        """:return: results and the chromedriver pid of the browser used"""
+        results = {}
+        try:
+            if self.driver is None or not self.is_alive():
+                self.close()
+                self.start()
+            main_handle = self.driver.current_window_handle
+            handles = self._open_tabs(keywords, page)
+        except Exception as e:
+            pid = self.pid
+            self.close()
+            return {keyword: e for keyword in keywords}, pid
+        pid = self.pid
+        for keyword, handle in handles.items():
+            try:
+                self.driver.switch_to.window(handle)
+                WebDriverWait(self.driver, PAGE_LOAD_TIMEOUT_SECONDS).until(
+                    lambda driver: driver.execute_script("return document.readyState")
+                    == "complete"
+                )
+                results[keyword] = extract_result_domains(self.driver)
+            except (SerpBlocked, WebDriverException) as e:
+                results[keyword] = e
+            finally:
+                try:
+                    self.driver.close()
+                except WebDriverException:
+                    pass
+        try:
+            self.driver.switch_to.window(main_handle)
+        except WebDriverException:
+            self.close()
+        return results, pid
+
+
+class SharedSerpBrowser(object):
+    """
+    One `SerpBrowser` shared by the threads of an executor, instead of a
+    browser per job. Pages asked for at the same time are fetched together
+    as tabs: the thread getting the browser fetches the pending pages of the
+    waiting threads too. The browser is closed after `idle_seconds` unused.
+    """
+
+    def __init__(self, tabs: int, idle_seconds: int):
+        self.tabs = max(tabs, 1)
+        self.idle_seconds = idle_seconds
+        self._browser = SerpBrowser(tabs=self.tabs)
+        self._pending: List[Tuple[str, int, Future]] = []
+        self._pending_lock = threading.Lock()
+        self._browser_lock = threading.Lock()
+        self._last_used = time.monotonic()
+        self._idle_timer: Optional[threading.Timer] = None
+
+    def get_serp(self, keyword: str, page=1) -> Union[List[str], Exception]:
+        future = Future()
+        with self._pending_lock:
+            self._pending.append((keyword, page, future))
+        while not future.done():
+            with self._browser_lock:
+                if future.done():
+                    break
+                with self._pending_lock:
+                    batch = self._pending[: self.tabs]
+                    self._pending = self._pending[self.tabs :]
+                self._fetch(batch)
+        return future.result()
+
+    def _fetch(self, batch: List[Tuple[str, int, Future]]):
+        pages = {}
+        for keyword, page, future in batch:
+            pages.setdefault(page, []).append((keyword, future))
+        try:
+            for page, requests in pages.items():
+                results = self._browser.get_serps(
+                    [keyword for keyword, _ in requests], page=page
+                )
+                for keyword, future in requests:
+                    future.set_result(results[keyword])
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_result(e)
+        finally:
+            self._last_used = time.monotonic()
+            self._schedule_idle_close()
+
+    def _schedule_idle_close(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = threading.Timer(self.idle_seconds, self._close_if_idle)
+        self._idle_timer.daemon = True
+        self._idle_timer.start()
+
+    def _close_if_idle(self):
+        with self._browser_lock:
+            if time.monotonic() - self._last_used >= self.idle_seconds:
+                self._browser.close()
+
+    def close(self):
+        with self._browser_lock:
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+            self._browser.close()
+
+
+shared_serp_browser = SharedSerpBrowser(
+    tabs=rank_settings.TABS_PER_BROWSER,
+    idle_seconds=rank_settings.SHARED_BROWSER_IDLE_SECONDS,
+)
+
+
+def get_serp_domains(keyword: str, page=1) -> List[str]:
+    """
+    Returns the registered domain of every organic result of the page,
+    in result order (position = index + 1). The page is fetched as a tab of
+    the browser shared by the concurrent scrapes.
+    """
+    result = shared_serp_browser.get_serp(keyword, page=page)
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+
+def find_domain_rank(domains: List[str], domain: str) -> int | None:
+    registered_domain = get_registered_domain(domain)
+    for idx, result_domain in enumerate(domains, start=1):
+        if result_domain == registered_domain:
             return idx
-    driver.quit()
     return None
+
+
+def get_rank(keyword: str, domain: str, page=1) -> int | None:
+    return find_domain_rank(get_serp_domains(keyword, page=page), domain)